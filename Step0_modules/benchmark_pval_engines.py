@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Differential check and benchmark for the two P-value extraction engines.
+
+Runs text_to_pval_and_oper(line, engine='regex') and
+text_to_pval_and_oper(line, engine='scan') on the same lines as the baseline
+extractor (the re.finditer loop the module started from, kept below), stops
+with an error on the first line where either engine disagrees with it, and
+prints the throughput of all three in MB/s together with the prefilter
+hit/miss counters and the hit rate of the literal cache. Run it
+once per corpus (PubMed abstracts, PMC abstracts, PMC bodies) to compare how
+much work the prefilter saves on each.
+
+Finally the corpus is written to a temporary file and aggregated by
+parallel_extract.parallel_aggregate with 1, 2, 4, ... worker processes; the
+counts must equal the serial ones and the speedup per worker count is printed.
+The same file is also extracted in small windows
+(stream_pval_and_oper_batch); the matches must equal the whole-line ones,
+and the peak memory of both is printed.
+
+Usage:
+    python benchmark_pval_engines.py [pmcxtract_list_*.txt ...]
+
+Without arguments a synthetic corpus is generated.
+"""
+
+import sys, os
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from modules.text_to_pval_and_oper import P_VALUE_PATTERN, text_to_pval_and_oper
+from modules.text_to_pval_and_oper import prefilter_stats, reset_prefilter_stats
+from modules.text_to_pval_and_oper import literal_cache_stats
+from modules.text_to_pval_and_oper import stream_pval_and_oper_batch, text_to_pval_and_oper_batch
+from modules.parallel_extract import aggregate_lines, parallel_aggregate
+
+# Literals seen in abstracts and bodies, including the odd forms the
+# homogenization rules exist for.
+SAMPLE_LITERALS = [
+    "P = 0.05", "p<0.001", "(P < .0001)", "P value = 0.03", "p-values < 0,01",
+    "P ≤ 0.05", "p ≥ 0.2", "P less than 0.05", "P of < 0.01", "p=5%",
+    "P = 1.2 × 10-3", "p = 3.4 x 10(-5)", "P < 2e-16", "P = 4.1E-4",
+    "p = 0.0012.", "p =< 0.05", "P <> 0.1", "p = 1.5", "P = 0", "p=.049",
+]
+FILLER_WORDS = (
+    "patients were randomized to placebo or treatment and the primary outcome "
+    "was analysed using a mixed model with adjustment for baseline values "
+    "compared with previous reports the response rate improved significantly "
+    "(n = 120, 95% CI 1.2-3.4) per protocol population expression of protein"
+).split()
+
+def synthetic_corpus(n_lines=2000, words_per_line=600, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    for i in range(n_lines):
+        words = [rng.choice(FILLER_WORDS) for _ in range(words_per_line)]
+        for _ in range(rng.randint(0, 12)):
+            words.insert(rng.randrange(len(words)), rng.choice(SAMPLE_LITERALS))
+        lines.append(f"PMC{i} " + " ".join(words))
+    return lines
+
+def read_corpus(paths):
+    lines = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    lines.append(line)
+    return lines
+
+# ---------- baseline ----------
+# The extractor as it was before the prefilter and the engines: P_VALUE_PATTERN
+# run with re.finditer over the whole line, and the replace() chain. Both
+# engines must return exactly its tuples.
+
+def _baseline_replace(text):
+    text=text.replace(',', '.').replace('•', '.').replace('x', 'e').replace('×', 'e').replace(' ','').replace('(','').replace(')','')
+    text=text.replace('exp','e').replace('Exp','e').replace('E','e')
+    text = re.sub(r'\s+', '', text)
+    return text
+
+def baseline_pval_and_oper(text):
+    results = []
+    for match in re.finditer(P_VALUE_PATTERN, text):
+        operator_str = match.group('op').strip()
+        raw_value_str = match.group('num').strip()
+        digits=match.group('digits').strip()
+        base=match.group('base')
+        exponent=match.group('exponent')
+
+        digits=_baseline_replace(digits)
+        raw_value_str=_baseline_replace(raw_value_str)
+        operator_str = _baseline_replace(operator_str)
+        if base:
+            base=base.strip()
+            base=_baseline_replace(base)
+        if exponent:
+            exponent=exponent.strip()
+            exponent=_baseline_replace(exponent)
+
+        if raw_value_str.count('.') > 1:
+            continue
+        else:
+            digits=float(digits)
+
+        if '%' in raw_value_str:
+            p_value = digits*0.01
+        elif 'e' in raw_value_str:
+            if base and not float(base)==0:
+                base=float(base)
+            else:
+                base=10
+            if exponent:
+                exponent=float(exponent)
+            else:
+                exponent=1
+            p_value=digits*(base**exponent)
+        else:
+            p_value=digits
+
+        if p_value <= 0 or p_value >= 1:
+            continue
+
+        operator_str=operator_str.replace('of','').replace('≤','<').replace('≥','>').replace('lessthan','<')
+        if '=' in operator_str:
+            operator='='
+        if '>' in operator_str:
+            operator='>'
+        if '<' in operator_str:
+            operator='<'
+        if '>' in operator_str:
+            if '<' in operator_str:
+                operator='ambiguous'
+        results.append((p_value,operator))
+    return results
+
+def run_baseline(lines):
+    start = time.perf_counter()
+    results = [baseline_pval_and_oper(line) for line in lines]
+    return results, time.perf_counter() - start
+
+def run_engine(lines, engine):
+    start = time.perf_counter()
+    results = [text_to_pval_and_oper(line, engine=engine) for line in lines]
+    return results, time.perf_counter() - start
+
+def run_parallel(lines):
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.txt', delete=False) as f:
+        for line in lines:
+            f.write(line + '\n')
+        path = f.name
+    try:
+        start = time.perf_counter()
+        expected = aggregate_lines(lines)
+        serial_sec = time.perf_counter() - start
+        # small chunks so that even the synthetic corpus gives every worker several tasks
+        chunk_size = max(1 << 16, os.path.getsize(path) // 64)
+        print(f"workers\tseconds\tspeedup")
+        print(f"serial\t{serial_sec:.2f}\t1.00x")
+        workers = 1
+        while workers <= (os.cpu_count() or 1):
+            start = time.perf_counter()
+            got = parallel_aggregate(path, workers=workers, chunk_size=chunk_size)
+            sec = time.perf_counter() - start
+            if got != expected:
+                raise SystemExit(f"❌ {workers} workers disagree with serial: {got.row()} != {expected.row()}")
+            print(f"{workers}\t{sec:.2f}\t{serial_sec / sec:.2f}x")
+            workers *= 2
+        print(f"✅ parallel counts equal serial counts {expected.row()}")
+    finally:
+        os.remove(path)
+
+def _peak(fn):
+    tracemalloc.start()
+    try:
+        result = fn()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_stream(lines, window_size=1 << 12):
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.txt', delete=False) as f:
+        for line in lines:
+            f.write(line + '\n')
+        path = f.name
+    try:
+        def whole():
+            with open(path, 'r', encoding='utf-8') as f:
+                return [text_to_pval_and_oper_batch([line.strip()]) for line in f if line.strip()]
+
+        def stream():
+            with open(path, 'r', encoding='utf-8') as f:
+                return [result for _, result in stream_pval_and_oper_batch(f, window_size=window_size, batch_size=1)]
+
+        expected, whole_peak = _peak(whole)
+        got, stream_peak = _peak(stream)
+        if len(got) != len(expected):
+            raise SystemExit(f"❌ streaming saw {len(got)} articles, whole lines {len(expected)}")
+        for line_no, (a, b) in enumerate(zip(expected, got), 1):
+            if any(not np.array_equal(a[k], b[k]) for k in a):
+                raise SystemExit(f"❌ streaming disagrees with whole lines on line {line_no}")
+        print(f"✅ {window_size}-character windows give the same matches; peak memory "
+              f"{stream_peak / 1e6:.1f} MB streaming, {whole_peak / 1e6:.1f} MB whole lines")
+    finally:
+        os.remove(path)
+
+def main(paths):
+    lines = read_corpus(paths) if paths else synthetic_corpus()
+    mb = sum(len(line.encode('utf-8')) for line in lines) / 1e6
+
+    baseline_results, baseline_sec = run_baseline(lines)
+    reset_prefilter_stats()
+    regex_results, regex_sec = run_engine(lines, 'regex')
+    stats = prefilter_stats()
+    scan_results, scan_sec = run_engine(lines, 'scan')
+
+    # differential check: both engines must agree with the baseline line by line
+    n_pvalues = 0
+    for line_no, expected in enumerate(baseline_results):
+        for engine, results in (('regex', regex_results), ('scan', scan_results)):
+            if results[line_no] != expected:
+                raise SystemExit(f"❌ {engine} disagrees with the baseline on line {line_no + 1}:\n"
+                                 f"  baseline: {expected}\n  {engine}: {results[line_no]}")
+        n_pvalues += len(expected)
+    print(f"✅ {len(lines):,} lines, {mb:.1f} MB, {n_pvalues:,} P values: engines agree with the baseline")
+
+    print(f"engine\tseconds\tMB/s\tspeedup")
+    for engine, sec in (('baseline', baseline_sec), ('regex', regex_sec), ('scan', scan_sec)):
+        print(f"{engine}\t{sec:.2f}\t{mb / sec:.2f}\t{baseline_sec / sec:.2f}x")
+    print(f"scan/regex\t{regex_sec / scan_sec:.2f}x")
+
+    print(f"prefilter: {stats['lines_rejected']:,} / {stats['lines']:,} lines rejected "
+          f"({stats['line_reject_rate']:.1%}), {stats['windows_matched']:,} / {stats['windows']:,} "
+          f"windows matched ({stats['window_hit_rate']:.1%})")
+    cache = literal_cache_stats()
+    print(f"literal cache: {cache['hits']:,} hits, {cache['misses']:,} misses "
+          f"({cache['hit_rate']:.1%}), {cache['size']:,} / {cache['maxsize']:,} entries")
+
+    run_parallel(lines)
+    run_stream(lines)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,178 @@
+"""
+Block-compressed pmcxtract files (xml_to_txt.py --compress).
+
+{file}.zst or {file}.gz holds the lines of {file} in blocks of about 4 MB of
+text, each cut after a newline. Every block is an independent zstd frame or
+gzip member, so the whole file is also a plain .zst/.gz stream of the text
+(zstd -dc, zcat). The sidecar {file}.zst.bidx / {file}.gz.bidx lists the
+blocks:
+
+    # {codec} {size} {mtime_ns} {source size} {source mtime_ns}
+    {offset}\t{compressed size}\t{text size}\t{articles}      one line per block
+
+The first line stamps the compressed file (and the text file last appended to
+it); ``articles`` counts the lines iter_articles yields from the block.
+
+BlockReader reads any block by its offset and decompresses blocks ahead of
+the consumer in a thread pool (zlib and zstandard release the GIL).
+open_blocks wraps it into a text stream read like open(path, 'r',
+encoding='utf-8'), which is what step4_sources.open_text returns for a
+file that only exists compressed.
+"""
+
+import io
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from modules.step4_manifest import file_stamp
+
+# Optional: zstd blocks need the zstandard package; gzip blocks only need zlib.
+try:
+    import zstandard
+    HAS_ZSTD = True
+except Exception:
+    HAS_ZSTD = False
+
+CODECS = {'zstd': '.zst', 'gzip': '.gz'}
+DECOMPRESS_THREADS = 4
+
+def index_path(data_path):
+    return data_path + ".bidx"
+
+def compressed_path(path):
+    """The compressed file of text file ``path`` ({path}.zst or {path}.gz), or None."""
+    for suffix in CODECS.values():
+        if os.path.exists(path + suffix) and os.path.exists(index_path(path + suffix)):
+            return path + suffix
+    return None
+
+def split_articles(text):
+    """Stripped non-empty lines of decoded text, split like a file in text mode (as iter_articles)."""
+    return [line.strip() for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n') if line.strip()]
+
+def decompress(codec, data):
+    if codec == 'gzip':
+        return zlib.decompress(data, wbits=31)
+    if not HAS_ZSTD:
+        raise RuntimeError("zstd blocks need the zstandard package (pip install zstandard)")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+class BlockReader:
+    """
+    Random and parallel access to the blocks of a compressed file.
+
+    Raises ValueError if the block index does not belong to the file.
+    """
+    def __init__(self, data_path, threads=DECOMPRESS_THREADS):
+        self.path = data_path
+        self.threads = threads
+        with open(index_path(data_path), encoding='utf-8') as f:
+            header = f.readline().split()
+            rows = [[int(v) for v in line.split('\t')] for line in f if line.strip()]
+        self.codec = header[1]
+        if (int(header[2]), int(header[3])) != file_stamp(data_path):
+            raise ValueError(f"block index of {data_path} is stale")
+        blocks = np.array(rows, dtype=np.int64).reshape(-1, 4)
+        self.offset, self.size, self.text_size, self.articles = blocks.T
+        # first article of each block
+        self.first = np.concatenate(([0], np.cumsum(self.articles)))
+        self._fd = os.open(data_path, os.O_RDONLY)
+
+    def __len__(self):
+        return len(self.offset)
+
+    @property
+    def n_articles(self):
+        return int(self.first[-1])
+
+    def block(self, i):
+        """Decompressed bytes of block ``i``."""
+        data = os.pread(self._fd, int(self.size[i]), int(self.offset[i]))
+        return decompress(self.codec, data)
+
+    def iter_blocks(self, start=0, stop=None):
+        """Yield the decompressed blocks [start, stop) in order, decompressing up to 2 x threads ahead."""
+        stop = len(self) if stop is None else stop
+        with ThreadPoolExecutor(max_workers=self.threads) as exe:
+            pending = []
+            for i in range(start, stop):
+                pending.append(exe.submit(self.block, i))
+                if len(pending) >= 2 * self.threads:
+                    yield pending.pop(0).result()
+            for fut in pending:
+                yield fut.result()
+
+    def find(self, pmcid):
+        """Text of the first article with this PMCID, or None. Decompresses the blocks up to it."""
+        for data in self.iter_blocks():
+            for text in split_articles(data.decode('utf-8')):
+                if text.split(None, 1)[0] == pmcid:
+                    return text
+        return None
+
+    def sample(self, k, seed=None):
+        """
+        Uniform random sample of k articles, in file order; the same draw as
+        LineIndexReader.sample on the uncompressed file. Only the blocks
+        holding a sampled article are decompressed.
+
+        Returns:
+            list of (pmcid, text) tuples.
+        """
+        rng = np.random.default_rng(seed)
+        k = min(k, self.n_articles)
+        picks = np.sort(rng.choice(self.n_articles, size=k, replace=False))
+        sample = []
+        block_of = np.searchsorted(self.first, picks, side='right') - 1
+        for b in np.unique(block_of).tolist():
+            lines = split_articles(self.block(b).decode('utf-8'))
+            for i in picks[block_of == b].tolist():
+                text = lines[i - int(self.first[b])]
+                sample.append((text.split(None, 1)[0][:16], text))
+        return sample
+
+    def close(self):
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class BlockStream(io.RawIOBase):
+    """Raw byte stream of the decompressed blocks of a BlockReader (closes it on close)."""
+    def __init__(self, reader):
+        self.reader = reader
+        self._blocks = reader.iter_blocks()
+        self._buf = b''
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos >= len(self._buf):
+            self._buf = next(self._blocks, None)
+            self._pos = 0
+            if self._buf is None:
+                self._buf = b''
+                return 0
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._blocks.close()
+            self.reader.close()
+        super().close()
+
+def open_blocks(data_path, threads=DECOMPRESS_THREADS):
+    """Text stream of a compressed file, decompressed block by block in parallel."""
+    return io.TextIOWrapper(io.BufferedReader(BlockStream(BlockReader(data_path, threads)), buffer_size=1 << 20),
+                            encoding='utf-8')
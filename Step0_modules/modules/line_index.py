@@ -0,0 +1,176 @@
+"""
+Byte-offset line index for the one-article-per-line text files of Step 4.
+
+build_index writes a sidecar ``{file}.idx.npz`` next to a pmcxtract/pmxtract
+file. It holds one entry per article line, with the same lines that
+iter_articles yields: lines end at '\n', '\r\n' or '\r', as in text mode,
+and a line that is blank once decoded and stripped is skipped.
+
+    pmcid   S16     first token of the line (PMCID, or PMID for PubMed)
+    offset  uint64  byte offset of the line
+    length  uint64  byte length of the line without its newline
+    order   int64   argsort of pmcid, for binary search
+    stamp   int64   (size, mtime_ns) of the text file when it was indexed
+    version int64   INDEX_VERSION of the sidecar format
+
+LineIndexReader maps the text file with mmap. It returns any article by
+position or by PMCID, or a uniform random sample of k articles, by reading
+only those k lines. open_reader falls back to block_text.BlockReader for a
+file that only exists block-compressed (xml_to_txt.py --compress).
+
+Example:
+
+    reader = LineIndexReader("pmcxtract_list_review_2020_body.txt")
+    text = reader.find("PMC7000001")
+    for pmcid, text in reader.sample(100, seed=0):
+        ...
+"""
+
+import mmap
+import os
+
+import numpy as np
+
+from modules.block_text import BlockReader, compressed_path
+from modules.step4_manifest import file_stamp
+
+BLOCK_SIZE = 64 << 20  # bytes scanned for newlines at a time
+INDEX_VERSION = 3      # 2: lines also end at a lone '\r'; 3: Unicode-whitespace lines are blank
+
+def index_path(path):
+    return path + ".idx.npz"
+
+def build_index(path, out_path=None):
+    """
+    Index the article lines of ``path`` and write the sidecar.
+
+    Returns:
+        int: Number of indexed articles.
+    """
+    out_path = out_path or index_path(path)
+    size, mtime_ns = file_stamp(path)
+    pmcids = []
+    offsets = []
+    lengths = []
+    if size:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            # line ends: every b'\n', and every b'\r' not followed by b'\n'
+            ends = []
+            for start in range(0, size, BLOCK_SIZE):
+                block = buf[start:start + BLOCK_SIZE]
+                after = buf[start + 1:start + BLOCK_SIZE + 1]  # one byte shorter at the end of the file
+                is_cr = block == 13
+                is_cr[:len(after)] &= after != 10
+                ends.append(np.flatnonzero((block == 10) | is_cr) + start)
+            ends = np.concatenate(ends) if ends else np.empty(0, dtype=np.int64)
+            del buf, block, after
+            if len(ends) == 0 or ends[-1] != size - 1:
+                ends = np.append(ends, size)  # last line without newline
+            starts = np.concatenate(([0], ends[:-1] + 1))
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                if end <= start:
+                    continue
+                # decoded and stripped like iter_articles: a line of Unicode
+                # whitespace only (NBSP, U+3000, '\x1c'...) is blank too
+                line = mm[start:end].decode('utf-8').strip()
+                if not line:
+                    continue
+                pmcids.append(line.split(None, 1)[0].encode('utf-8')[:16])
+                offsets.append(start)
+                lengths.append(end - start)
+    pmcid = np.array(pmcids, dtype='S16')
+    tmp_path = out_path + ".tmp.npz"
+    np.savez(tmp_path,
+             pmcid=pmcid,
+             offset=np.array(offsets, dtype=np.uint64),
+             length=np.array(lengths, dtype=np.uint64),
+             order=np.argsort(pmcid, kind='stable'),
+             stamp=np.array([size, mtime_ns], dtype=np.int64),
+             version=np.array(INDEX_VERSION, dtype=np.int64))
+    os.replace(tmp_path, out_path)
+    return len(pmcid)
+
+def is_index_fresh(path, out_path=None):
+    """True if the sidecar exists, has the current format and was built from the current file (same size and mtime)."""
+    out_path = out_path or index_path(path)
+    if not os.path.exists(out_path):
+        return False
+    with np.load(out_path) as data:
+        if 'version' not in data.files or int(data['version']) != INDEX_VERSION:
+            return False
+        return tuple(data['stamp'].tolist()) == file_stamp(path)
+
+def open_reader(path):
+    """
+    LineIndexReader of a text file, or, if only its block-compressed file
+    exists, a BlockReader of that (same find and sample). Raises
+    FileNotFoundError if neither exists.
+    """
+    if not os.path.exists(path):
+        data_path = compressed_path(path)
+        if data_path is not None:
+            return BlockReader(data_path)
+        raise FileNotFoundError(path)
+    return LineIndexReader(path)
+
+class LineIndexReader:
+    """
+    Random access to the articles of an indexed text file.
+
+    The sidecar is (re)built on open if it is missing or stale, unless
+    ``build=False`` (then a stale index raises ValueError).
+    """
+    def __init__(self, path, build=True):
+        self.path = path
+        if not is_index_fresh(path):
+            if not build:
+                raise ValueError(f"line index of {path} is missing or stale")
+            build_index(path)
+        with np.load(index_path(path)) as data:
+            self.pmcid = data['pmcid']
+            self.offset = data['offset']
+            self.length = data['length']
+            self.order = data['order']
+        self.sorted_pmcid = self.pmcid[self.order]
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offset.size else None
+
+    def __len__(self):
+        return len(self.pmcid)
+
+    def article(self, i):
+        """Stripped text of article ``i`` (position in the file), like iter_articles."""
+        start = int(self.offset[i])
+        return self._mm[start:start + int(self.length[i])].decode('utf-8').strip()
+
+    def find(self, pmcid):
+        """Text of the article with this PMCID, or None. O(log n)."""
+        key = pmcid.encode('ascii')
+        pos = np.searchsorted(self.sorted_pmcid, key)
+        if pos >= len(self.sorted_pmcid) or self.sorted_pmcid[pos] != key:
+            return None
+        return self.article(self.order[pos])
+
+    def sample(self, k, seed=None):
+        """
+        Uniform random sample of k articles (without replacement), in file order.
+
+        Returns:
+            list of (pmcid, text) tuples.
+        """
+        rng = np.random.default_rng(seed)
+        k = min(k, len(self))
+        picks = np.sort(rng.choice(len(self), size=k, replace=False))
+        return [(self.pmcid[i].decode('ascii', 'replace'), self.article(i)) for i in picks.tolist()]
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,60 @@
+"""
+Per-article smallest P value and threshold curves (Figures 1 and 3).
+
+"Has a P value <= t" only depends on the smallest P value of an article, so
+a (field, year) is fully described by the sorted array of those minima and
+its number of articles. One np.searchsorted call then counts the articles
+below any vector of thresholds, e.g. a whole curve over 1e-6 .. 0.05 instead
+of the four fixed points 0.05, 0.01, 0.005 and 0.001.
+"""
+
+import numpy as np
+
+def article_min_pvalues(n_articles, article, p_value):
+    """
+    Sorted smallest P value of every article that has one.
+
+    Args:
+        n_articles (int): Number of articles.
+        article (np.ndarray): Article index of every P value.
+        p_value (np.ndarray): P values.
+
+    Returns:
+        np.ndarray: float64, ascending, one element per article with a P value.
+    """
+    if len(p_value) == 0:
+        return np.empty(0, dtype=np.float64)
+    min_p = np.full(n_articles, np.inf)
+    np.minimum.at(min_p, article, p_value)
+    min_p = min_p[np.isfinite(min_p)]
+    min_p.sort()
+    return min_p
+
+def threshold_curve(sorted_min_p, thresholds):
+    """
+    Number of articles with a P value <= each threshold.
+
+    Args:
+        sorted_min_p (np.ndarray): Output of article_min_pvalues (ascending).
+        thresholds (array-like): Any number of thresholds, in any order.
+
+    Returns:
+        np.ndarray: int64 counts, one per threshold.
+    """
+    return np.searchsorted(sorted_min_p, np.asarray(thresholds, dtype=np.float64), side='right').astype(np.int64)
+
+def proportion_curve(sorted_min_p, n_articles, thresholds):
+    """Proportion of the ``n_articles`` articles with a P value <= each threshold (0 if there are none)."""
+    counts = threshold_curve(sorted_min_p, thresholds)
+    if n_articles == 0:
+        return np.zeros(len(counts))
+    return counts / n_articles
+
+def merge_sorted(arrays):
+    """One ascending array from several ascending min-P arrays."""
+    arrays = [a for a in arrays if len(a)]
+    if not arrays:
+        return np.empty(0, dtype=np.float64)
+    merged = np.concatenate(arrays)
+    merged.sort(kind='mergesort')
+    return merged
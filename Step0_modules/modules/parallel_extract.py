@@ -0,0 +1,232 @@
+"""
+Multi-process P-value extraction over one text file.
+
+The file is split into byte ranges that end right after a newline, so every
+range holds whole article lines. Workers only receive (path, start, end): each
+one maps the file with mmap, decodes its own range and runs the extractor, so
+no line is ever pickled. A worker returns a compact ChunkAggregate (counts
+and the smallest P value of each article) instead of per-article results;
+merging the aggregates of all chunks gives exactly the numbers of the serial
+loop over iter_articles. A file that only exists block-compressed
+(block_text.py) is split into runs of whole blocks instead; each worker
+reads and decompresses its own blocks.
+
+aggregate_sections counts the body restricted to some of its section files
+(xml_to_txt.py --sections); the files are joined line by line, so one
+partition is one task.
+
+submit_aggregate/collect_aggregate split parallel_aggregate in two, so the
+chunks of many small files can be queued before any result is awaited.
+
+Example:
+
+    total = parallel_aggregate("pmcxtract_list_review_2020_body.txt", workers=8)
+    print(total.n_articles, total.n_with_pvalue, total.threshold_counts)
+"""
+
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from modules.block_text import BlockReader, compressed_path
+from modules.min_pvalues import article_min_pvalues, merge_sorted, threshold_curve
+from modules.step4_sources import iter_section_articles
+from modules.text_to_pval_and_oper import OPERATORS, text_to_pval_and_oper_batch
+
+THRESHOLDS = (0.05, 0.01, 0.005, 0.001)
+CHUNK_SIZE = 16 << 20  # bytes per chunk; a chunk is one task for a worker
+BATCH_SIZE = 1000      # articles per text_to_pval_and_oper_batch call
+
+class ChunkAggregate:
+    """
+    Figure 1/3 counts of a range of articles.
+
+    Only the smallest P value of each article is kept (min_pvalues.py), so
+    any threshold can be asked for afterwards with ``curve``.
+
+    Attributes:
+        n_articles (int): Non-empty article lines.
+        n_with_pvalue (int): Articles with at least one P value.
+        threshold_counts (np.ndarray): Articles whose smallest P value is
+            <= each of ``thresholds``.
+        operator_counts (np.ndarray): P values per operator code (OPERATORS).
+    """
+    def __init__(self, thresholds=THRESHOLDS):
+        self.thresholds = tuple(thresholds)
+        self.n_articles = 0
+        self.min_p_chunks = []
+        self.operator_counts = np.zeros(len(OPERATORS), dtype=np.int64)
+
+    @property
+    def n_with_pvalue(self):
+        return sum(len(min_p) for min_p in self.min_p_chunks)
+
+    @property
+    def threshold_counts(self):
+        return self.curve(self.thresholds)
+
+    def min_pvalues(self):
+        """Sorted smallest P value of every article that has one."""
+        self.min_p_chunks = [merge_sorted(self.min_p_chunks)]
+        return self.min_p_chunks[0]
+
+    def curve(self, thresholds):
+        """Articles whose smallest P value is <= each of ``thresholds``."""
+        return threshold_curve(self.min_pvalues(), thresholds)
+
+    def add_batch(self, lines, engine='regex'):
+        """Extract a batch of stripped, non-empty article lines and count them."""
+        self.add_result(text_to_pval_and_oper_batch(lines, engine=engine), len(lines))
+
+    def add_result(self, result, n_lines):
+        """Count a text_to_pval_and_oper_batch result over ``n_lines`` articles."""
+        self.n_articles += n_lines
+        self.operator_counts += np.bincount(result['operator'], minlength=len(OPERATORS))
+        self.min_p_chunks.append(article_min_pvalues(n_lines, result['article'], result['p_value']))
+
+    def merge(self, other):
+        self.n_articles += other.n_articles
+        self.min_p_chunks.extend(other.min_p_chunks)
+        self.operator_counts += other.operator_counts
+        return self
+
+    def __eq__(self, other):
+        return (self.thresholds == other.thresholds
+                and self.n_articles == other.n_articles
+                and np.array_equal(self.min_pvalues(), other.min_pvalues())
+                and np.array_equal(self.operator_counts, other.operator_counts))
+
+    def row(self):
+        """Counts in the column order printed by the Figure 1/3 scripts."""
+        return [self.n_articles, self.n_with_pvalue] + self.threshold_counts.tolist()
+
+def aggregate_lines(lines, engine='regex', thresholds=THRESHOLDS, batch_size=BATCH_SIZE):
+    """Serial aggregate over an iterable of stripped, non-empty article lines."""
+    total = ChunkAggregate(thresholds)
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            total.add_batch(batch, engine=engine)
+            batch = []
+    if batch:
+        total.add_batch(batch, engine=engine)
+    return total
+
+def chunk_ranges(path, chunk_size=CHUNK_SIZE):
+    """
+    Split a file into byte ranges of about ``chunk_size`` bytes.
+
+    Every range except possibly the last ends right after a b'\\n', so no
+    article line (and no UTF-8 character) is cut in two.
+
+    Returns:
+        list of (start, end) tuples covering the whole file.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    ranges = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            newline = mm.find(b'\n', min(start + chunk_size, size) - 1)
+            end = size if newline < 0 else newline + 1
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+def chunk_lines(data):
+    """
+    Stripped, non-empty lines of a decoded chunk.
+
+    Splits like a file opened in text mode (universal newlines), which is how
+    iter_articles and the Figure scripts read the files.
+    """
+    for line in data.replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+        line = line.strip()
+        if line:
+            yield line
+
+def extract_chunk(path, start, end, engine='regex', thresholds=THRESHOLDS):
+    """Worker: map ``path``, extract the lines in [start, end) and return their ChunkAggregate."""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = mm[start:end].decode('utf-8')
+    return aggregate_lines(chunk_lines(data), engine=engine, thresholds=thresholds)
+
+def block_ranges(data_path, chunk_size=CHUNK_SIZE):
+    """Split a compressed file into [first, stop) runs of blocks holding about ``chunk_size`` bytes of text."""
+    with BlockReader(data_path) as reader:
+        ranges = []
+        first = 0
+        total = 0
+        for i, size in enumerate(reader.text_size.tolist()):
+            total += size
+            if total >= chunk_size:
+                ranges.append((first, i + 1))
+                first = i + 1
+                total = 0
+        if first < len(reader):
+            ranges.append((first, len(reader)))
+    return ranges
+
+def extract_blocks(data_path, first, stop, engine='regex', thresholds=THRESHOLDS):
+    """Worker: decompress blocks [first, stop) of a compressed file and return their ChunkAggregate."""
+    with BlockReader(data_path, threads=1) as reader:
+        data = b''.join(reader.block(i) for i in range(first, stop)).decode('utf-8')
+    return aggregate_lines(chunk_lines(data), engine=engine, thresholds=thresholds)
+
+def aggregate_sections(paths, engine='regex', thresholds=THRESHOLDS):
+    """Worker: ChunkAggregate of the articles of line-aligned section files, their texts joined (iter_section_articles)."""
+    return aggregate_lines(iter_section_articles(paths), engine=engine, thresholds=thresholds)
+
+def submit_aggregate(executor, path, engine='regex', thresholds=THRESHOLDS, chunk_size=CHUNK_SIZE):
+    """
+    Submit the chunk tasks of one text file without waiting for them.
+
+    Submitting the chunks of several files before collecting any keeps all
+    workers busy when the files are small (one chunk each).
+
+    Returns:
+        list: Futures of the ChunkAggregates, in file order; merge them
+        with collect_aggregate.
+    """
+    data_path = None if os.path.exists(path) else compressed_path(path)
+    if data_path:
+        return [executor.submit(extract_blocks, data_path, first, stop, engine, thresholds)
+                for first, stop in block_ranges(data_path, chunk_size)]
+    return [executor.submit(extract_chunk, path, start, end, engine, thresholds)
+            for start, end in chunk_ranges(path, chunk_size)]
+
+def collect_aggregate(futures, thresholds=THRESHOLDS):
+    """Wait for the futures of submit_aggregate and merge their ChunkAggregates."""
+    total = ChunkAggregate(thresholds)
+    # merge in file order; the sums do not depend on it, but this keeps it deterministic
+    for fut in futures:
+        total.merge(fut.result())
+    return total
+
+def parallel_aggregate(path, workers=None, engine='regex', thresholds=THRESHOLDS,
+                       chunk_size=CHUNK_SIZE, executor=None):
+    """
+    Aggregate one text file with several processes.
+
+    Args:
+        path (str): Text file, one article per line.
+        workers (int): Worker processes (default: os.cpu_count()).
+        engine (str): Extraction engine passed to text_to_pval_and_oper_batch.
+        thresholds (tuple): P-value thresholds to count.
+        chunk_size (int): Approximate bytes per task.
+        executor (Executor): Reuse an existing pool instead of starting one,
+            e.g. when aggregating many files in a row.
+
+    Returns:
+        ChunkAggregate: Equal to aggregate_lines(iter_articles(path)).
+    """
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as exe:
+            return parallel_aggregate(path, engine=engine, thresholds=thresholds,
+                                      chunk_size=chunk_size, executor=exe)
+    return collect_aggregate(submit_aggregate(executor, path, engine, thresholds, chunk_size), thresholds)
@@ -2,12 +2,17 @@
 
 import matplotlib.pyplot as plt
 
-def plot_histogram(pvalues):
+def plot_histogram(pvalues, out_path=None):
+    # with out_path the figure is saved instead of shown (no display needed)
     plt.figure(figsize=(10, 5))
     plt.hist(pvalues, bins=[i * 0.001+0.000000000001 for i in range(51)], edgecolor='black')
     plt.title("P Value Distribution (Bin width = 0.001)")
     plt.xlabel("P Value")
     plt.ylabel("No. of P Values")
     plt.tight_layout()
+    if out_path:
+        plt.savefig(out_path)
+        plt.close()
+        return
     plt.show()
     
\ No newline at end of file
@@ -0,0 +1,37 @@
+"""
+Category flags of PMC articles from the Step 3 labels CSV (step4Refined.csv).
+
+Step 3-5 (bucketize_pmcs.py) puts every article into the bucket of each flag
+set in this CSV. 'all-articles' is the superset of the other buckets, and an
+article has the same text in every bucket. Step 4 can therefore extract the
+all-articles files only and derive the other categories by joining the
+results with these flags (see pval_store.derive_partition).
+
+The CSV is read by bucketize_pmcs.load_labels itself, so the flags are the
+ones the buckets were built from.
+"""
+
+import sys
+from pathlib import Path
+
+# bucketize_pmcs.py lives in the Step 3-5 folder of the repository
+BUCKETIZE_DIR = (Path(__file__).resolve().parents[2] / "Step3_parsing_only_for_PMC"
+                 / "Step3_5_Bucketize_pmcs_by_year_and_category")
+if str(BUCKETIZE_DIR) not in sys.path:
+    sys.path.append(str(BUCKETIZE_DIR))
+
+from bucketize_pmcs import BUCKET_BITS, BUCKET_MAP, load_labels
+
+SUPERSET = "all-articles"
+
+def load_category_flags(csv_path):
+    """
+    Load the category flags of every PMC ID in the labels CSV.
+
+    Returns:
+        bucketize_pmcs.LabelIndex: ``.mask(pmc_id)`` is the bitmask of
+        BUCKET_BITS of a PMC ID ('PMC12345', '12345'...), 0 if the CSV does
+        not list it.
+    """
+    labels, _ = load_labels(csv_path)
+    return labels
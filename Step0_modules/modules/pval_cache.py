@@ -0,0 +1,243 @@
+"""
+Persistent cache of per-article P-value extraction results.
+
+Rescanning millions of articles after every tweak of the regex or the
+homogenization rules takes hours, although most tweaks change few matches.
+This cache keeps one row per (extractor version, pmcid, text hash) in a SQLite
+database:
+
+* The extractor version is a hash of EXTRACTOR_VERSION, P_VALUE_PATTERN and
+  the homogenization, number-splitting and rule functions with their tables,
+  so other edits of text_to_pval_and_oper.py keep the cache. A rerun with an unchanged
+  extractor finds every article it already processed, and a re-downloaded
+  article with a different text gets a new hash.
+* Each row also stores a bitmask of the RULES its matches touch, such as a
+  '%' suffix or an exponent. After a change to, say, the percent rule, a
+  "diff" run (``diff_rules=['percent']``) only re-extracts articles whose
+  previous results touched 'percent'. All other articles copy their previous
+  results under the new version.
+
+Diff mode is meant for changes to the homogenization rules. A change to the
+pattern itself can create matches in articles that had none, so it needs a
+full run.
+
+Example:
+
+    cache = ExtractionCache("/Volumes/ssd4TB/20251080/state/pval_cache.sqlite")
+    p_value, operator, offset = cache.extract(line)
+    cache.close()
+"""
+
+import hashlib
+import inspect
+import os
+import sqlite3
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from modules import text_to_pval_and_oper as extractor
+from modules.step4_sources import article_id
+from modules.text_to_pval_and_oper import LITERAL_CACHE_SIZE, OPERATOR_CODES, extract_matches, number_groups
+
+# Rules whose matches an article touches, one bit each.
+RULES = OrderedDict([
+    ("percent",           1 << 0),  # '%' suffix
+    ("exponent",          1 << 1),  # x/×/e/E/exp suffix, base or exponent group
+    ("separator",         1 << 2),  # ',' or '•' used as decimal separator
+    ("word_operator",     1 << 3),  # 'less than', 'of <'
+    ("compound_operator", 1 << 4),  # '≤', '≥' or several signs such as '<=', '<>'
+    ("discarded",         1 << 5),  # match thrown away ('.int' typo, outside (0, 1))
+])
+
+def extractor_version():
+    """
+    Short hash of EXTRACTOR_VERSION, P_VALUE_PATTERN, the RULES bits and
+    everything that turns the matched operator and number texts into cached
+    results: the source of the homogenization and number-splitting functions
+    and the translate table and character sets they use. It changes whenever
+    any of them does; edits to the engines alone keep it.
+    """
+    h = hashlib.sha1(f"{extractor.EXTRACTOR_VERSION}\n{extractor.P_VALUE_PATTERN}\n".encode('utf-8'))
+    for function in (extractor.replace, extractor.to_pval_and_oper, extractor.parse_literal,
+                     extractor.number_groups, extractor._scan_number, extractor._scan_exponent,
+                     extractor._skip_space, extractor._skip_digits, literal_rules):
+        h.update(inspect.getsource(function).encode('utf-8'))
+    for data in (sorted(extractor._NORMALIZE_TABLE.items()), extractor._DIGITS, extractor._SEPARATORS,
+                 extractor._EXP_TOKENS, list(RULES.items())):
+        h.update(repr(data).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+def text_hash(line):
+    return hashlib.blake2b(line.encode('utf-8'), digest_size=16).digest()
+
+def rule_mask(rule_names):
+    return sum(RULES[name] for name in set(rule_names))
+
+@lru_cache(maxsize=LITERAL_CACHE_SIZE)
+def literal_rules(operator_str, raw_value_str):
+    """Bitmask of RULES but 'discarded' touched by a match with these operator and number texts."""
+    op = operator_str.strip()
+    num = raw_value_str
+    _, base, exponent = number_groups(num)
+    rules = 0
+    if '%' in num:
+        rules |= RULES['percent']
+    if base or exponent or any(c in num for c in 'x×eE'):
+        rules |= RULES['exponent']
+    if ',' in num or '•' in num:
+        rules |= RULES['separator']
+    if 'less' in op or 'of' in op:
+        rules |= RULES['word_operator']
+    if len(op) > 1 or '≤' in op or '≥' in op:
+        rules |= RULES['compound_operator']
+    return rules
+
+def match_rules(operator_str, raw_value_str, parsed):
+    """Bitmask of RULES touched by one match of extract_matches."""
+    rules = literal_rules(operator_str, raw_value_str)
+    if parsed is None:
+        rules |= RULES['discarded']
+    return rules
+
+def extract_article(line, engine='regex'):
+    """
+    Extract one article line.
+
+    Returns:
+        tuple: (rules, p_value, operator, offset) with float64, uint8 and
+        int64 arrays of the kept matches, as in text_to_pval_and_oper_batch.
+    """
+    rules = 0
+    p_value = []
+    operator = []
+    offset = []
+    for parsed, start, end, operator_str, raw_value_str in extract_matches(line, engine=engine):
+        rules |= match_rules(operator_str, raw_value_str, parsed)
+        if parsed is None:
+            continue
+        p_value.append(parsed[0])
+        operator.append(OPERATOR_CODES[parsed[1]])
+        offset.append(start)
+    return (rules,
+            np.array(p_value, dtype=np.float64),
+            np.array(operator, dtype=np.uint8),
+            np.array(offset, dtype=np.int64))
+
+def _decode(p_value, operator, offset):
+    return (np.frombuffer(p_value, dtype=np.float64),
+            np.frombuffer(operator, dtype=np.uint8),
+            np.frombuffer(offset, dtype=np.int64))
+
+class ExtractionCache:
+    """
+    Thin wrapper around the SQLite database holding extraction results.
+
+    Inserts are batched like StateDB in bucketize_pmcs.py and the database
+    runs in WAL mode, so several extraction workers can share one file.
+    ``stats`` counts articles served from the cache ('hits'), copied from a
+    previous version in diff mode ('reused') and actually scanned
+    ('extracted').
+    """
+    def __init__(self, path, version=None):
+        self.path = path
+        self.version = version or extractor_version()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extractions(
+                version TEXT,
+                pmcid TEXT,
+                text_hash BLOB,
+                rules INTEGER,
+                p_value BLOB,
+                operator BLOB,
+                offset BLOB,
+                PRIMARY KEY (version, pmcid, text_hash)
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS extractions_article ON extractions(pmcid, text_hash)")
+        self.conn.commit()
+        self.batch = []
+        self.stats = {'hits': 0, 'reused': 0, 'extracted': 0}
+
+    def lookup(self, pmcid, digest):
+        """Return (rules, p_value, operator, offset) cached for this version, or None."""
+        row = self.conn.execute(
+            "SELECT rules, p_value, operator, offset FROM extractions WHERE version=? AND pmcid=? AND text_hash=?",
+            (self.version, pmcid, digest),
+        ).fetchone()
+        if row is None:
+            return None
+        return (row[0],) + _decode(*row[1:])
+
+    def lookup_previous(self, pmcid, digest):
+        """Return the most recent (rules, p_value, operator, offset) of another version, or None."""
+        row = self.conn.execute(
+            "SELECT rules, p_value, operator, offset FROM extractions "
+            "WHERE pmcid=? AND text_hash=? AND version!=? ORDER BY rowid DESC LIMIT 1",
+            (pmcid, digest, self.version),
+        ).fetchone()
+        if row is None:
+            return None
+        return (row[0],) + _decode(*row[1:])
+
+    def store(self, pmcid, digest, rules, p_value, operator, offset):
+        self.batch.append((self.version, pmcid, digest, rules,
+                           p_value.tobytes(), operator.tobytes(), offset.tobytes()))
+        # Flush in batches of 1000
+        if len(self.batch) >= 1000:
+            self.flush()
+
+    def extract(self, line, engine='regex', diff_rules=None):
+        """
+        Cached extraction of one article line.
+
+        Args:
+            line (str): Stripped article line ("PMCID text").
+            engine (str): Extraction engine used on a cache miss.
+            diff_rules (iterable of str): Diff mode. Names of the RULES that
+                changed since the previous version. Articles whose previous
+                results touch none of them are copied instead of re-extracted.
+
+        Returns:
+            tuple: (p_value, operator, offset) arrays.
+        """
+        pmcid = article_id(line)
+        digest = text_hash(line)
+        cached = self.lookup(pmcid, digest)
+        if cached is not None:
+            self.stats['hits'] += 1
+            return cached[1:]
+        if diff_rules is not None:
+            previous = self.lookup_previous(pmcid, digest)
+            if previous is not None and not previous[0] & rule_mask(diff_rules):
+                self.stats['reused'] += 1
+                self.store(pmcid, digest, *previous)
+                return previous[1:]
+        self.stats['extracted'] += 1
+        rules, p_value, operator, offset = extract_article(line, engine=engine)
+        self.store(pmcid, digest, rules, p_value, operator, offset)
+        return p_value, operator, offset
+
+    def flush(self):
+        """Persist the batched results to the database."""
+        if not self.batch:
+            return
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO extractions(version, pmcid, text_hash, rules, p_value, operator, offset) "
+            "VALUES (?,?,?,?,?,?,?)",
+            self.batch,
+        )
+        self.conn.commit()
+        self.batch.clear()
+
+    def close(self):
+        """Flush any outstanding results and close the database connection."""
+        self.flush()
+        self.conn.close()
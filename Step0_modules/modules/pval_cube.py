@@ -0,0 +1,253 @@
+"""
+Precomputed P-value histogram cube for Figures 1, 2 and 3.
+
+build_cube reads the P-value store (pval_store.py) once and writes three
+NumPy arrays to a folder, next to an axes.json describing their axes:
+
+    pvalues.npy      int32 [source, field, year, fine bin, operator]
+                     number of P values
+    min_pvalues.npy  int32 [source, field, year, fine bin]
+                     number of articles whose smallest P value is in the bin
+    articles.npy     int64 [source, field, year]
+                     number of articles
+
+Fine bins are FINE_BIN_WIDTH (0.0001) wide and cover (0, 1], which holds
+every P value kept by the extractor. Bin k (0-based) holds
+(edge[k], edge[k + 1]], with edges rounded to the exact decimals, and P = 0
+goes to bin 0 (see fine_bin_indices and fig2_fine_bin_indices for P values
+within float noise of an edge). PValueCube memory-maps the arrays. It re-aggregates them into
+any coarser bin width that is a multiple of the fine width, any year range
+and any field subset, without touching the store or the text files:
+
+    cube = PValueCube("/Volumes/ssd4TB/20251080/pval_cube")
+    table = cube.fig2_table('pmc_body', 'review', range(2015, 2026))
+    n, n_with, counts = cube.threshold_counts('pmc_body', 'review', [2020], (0.05, 0.01))
+"""
+
+import json
+import os
+
+import numpy as np
+
+from modules.fig2_bins import BIN_WIDTH, COLUMNS, NUM_BINS, bin_indices
+from modules.min_pvalues import article_min_pvalues
+from modules.pval_store import THRESHOLDS, partition_arrays, partition_path
+from modules.step4_manifest import file_stamp, partition_key
+from modules.step4_sources import SOURCES, YEARS
+
+FINE_BIN_WIDTH = 0.0001
+FINE_DECIMALS = 4
+N_FINE_BINS = 10000  # (0, 1]
+ARRAYS = ('pvalues', 'min_pvalues', 'articles')
+
+def fine_edges():
+    """Upper edges of the fine bins, rounded to exact decimals (0.0001 .. 1.0), with 0 first."""
+    return np.round(np.arange(N_FINE_BINS + 1) * FINE_BIN_WIDTH, FINE_DECIMALS)
+
+_EDGES = fine_edges()
+
+def fine_bin_indices(p_values):
+    """
+    0-based fine bin of every P value: bin k iff edge[k] < p <= edge[k + 1].
+
+    P = 0 goes to bin 0, like Figure 2. Since the edges are the floats of the
+    decimal literals, summing bins up to a threshold such as 0.05 counts
+    exactly the P values with ``p <= 0.05``.
+    """
+    index = np.searchsorted(_EDGES, np.asarray(p_values, dtype=np.float64), side='left') - 1
+    return np.clip(index, 0, N_FINE_BINS - 1)
+
+def fig2_fine_bin_indices(p_values):
+    """
+    fine_bin_indices, moved into the Figure 2 bin of fig2_bins.bin_indices.
+
+    The Figure 2 rule divides by the bin width, so a few P values that carry
+    float noise right at an edge (9 * 10**-3 = 0.009000000000000001) land on
+    the other side of that edge. Moving their fine bin across the edge keeps
+    PValueCube.fig2_table exactly equal to fig2_bins.crosstab at the default
+    width; other widths use the fine bins as they are.
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    index = fine_bin_indices(p_values)
+    ratio = _ratio(BIN_WIDTH)
+    fig2_index = bin_indices(p_values, BIN_WIDTH, NUM_BINS)
+    inner = fig2_index < NUM_BINS
+    index[inner] = np.clip(index[inner], (fig2_index[inner] - 1) * ratio, fig2_index[inner] * ratio - 1)
+    return index
+
+def _ratio(width):
+    """Number of fine bins per bin of ``width``; raises ValueError if it is not a multiple."""
+    ratio = int(round(width / FINE_BIN_WIDTH))
+    if ratio < 1 or abs(ratio * FINE_BIN_WIDTH - width) > 1e-12:
+        raise ValueError(f"bin width {width} is not a multiple of the fine bin width {FINE_BIN_WIDTH}")
+    return ratio
+
+def _partition_stamp(store_dir, source, field, year):
+    """(size, mtime_ns) of the 'articles' file of a store partition, or None."""
+    stamp = file_stamp(partition_path(store_dir, 'articles', source, field, year))
+    return list(stamp) if stamp else None
+
+def _write_axes(cube_dir, axes):
+    tmp_path = os.path.join(cube_dir, "axes.tmp.json")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(axes, f, indent=1)
+    os.replace(tmp_path, os.path.join(cube_dir, "axes.json"))
+
+def _read_axes(cube_dir):
+    path = os.path.join(cube_dir, "axes.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def build_cube(store_dir, cube_dir, sources=None, years=YEARS, rebuild=False):
+    """
+    Aggregate the P-value store into the cube.
+
+    Partitions that were never extracted count as empty. axes.json records
+    the stamp (size, mtime) of every store partition the cube was built
+    from. An existing cube with the same axes is updated in place: only
+    partitions whose stamp changed since are read again.
+
+    Args:
+        rebuild (bool): Ignore an existing cube and aggregate every partition.
+
+    Returns:
+        tuple: (axes written to axes.json, number of partitions aggregated)
+    """
+    sources = list(sources or SOURCES)
+    years = list(years)
+    n_fields = max(len(SOURCES[source]['fields']) for source in sources)
+    shape = (len(sources), n_fields, len(years))
+    axes = {
+        'sources': sources,
+        'fields': {source: list(SOURCES[source]['fields']) for source in sources},
+        'years': years,
+        'fine_bin_width': FINE_BIN_WIDTH,
+        'n_fine_bins': N_FINE_BINS,
+        'operators': list(COLUMNS),
+    }
+    cells = [(s, f, y, source, field, year)
+             for s, source in enumerate(sources)
+             for f, field in enumerate(SOURCES[source]['fields'])
+             for y, year in enumerate(years)]
+    stamps = {partition_key(source, field, year): _partition_stamp(store_dir, source, field, year)
+              for _, _, _, source, field, year in cells}
+
+    previous = None if rebuild else _read_axes(cube_dir)
+    in_place = previous is not None and all(previous.get(k) == v for k, v in axes.items())
+    if in_place:
+        old_stamps = previous.get('partitions', {})
+        stale = [cell for cell in cells
+                 if old_stamps.get(partition_key(*cell[3:])) != stamps[partition_key(*cell[3:])]]
+        # forget the stamps of stale partitions before touching their cells,
+        # so that an interrupted update is redone next time
+        stale_keys = {partition_key(*cell[3:]) for cell in stale}
+        _write_axes(cube_dir, dict(axes, partitions={k: v for k, v in old_stamps.items() if k not in stale_keys}))
+        pvalues, min_pvalues, articles = (np.load(os.path.join(cube_dir, f"{name}.npy"), mmap_mode='r+')
+                                          for name in ARRAYS)
+    else:
+        stale = cells
+        pvalues = np.zeros(shape + (N_FINE_BINS, len(COLUMNS)), dtype=np.int32)
+        min_pvalues = np.zeros(shape + (N_FINE_BINS,), dtype=np.int32)
+        articles = np.zeros(shape, dtype=np.int64)
+
+    for s, f, y, source, field, year in stale:
+        n_articles, article, p_value, operator = partition_arrays(store_dir, source, field, year)
+        articles[s, f, y] = n_articles
+        pvalues[s, f, y] = 0
+        min_pvalues[s, f, y] = 0
+        if len(p_value) == 0:
+            continue
+        cell_index = fig2_fine_bin_indices(p_value) * len(COLUMNS) + operator.astype(np.int64)
+        pvalues[s, f, y] = np.bincount(cell_index, minlength=N_FINE_BINS * len(COLUMNS)).reshape(N_FINE_BINS, len(COLUMNS))
+        min_p = article_min_pvalues(n_articles, article, p_value)
+        min_pvalues[s, f, y] = np.bincount(fine_bin_indices(min_p), minlength=N_FINE_BINS)
+
+    os.makedirs(cube_dir, exist_ok=True)
+    if in_place:
+        for array in (pvalues, min_pvalues, articles):
+            array.flush()
+    else:
+        for name, array in zip(ARRAYS, (pvalues, min_pvalues, articles)):
+            tmp_path = os.path.join(cube_dir, f"{name}.tmp.npy")
+            np.save(tmp_path, array)
+            os.replace(tmp_path, os.path.join(cube_dir, f"{name}.npy"))
+    # axes.json goes last: it marks the cube as complete
+    axes['partitions'] = stamps
+    _write_axes(cube_dir, axes)
+    return axes, len(stale)
+
+class PValueCube:
+    """
+    Read-only, memory-mapped view of a cube written by build_cube.
+
+    ``fields`` and ``years`` arguments accept a single value or a list; the
+    selected cells are summed.
+    """
+    def __init__(self, cube_dir):
+        with open(os.path.join(cube_dir, "axes.json"), encoding='utf-8') as f:
+            self.axes = json.load(f)
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(cube_dir, f"{name}.npy"), mmap_mode='r'))
+
+    def _index(self, source, fields, years):
+        if isinstance(fields, str):
+            fields = [fields]
+        if isinstance(years, int):
+            years = [years]
+        source_fields = self.axes['fields'][source]
+        cube_years = self.axes['years']
+        s = self.axes['sources'].index(source)
+        f = [source_fields.index(field) for field in fields]
+        y = [cube_years.index(year) for year in years if year in cube_years]
+        return s, np.array(f, dtype=np.intp), np.array(y, dtype=np.intp)
+
+    def _select(self, array, source, fields, years):
+        s, f, y = self._index(source, fields, years)
+        return array[s][np.ix_(f, y)].sum(axis=(0, 1))
+
+    def missing_years(self, source, field, years):
+        """Years of ``years`` whose store partition of (source, field) the cube was built without."""
+        stamps = self.axes.get('partitions', {})
+        return [year for year in years if stamps.get(partition_key(source, field, year)) is None]
+
+    def n_articles(self, source, fields, years):
+        return int(self._select(self.articles, source, fields, years))
+
+    def n_pvalues(self, source, fields, years):
+        return int(self._select(self.pvalues, source, fields, years).sum())
+
+    def fine_table(self, source, fields, years):
+        """int64 array (N_FINE_BINS, operators) summed over the selected fields and years."""
+        return self._select(self.pvalues, source, fields, years).astype(np.int64)
+
+    def fig2_table(self, source, fields, years, bin_width=BIN_WIDTH, num_bins=NUM_BINS):
+        """
+        Figure 2 bins x operator table, as fig2_bins.crosstab of the same P values.
+
+        ``bin_width`` must be a multiple of FINE_BIN_WIDTH. Bin k (1-based)
+        collects fine bins up to k * bin_width; the last bin collects all
+        P > bin_width * (num_bins - 1).
+        """
+        ratio = _ratio(bin_width)
+        fine = self.fine_table(source, fields, years)
+        # coarse bin (0-based) of every fine bin, with the Figure 2 clamping
+        coarse = np.arange(N_FINE_BINS) // ratio
+        coarse[np.arange(N_FINE_BINS) >= ratio * (num_bins - 1)] = num_bins - 1
+        table = np.zeros((num_bins, fine.shape[1]), dtype=np.int64)
+        np.add.at(table, coarse, fine)
+        return table
+
+    def threshold_counts(self, source, fields, years, thresholds=THRESHOLDS):
+        """
+        Figure 1/3 statistics, as pval_store.threshold_counts.
+
+        Each threshold must be a multiple of FINE_BIN_WIDTH.
+
+        Returns:
+            tuple: (n_articles, n_with_pvalue, counts)
+        """
+        min_p = np.cumsum(self._select(self.min_pvalues, source, fields, years).astype(np.int64))
+        counts = [int(min_p[_ratio(t) - 1]) for t in thresholds]
+        return self.n_articles(source, fields, years), int(min_p[-1]), counts
@@ -0,0 +1,258 @@
+"""
+Persistent per-article P-value store for Step 4.
+
+The extraction stage (Step4_text_analysis/extract_pvalues.py) runs
+text_to_pval_and_oper once per article and writes a hive-partitioned Parquet
+dataset with one partition per (source, field, year):
+
+    {store}/pvalues/source={source}/field={field}/year={year}/part-0.parquet
+        article   int32    row of the article in the 'articles' table
+        pmcid     string   PMCID (PMID for PubMed abstracts)
+        p_value   float64
+        operator  uint8    code into OPERATORS ('<', '=', '>', 'ambiguous')
+        offset    int64    character offset of the match in the article line
+
+    {store}/articles/source={source}/field={field}/year={year}/part-0.parquet
+        pmcid     string
+        n_pvalues int32
+
+    {store}/min_p/source={source}/field={field}/year={year}/part-0.parquet
+        min_p     float64  smallest P value of each article that has one,
+                           ascending (see min_pvalues.py)
+
+source is 'pubmed_abs', 'pmc_abs' or 'pmc_body' (see step4_sources). The
+'articles' file of a partition is written last, so a partition is complete
+once it exists. The Figure scripts only aggregate these tables.
+
+For the PMC sources, only the 'all-articles' partitions need to be extracted:
+derive_partition builds the other categories from them and the category
+flags of the Step 3 labels CSV, so no article is scanned twice.
+"""
+
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from modules.min_pvalues import article_min_pvalues, threshold_curve
+from modules.pmc_labels import BUCKET_BITS, SUPERSET
+from modules.step4_sources import article_id, iter_articles, source_path, text_exists
+from modules.text_to_pval_and_oper import text_to_pval_and_oper_batch
+
+TABLES = ('pvalues', 'min_p', 'articles')
+THRESHOLDS = (0.05, 0.01, 0.005, 0.001)
+
+def partition_path(store_dir, table, source, field, year):
+    return os.path.join(store_dir, table, f"source={source}", f"field={field}", f"year={year}", "part-0.parquet")
+
+def has_partition(store_dir, source, field, year):
+    return os.path.exists(partition_path(store_dir, 'articles', source, field, year))
+
+def _write_table(table, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+def _write_partition(store_dir, source, field, year, pvalues, articles):
+    min_p = article_min_pvalues(articles.num_rows, pvalues.column('article').to_numpy(),
+                                pvalues.column('p_value').to_numpy())
+    _write_table(pvalues, partition_path(store_dir, 'pvalues', source, field, year))
+    _write_table(pa.table({'min_p': min_p}), partition_path(store_dir, 'min_p', source, field, year))
+    # 'articles' goes last: it marks the partition as complete
+    _write_table(articles, partition_path(store_dir, 'articles', source, field, year))
+
+def extract_partition(store_dir, source, field, year, text_root=None, engine='regex',
+                      batch_size=1000, overwrite=False, cache=None, diff_rules=None):
+    """
+    Extract every P value of one (source, field, year) text file into the store.
+
+    Args:
+        store_dir (str): Root folder of the store.
+        source, field, year: Partition to extract (see step4_sources).
+        text_root (str): Overrides the default text folder of the source.
+        engine (str): Extraction engine passed to text_to_pval_and_oper_batch.
+        batch_size (int): Articles per extraction batch; bounds memory on
+            body files.
+        overwrite (bool): Re-extract even if the partition already exists.
+        cache (ExtractionCache): If given, articles are looked up in (and
+            added to) this extraction-result cache instead of scanned in
+            batches (see pval_cache.py).
+        diff_rules (iterable of str): Diff mode of the cache.
+
+    Returns:
+        int or None: Number of articles, or None if the text file is missing.
+        An existing partition is not re-extracted unless ``overwrite``.
+    """
+    if not overwrite and has_partition(store_dir, source, field, year):
+        return pq.read_metadata(partition_path(store_dir, 'articles', source, field, year)).num_rows
+
+    path = source_path(source, field, year, text_root)
+    if not text_exists(path):
+        return None
+
+    pmcids = []
+    n_pvalues = []
+    chunks = {'article': [], 'p_value': [], 'operator': [], 'offset': []}
+    batch = []
+
+    def flush():
+        result = text_to_pval_and_oper_batch(batch, engine=engine)
+        chunks['article'].append(result['article'].astype(np.int32) + len(pmcids))
+        chunks['p_value'].append(result['p_value'])
+        chunks['operator'].append(result['operator'])
+        chunks['offset'].append(result['start'])
+        n_pvalues.append(np.bincount(result['article'], minlength=len(batch)).astype(np.int32))
+        pmcids.extend(article_id(line) for line in batch)
+        batch.clear()
+
+    def add_cached(line):
+        p_value, operator, offset = cache.extract(line, engine=engine, diff_rules=diff_rules)
+        chunks['article'].append(np.full(len(p_value), len(pmcids), dtype=np.int32))
+        chunks['p_value'].append(p_value)
+        chunks['operator'].append(operator)
+        chunks['offset'].append(offset)
+        n_pvalues.append(np.array([len(p_value)], dtype=np.int32))
+        pmcids.append(article_id(line))
+
+    for line in iter_articles(path):
+        if cache is not None:
+            add_cached(line)
+            continue
+        batch.append(line)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    if cache is not None:
+        cache.flush()
+
+    article = np.concatenate(chunks['article']) if chunks['article'] else np.empty(0, dtype=np.int32)
+    pmcid_dict = pa.array(pmcids, type=pa.string())
+    pvalues = pa.table({
+        'article': article,
+        'pmcid': pa.DictionaryArray.from_arrays(pa.array(article, type=pa.int32()), pmcid_dict),
+        'p_value': np.concatenate(chunks['p_value']) if chunks['p_value'] else np.empty(0, dtype=np.float64),
+        'operator': np.concatenate(chunks['operator']) if chunks['operator'] else np.empty(0, dtype=np.uint8),
+        'offset': np.concatenate(chunks['offset']) if chunks['offset'] else np.empty(0, dtype=np.int64),
+    })
+    articles = pa.table({
+        'pmcid': pmcid_dict,
+        'n_pvalues': np.concatenate(n_pvalues) if n_pvalues else np.empty(0, dtype=np.int32),
+    })
+    _write_partition(store_dir, source, field, year, pvalues, articles)
+    return len(pmcids)
+
+def derive_partition(store_dir, source, field, year, flags, superset=SUPERSET, overwrite=False):
+    """
+    Build a category partition from the superset partition of the same year.
+
+    Every article of a category bucket is also in the 'all-articles' bucket of
+    its year with the same text (pmc_labels), so its P values are already in
+    the superset partition. This keeps the superset articles whose flags
+    include ``field``, renumbering 'article' but leaving all other columns as
+    they are. Figure statistics do not depend on article order.
+
+    Args:
+        flags (LabelIndex): category flags, from pmc_labels.load_category_flags.
+
+    Returns:
+        int or None: Number of articles, or None if the superset partition
+        was never extracted.
+    """
+    if not overwrite and has_partition(store_dir, source, field, year):
+        return pq.read_metadata(partition_path(store_dir, 'articles', source, field, year)).num_rows
+    articles = read_partition(store_dir, 'articles', source, superset, year)
+    if articles is None:
+        return None
+    pvalues = read_partition(store_dir, 'pvalues', source, superset, year)
+
+    bit = BUCKET_BITS[field]
+    pmcids = articles.column('pmcid').to_pylist()
+    keep = np.array([bool(flags.mask(pmcid) & bit) for pmcid in pmcids], dtype=bool)
+    new_index = np.cumsum(keep, dtype=np.int64) - 1
+    article = pvalues.column('article').to_numpy()
+    rows = keep[article] if len(article) else np.zeros(0, dtype=bool)
+
+    articles = articles.filter(pa.array(keep))
+    pmcid_dict = articles.column('pmcid').combine_chunks()
+    article = new_index[article[rows]].astype(np.int32)
+    pvalues = pvalues.filter(pa.array(rows))
+    pvalues = pa.table({
+        'article': article,
+        'pmcid': pa.DictionaryArray.from_arrays(pa.array(article, type=pa.int32()), pmcid_dict),
+        'p_value': pvalues.column('p_value'),
+        'operator': pvalues.column('operator'),
+        'offset': pvalues.column('offset'),
+    })
+    _write_partition(store_dir, source, field, year, pvalues, articles)
+    return articles.num_rows
+
+def read_partition(store_dir, table, source, field, year, columns=None):
+    """Return one partition of ``table`` as a pyarrow Table, or None if it was never extracted."""
+    if not has_partition(store_dir, source, field, year):
+        return None
+    return pq.read_table(partition_path(store_dir, table, source, field, year), columns=columns)
+
+def partition_arrays(store_dir, source, field, year):
+    """
+    NumPy view of one partition.
+
+    Returns:
+        tuple: (n_articles, article, p_value, operator) where the three
+        arrays have one element per P value. A partition that was never
+        extracted (missing text file) has no articles.
+    """
+    articles = read_partition(store_dir, 'articles', source, field, year, columns=['n_pvalues'])
+    if articles is None:
+        empty = np.empty(0)
+        return 0, empty.astype(np.int32), empty, empty.astype(np.uint8)
+    pvalues = read_partition(store_dir, 'pvalues', source, field, year, columns=['article', 'p_value', 'operator'])
+    return (articles.num_rows,
+            pvalues.column('article').to_numpy(),
+            pvalues.column('p_value').to_numpy(),
+            pvalues.column('operator').to_numpy())
+
+def partition_min_pvalues(store_dir, source, field, year):
+    """
+    Per-article smallest P values of one partition.
+
+    Returns:
+        tuple: (n_articles, min_p) with min_p sorted ascending. Partitions
+        written before the 'min_p' table existed are computed from 'pvalues'.
+    """
+    path = partition_path(store_dir, 'min_p', source, field, year)
+    if has_partition(store_dir, source, field, year) and os.path.exists(path):
+        n_articles = pq.read_metadata(partition_path(store_dir, 'articles', source, field, year)).num_rows
+        return n_articles, pq.read_table(path).column('min_p').to_numpy()
+    n_articles, article, p_value, _ = partition_arrays(store_dir, source, field, year)
+    return n_articles, article_min_pvalues(n_articles, article, p_value)
+
+def threshold_counts(store_dir, source, field, year, thresholds=THRESHOLDS):
+    """
+    Figure 1/3 statistics of one partition.
+
+    Returns:
+        tuple: (n_articles, n_with_pvalue, counts) where counts[i] is the
+        number of articles with at least one P value <= thresholds[i].
+    """
+    n_articles, min_p = partition_min_pvalues(store_dir, source, field, year)
+    return n_articles, len(min_p), threshold_curve(min_p, thresholds).tolist()
+
+def pvalue_arrays(store_dir, source, field, years):
+    """
+    All P values of one (source, field) over ``years``, for Figure 2.
+
+    Returns:
+        tuple: (n_articles, p_value, operator).
+    """
+    n_total = 0
+    p_values = []
+    operators = []
+    for year in years:
+        n_articles, _, p_value, operator = partition_arrays(store_dir, source, field, year)
+        n_total += n_articles
+        p_values.append(p_value)
+        operators.append(operator)
+    return n_total, np.concatenate(p_values), np.concatenate(operators).astype(np.uint8)
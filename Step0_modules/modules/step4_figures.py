@@ -0,0 +1,137 @@
+"""
+Fused Figure 1/2/3 aggregation for Step 4.
+
+The Figure 1 and Figure 3 scripts print, per field and year, the number of
+articles, the articles with a P value and the articles with a P value <= .05,
+.01, .005 and .001. The Figure 2 script prints, per field, a histogram of the
+P values of 2015-2025 in bins of 0.001 split by operator. The three scripts
+loop over the same files. FigureAggregator reads and extracts every file once
+and fills the accumulators of all three figures from the same batch result.
+The printed tables are the same as the scripts' output.
+"""
+
+import numpy as np
+
+from modules.fig2_bins import BIN_WIDTH, COLUMNS, NUM_BINS, crosstab, table_lines
+from modules.parallel_extract import BATCH_SIZE, THRESHOLDS, ChunkAggregate
+from modules.step4_sources import SOURCES, YEARS, iter_articles, open_text
+from modules.text_to_pval_and_oper import stream_pval_and_oper_batch, text_to_pval_and_oper_batch
+
+FIG2_YEARS = range(2015, 2025 + 1)
+
+class FileAggregate:
+    """
+    Figure 1/2/3 accumulators of one text file.
+
+    Attributes:
+        counts (ChunkAggregate): Figure 1/3 counts.
+        bins (np.ndarray): Figure 2 bin x operator table (fig2_bins.crosstab).
+        n_pvalues (int): P values counted in ``bins``.
+    """
+    def __init__(self, thresholds=THRESHOLDS):
+        self.counts = ChunkAggregate(thresholds)
+        self.bins = np.zeros((NUM_BINS, len(COLUMNS)), dtype=np.int64)
+        self.n_pvalues = 0
+
+    def add_batch(self, lines, engine='regex', fig2=True):
+        self.add_result(text_to_pval_and_oper_batch(lines, engine=engine), len(lines), fig2=fig2)
+
+    def add_result(self, result, n_lines, fig2=True):
+        self.counts.add_result(result, n_lines)
+        if not fig2:
+            return
+        self.bins += crosstab(result['p_value'], result['operator'], BIN_WIDTH, NUM_BINS)
+        self.n_pvalues += len(result['p_value'])
+
+def aggregate_file(path, engine='regex', fig2=True, thresholds=THRESHOLDS, batch_size=BATCH_SIZE,
+                   window_size=None):
+    """
+    Read and extract one text file once, filling all figure accumulators.
+
+    Args:
+        path (str): Text file, one article per line. A missing file counts as
+            empty, like a partition missing from the P-value store.
+        fig2 (bool): Also fill the Figure 2 histogram (years in FIG2_YEARS).
+        window_size (int): If given, stream every line to the engine in
+            windows of about this many characters instead of reading it
+            whole (text_to_pval_and_oper.stream_pval_and_oper_batch); the
+            counts are the same, memory per article is bounded.
+
+    Returns:
+        FileAggregate
+    """
+    total = FileAggregate(thresholds)
+    if window_size:
+        try:
+            with open_text(path) as f:
+                for n_lines, result in stream_pval_and_oper_batch(f, engine, window_size, batch_size):
+                    total.add_result(result, n_lines, fig2=fig2)
+        except FileNotFoundError:
+            pass
+        return total
+    try:
+        articles = iter_articles(path)
+        batch = []
+        for line in articles:
+            batch.append(line)
+            if len(batch) >= batch_size:
+                total.add_batch(batch, engine=engine, fig2=fig2)
+                batch = []
+        if batch:
+            total.add_batch(batch, engine=engine, fig2=fig2)
+    except FileNotFoundError:
+        pass
+    return total
+
+class FigureAggregator:
+    """
+    Per-source collector of FileAggregates, printing the Figure 1/2/3 tables.
+
+    Example:
+
+        agg = FigureAggregator('pmc_body')
+        for field, year in agg.jobs():
+            agg.add(field, year, aggregate_file(path, fig2=year in agg.fig2_years))
+        print("\\n".join(agg.fig1_lines()))
+    """
+    def __init__(self, source, fields=None, years=YEARS, fig2_years=FIG2_YEARS):
+        self.source = source
+        self.fields = list(fields or SOURCES[source]['fields'])
+        self.years = list(years)
+        self.fig2_years = set(fig2_years)
+        self.files = {}
+
+    def jobs(self):
+        """(field, year) of every file, in printing order."""
+        return [(field, year) for field in self.fields for year in self.years]
+
+    def add(self, field, year, file_aggregate):
+        self.files[(field, year)] = file_aggregate
+
+    def fig1_lines(self):
+        """Output of the Figure 1 (and Figure 3) script of this source."""
+        lines = []
+        for field in self.fields:
+            lines.append(f'field: {field}')
+            for year in self.years:
+                row = self.files[(field, year)].counts.row()
+                lines.append('\t'.join(str(v) for v in [year] + row))
+        return lines
+
+    def fig2_lines(self):
+        """Output of the Fig2_*_to_pval script of this source."""
+        lines = []
+        for field in self.fields:
+            bins = np.zeros((NUM_BINS, len(COLUMNS)), dtype=np.int64)
+            total_articles = 0
+            total_pvalues = 0
+            for year in self.years:
+                if year not in self.fig2_years:
+                    continue
+                file_aggregate = self.files[(field, year)]
+                bins += file_aggregate.bins
+                total_articles += file_aggregate.counts.n_articles
+                total_pvalues += file_aggregate.n_pvalues
+            lines.extend(table_lines(field, bins, BIN_WIDTH))
+            lines.append(f"total article {total_articles} total pvalue {total_pvalues}")
+        return lines
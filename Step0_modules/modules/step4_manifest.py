@@ -0,0 +1,98 @@
+"""
+Input fingerprints of the Step 4 P-value store.
+
+The store keeps one partition per (source, field, year). The manifest
+({store}/manifest.json) records, for each partition, the fingerprint of the
+input it was built from:
+
+    extracted partitions  text file path, size, mtime and content hash
+    derived partitions    content hash of the all-articles text file and of
+                          the labels CSV (see pval_store.derive_partition)
+
+extract_pvalues.py compares the current inputs with the manifest and only
+rebuilds stale partitions. A file whose size and mtime are unchanged is not
+read at all. A file whose mtime changed but whose content hash did not, for
+example one copied again, is only re-stamped. A daily refresh of the
+current year therefore reads and extracts that year's files only.
+"""
+
+import hashlib
+import json
+import os
+
+HASH_BLOCK = 1 << 20
+
+def content_hash(path):
+    """blake2b of the file content (hex), read in 1 MB blocks."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def file_stamp(path):
+    """(size, mtime_ns) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def partition_key(source, field, year):
+    return f"{source}/{field}/{year}"
+
+class Manifest:
+    """
+    JSON manifest of input fingerprints, read and written by the main
+    process only (workers never touch it).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        self._hashes = {}
+
+    def fingerprint(self, path, previous=None):
+        """
+        Fingerprint dict of ``path`` (path, size, mtime_ns, hash), or None
+        if the file is missing. The content is only hashed when size or
+        mtime differ from ``previous``.
+        """
+        stamp = file_stamp(path)
+        if stamp is None:
+            return None
+        size, mtime_ns = stamp
+        if previous and previous.get('path') == path and previous.get('size') == size \
+                and previous.get('mtime_ns') == mtime_ns:
+            digest = previous['hash']
+        else:
+            if path not in self._hashes:
+                self._hashes[path] = content_hash(path)
+            digest = self._hashes[path]
+        return {'path': path, 'size': size, 'mtime_ns': mtime_ns, 'hash': digest}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def is_fresh(self, key, fingerprint):
+        """True if ``key`` was built from content equal to ``fingerprint``."""
+        entry = self.entries.get(key)
+        if entry is None or fingerprint is None:
+            return False
+        if 'hash' in fingerprint:
+            return entry.get('hash') == fingerprint['hash']
+        return all(entry.get(k) == v for k, v in fingerprint.items())
+
+    def record(self, key, fingerprint):
+        self.entries[key] = fingerprint
+
+    def save(self):
+        """Write the manifest atomically."""
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
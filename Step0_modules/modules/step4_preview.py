@@ -0,0 +1,176 @@
+"""
+Sampled preview of the Figure 1/2/3 statistics with confidence intervals.
+
+A preview draws a uniform random sample of articles from every (field, year)
+file through its line index (line_index.py), so only the sampled lines are
+read and extracted. It reports:
+
+* Figure 1/3: the proportion of articles with a P value, and with a P value
+  <= each threshold, per (field, year), with Wilson score intervals.
+* Figure 2: the share of the P values of 2015-2025 in each bin and operator
+  column, per field. Years are strata. Each year's sampled articles are
+  weighted by (articles in the year / sampled articles), and intervals come
+  from a stratified bootstrap over articles. The bootstrap is vectorized:
+  B multinomial resampling weights per stratum times the article x cell
+  count matrix.
+"""
+
+import math
+import os
+
+import numpy as np
+
+from modules.block_text import BlockReader, compressed_path
+from modules.fig2_bins import BIN_WIDTH, COLUMNS, NUM_BINS, bin_indices, bin_keys
+from modules.line_index import LineIndexReader
+from modules.min_pvalues import article_min_pvalues, threshold_curve
+from modules.parallel_extract import THRESHOLDS
+from modules.text_to_pval_and_oper import text_to_pval_and_oper_batch
+
+Z_95 = 1.959963984540054
+N_BOOTSTRAP = 1000
+
+def sample_size(n_articles, fraction=None, size=None):
+    """Articles to draw from a file of ``n_articles``: the larger of fraction * n and size, at most n."""
+    k = 0
+    if fraction:
+        k = math.ceil(fraction * n_articles)
+    if size:
+        k = max(k, size)
+    return min(k, n_articles)
+
+def wilson_interval(successes, n, z=Z_95):
+    """
+    Wilson score interval of a binomial proportion, vectorized.
+
+    Returns:
+        tuple: (lower, upper) arrays; (0, 1) where n is 0.
+    """
+    successes = np.asarray(successes, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = successes / n
+        denom = 1 + z ** 2 / n
+        centre = (p + z ** 2 / (2 * n)) / denom
+        half = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denom
+    lower = np.where(n > 0, np.clip(centre - half, 0, 1), 0.0)
+    upper = np.where(n > 0, np.clip(centre + half, 0, 1), 1.0)
+    return lower, upper
+
+class FilePreview:
+    """
+    Sample of one (field, year) file.
+
+    Attributes:
+        n_articles (int): Articles in the file.
+        n_sample (int): Articles sampled.
+        min_p (np.ndarray): Sorted smallest P value of each sampled article
+            that has one.
+        cells (np.ndarray): int32 (n_sample, NUM_BINS * len(COLUMNS)) Figure 2
+            counts of each sampled article, or None if not requested.
+    """
+    def __init__(self, n_articles, lines, engine='regex', fig2=True):
+        self.n_articles = n_articles
+        self.n_sample = len(lines)
+        result = text_to_pval_and_oper_batch(lines, engine=engine) if lines else None
+        if result is None:
+            self.min_p = np.empty(0)
+            self.cells = np.zeros((0, NUM_BINS * len(COLUMNS)), dtype=np.int32) if fig2 else None
+            return
+        self.min_p = article_min_pvalues(len(lines), result['article'], result['p_value'])
+        self.cells = None
+        if fig2:
+            cell = (bin_indices(result['p_value'], BIN_WIDTH, NUM_BINS) - 1) * len(COLUMNS) + result['operator']
+            self.cells = np.zeros((len(lines), NUM_BINS * len(COLUMNS)), dtype=np.int32)
+            np.add.at(self.cells, (result['article'], cell), 1)
+
+    def fig1_row(self, thresholds=THRESHOLDS):
+        """
+        Proportions with a P value and with P <= each threshold.
+
+        Returns:
+            list of (proportion, lower, upper) tuples.
+        """
+        successes = np.concatenate(([len(self.min_p)], threshold_curve(self.min_p, thresholds)))
+        lower, upper = wilson_interval(successes, self.n_sample)
+        p = successes / self.n_sample if self.n_sample else np.zeros(len(successes))
+        return list(zip(p.tolist(), lower.tolist(), upper.tolist()))
+
+def preview_file(path, fraction=None, size=None, seed=None, engine='regex', fig2=True):
+    """Sample one text file (missing files count as empty) and extract only the sample."""
+    if not os.path.exists(path):
+        data_path = compressed_path(path)
+        if data_path is None:
+            return FilePreview(0, [], engine=engine, fig2=fig2)
+        # block-compressed: only the blocks holding sampled articles are decompressed
+        with BlockReader(data_path) as reader:
+            k = sample_size(reader.n_articles, fraction, size)
+            lines = [text for _, text in reader.sample(k, seed=seed)]
+            return FilePreview(reader.n_articles, lines, engine=engine, fig2=fig2)
+    with LineIndexReader(path) as reader:
+        k = sample_size(len(reader), fraction, size)
+        lines = [text for _, text in reader.sample(k, seed=seed)]
+        return FilePreview(len(reader), lines, engine=engine, fig2=fig2)
+
+def fig2_shares(previews, n_boot=N_BOOTSTRAP, seed=None):
+    """
+    Estimated share of P values per Figure 2 cell over several years (strata).
+
+    Args:
+        previews (list of FilePreview): One per year, with ``cells``.
+
+    Returns:
+        tuple: (estimate, lower, upper, n_sample_pvalues), the first three
+        float arrays of shape (NUM_BINS, len(COLUMNS)) holding shares of all
+        P values, with 95% percentile bootstrap intervals.
+    """
+    n_cells = NUM_BINS * len(COLUMNS)
+    rng = np.random.default_rng(seed)
+    totals = np.zeros(n_cells)
+    boot = np.zeros((n_boot, n_cells))
+    n_pvalues = 0
+    for preview in previews:
+        if preview.n_sample == 0:
+            continue
+        weight = preview.n_articles / preview.n_sample
+        cells = preview.cells.astype(np.float64)
+        n_pvalues += int(preview.cells.sum())
+        totals += weight * cells.sum(axis=0)
+        # each row: how often every sampled article is drawn in one resample
+        draws = rng.multinomial(preview.n_sample, np.full(preview.n_sample, 1 / preview.n_sample), size=n_boot)
+        boot += weight * (draws @ cells)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        estimate = np.nan_to_num(totals / totals.sum())
+        shares = np.nan_to_num(boot / boot.sum(axis=1, keepdims=True))
+    lower, upper = np.percentile(shares, [2.5, 97.5], axis=0)
+    shape = (NUM_BINS, len(COLUMNS))
+    return estimate.reshape(shape), lower.reshape(shape), upper.reshape(shape), n_pvalues
+
+def _fmt(p, lower, upper):
+    return f"{p:.4f} [{lower:.4f}-{upper:.4f}]"
+
+def fig1_preview_lines(fields, years, previews, thresholds=THRESHOLDS):
+    """Figure 1/3 preview table: year, articles, sampled, then proportion [95% CI] per column."""
+    lines = []
+    for field in fields:
+        lines.append(f'field: {field}')
+        for year in years:
+            preview = previews[(field, year)]
+            row = [str(year), str(preview.n_articles), str(preview.n_sample)]
+            row += [_fmt(*cell) for cell in preview.fig1_row(thresholds)]
+            lines.append('\t'.join(row))
+    return lines
+
+def fig2_preview_lines(field, previews, n_boot=N_BOOTSTRAP, seed=None):
+    """Figure 2 preview table of one field: share of P values [95% CI] per bin and operator."""
+    estimate, lower, upper, n_pvalues = fig2_shares(previews, n_boot=n_boot, seed=seed)
+    lines = [f"{field} absBandwidth\t<\t=\t>\tother\ttotal"]
+    for b, key in enumerate(bin_keys(BIN_WIDTH, NUM_BINS)):
+        if estimate[b].sum() == 0:
+            continue
+        row = [_fmt(estimate[b, c], lower[b, c], upper[b, c]) for c in range(len(COLUMNS))]
+        lines.append('\t'.join([key] + row + [f"{estimate[b].sum():.4f}"]))
+    n_articles = sum(preview.n_articles for preview in previews)
+    n_sample = sum(preview.n_sample for preview in previews)
+    lines.append(f"total article {n_articles} sampled {n_sample} sampled pvalue {n_pvalues}")
+    return lines
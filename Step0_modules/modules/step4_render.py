@@ -0,0 +1,235 @@
+"""
+Headless rendering of the Step 4 figures and workbooks from aggregated tables.
+
+The inputs are the tables written by aggregate_figures.py (one file per
+Figure script, with the rows the script prints). Every artifact is one job:
+
+    Plot1_{source}.png               proportion of articles with P values per year, one line per field
+    Plot2_{source}_{FIELD}.png       stacked P value bins x operator, one image per field
+    Plot3_{column}_ALL.png           one Figure 1 column of the all-articles field, one line per source
+    Fig1_{source}.xlsx               one sheet per field (year, articles, with P, <= thresholds)
+    Fig2_Distribution_{source}.xlsx  one sheet per field (bins x operator)
+
+render_jobs lists the jobs; render_job runs one of them in a worker process,
+with the Agg backend (no display) and openpyxl write-only workbooks. The
+manifest ({out}/render_manifest.json, see step4_manifest.Manifest) records the
+content hash of the tables each artifact was drawn from, so artifacts whose
+tables did not change are skipped.
+"""
+
+import hashlib
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from modules.fig2_bins import BIN_WIDTH, COLUMNS, NUM_BINS, bin_keys
+from modules.step4_manifest import Manifest, content_hash
+
+RENDER_VERSION = 1  # bump when the drawing code changes, to redraw everything
+MANIFEST_NAME = "render_manifest.json"
+
+# aggregate_figures.py table names (without .txt) and the artifact label of each source
+TABLES = {
+    'pubmed_abs': ('Figure1pubmedAbs', 'Fig2_pubmed_abs_to_pval', 'PubMed_abs'),
+    'pmc_abs': ('Figure1pmcAbs', 'Fig2_pmc_abs_to_pval', 'PMC_abs'),
+    'pmc_body': ('Figure1PMCbody', 'Fig2_pmc_body_to_pval', 'PMC_full'),
+}
+FIELD_LABELS = {
+    'randomized-controlled-trial': ('RCT', 'Randomized controlled trial'),
+    'clinical-trial': ('CT', 'Clinical trial'),
+    'meta-analysis': ('META', 'Meta-analysis'),
+    'review': ('REVIEW', 'Review'),
+    'clinical-useful-journal': ('CUJ', 'Clinically Useful Journals'),
+    'all-articles': ('ALL', 'All articles'),
+    'rct': ('RCT', 'Randomized controlled trial'),
+    'ct': ('CT', 'Clinical trial'),
+    'meta': ('META', 'Meta-analysis'),
+    'cuj': ('CUJ', 'Clinically Useful Journals'),
+    'all': ('ALL', 'All articles'),
+}
+SUPERSET_FIELDS = ('all-articles', 'all')
+# Figure 1 columns after (year, n): with P, then the thresholds of parallel_extract.THRESHOLDS
+FIG1_COLUMNS = ('HasPvalue', 'Pvalue0.05', 'Pvalue0.01', 'Pvalue0.005', 'Pvalue0.001')
+PLOT3_COLUMNS = {'Haspval': 0, 'Haspval005': 1, 'Haspval0005': 3}
+OPERATOR_COLORS = ('#2e4a5c', '#eef1f4', '#a8c6cc', '#7f7f7f')
+
+def read_fig1_table(path):
+    """{field: int64 array (years, 2 + len(FIG1_COLUMNS))} of a Figure 1/3 table."""
+    tables = {}
+    field = None
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('field: '):
+                field = line[len('field: '):]
+                tables[field] = []
+            elif line:
+                tables[field].append([int(v) for v in line.split('\t')])
+    return {field: np.array(rows, dtype=np.int64).reshape(-1, 2 + len(FIG1_COLUMNS))
+            for field, rows in tables.items()}
+
+def read_fig2_table(path):
+    """{field: (bin keys, int64 array (bins, len(COLUMNS)), total articles, total P values)} of a Fig2 table."""
+    tables = {}
+    field = None
+    keys, rows = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.endswith('absBandwidth\t<\t=\t>\tother\ttotal'):
+                field = line.split(' absBandwidth')[0]
+                keys, rows = [], []
+            elif line.startswith('total article '):
+                parts = line.split()
+                table = np.array(rows, dtype=np.int64).reshape(-1, len(COLUMNS))
+                tables[field] = (keys, table, int(parts[2]), int(parts[5]))
+            elif line:
+                values = line.split('\t')
+                keys.append(values[0])
+                rows.append([int(v) for v in values[1:1 + len(COLUMNS)]])
+    return tables
+
+def _percent(table, column):
+    """Percentage of articles in Figure 1 ``column`` (0 = with P) per year; 0 where there are none."""
+    n = table[:, 1].astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.nan_to_num(100 * table[:, 2 + column] / n)
+
+def plot1(out_path, tables_dir, source):
+    fig1 = read_fig1_table(os.path.join(tables_dir, TABLES[source][0] + ".txt"))
+    fig, ax = plt.subplots(figsize=(20, 9))
+    for field, table in fig1.items():
+        ax.plot(table[:, 0], _percent(table, 0), marker='o', label=FIELD_LABELS.get(field, (field, field))[1])
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Proportion of Articles With P Values, %")
+    ax.set_ylim(0, 100)
+    ax.grid(axis='y', color='#d9d9d9')
+    ax.legend()
+    fig.savefig(out_path, dpi=100, bbox_inches='tight')
+    plt.close(fig)
+
+def plot2(out_path, tables_dir, source, field):
+    keys, table, n_articles, n_pvalues = read_fig2_table(os.path.join(tables_dir, TABLES[source][1] + ".txt"))[field]
+    # the table only lists non-empty bins; draw all of them
+    all_keys = bin_keys(BIN_WIDTH, NUM_BINS)
+    full = np.zeros((NUM_BINS, len(COLUMNS)), dtype=np.int64)
+    full[[all_keys.index(key) for key in keys]] = table
+    fig, ax = plt.subplots(figsize=(11, 10))
+    x = np.arange(NUM_BINS)
+    bottom = np.zeros(NUM_BINS)
+    for c, column in enumerate(COLUMNS):
+        ax.bar(x, full[:, c], bottom=bottom, width=1.0, edgecolor='black', color=OPERATOR_COLORS[c], label=f"P{column}")
+        bottom += full[:, c]
+    ticks = [0, 9, 19, 29, 39, NUM_BINS - 1]
+    ax.set_xticks(ticks)
+    ax.set_xticklabels([all_keys[t] for t in ticks[:-1]] + [f"{all_keys[-2]}<"])
+    ax.set_xlabel("P Value")
+    ax.set_ylabel("No. of P Values")
+    ax.set_title(f"{FIELD_LABELS.get(field, (field, field))[1]} ({n_articles:,} articles, {n_pvalues:,} P values)")
+    ax.legend()
+    fig.savefig(out_path, dpi=100, bbox_inches='tight')
+    plt.close(fig)
+
+def plot3(out_path, tables_dir, sources, column):
+    fig, ax = plt.subplots(figsize=(20, 9))
+    for source in sources:
+        fig1 = read_fig1_table(os.path.join(tables_dir, TABLES[source][0] + ".txt"))
+        field = next(f for f in fig1 if f in SUPERSET_FIELDS)
+        ax.plot(fig1[field][:, 0], _percent(fig1[field], column), marker='s', label=TABLES[source][2])
+    ax.set_xlabel("Year")
+    ax.set_ylabel("Proportion of Articles, %")
+    ax.grid(axis='y', color='#d9d9d9')
+    ax.legend()
+    fig.savefig(out_path, dpi=100, bbox_inches='tight')
+    plt.close(fig)
+
+def _save_workbook(out_path, sheets):
+    """Write ``{sheet title: rows}`` with a write-only (streaming) openpyxl workbook, atomically."""
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    for title, rows in sheets.items():
+        ws = wb.create_sheet(title=title[:31])
+        for row in rows:
+            ws.append(row)
+    tmp_path = out_path + ".tmp.xlsx"
+    wb.save(tmp_path)
+    os.replace(tmp_path, out_path)
+
+def workbook1(out_path, tables_dir, source):
+    fig1 = read_fig1_table(os.path.join(tables_dir, TABLES[source][0] + ".txt"))
+    header = ['Year', 'Total article count'] + list(FIG1_COLUMNS)
+    _save_workbook(out_path, {FIELD_LABELS.get(field, (field,))[0]: [header] + table.tolist()
+                              for field, table in fig1.items()})
+
+def workbook2(out_path, tables_dir, source):
+    fig2 = read_fig2_table(os.path.join(tables_dir, TABLES[source][1] + ".txt"))
+    sheets = {}
+    for field, (keys, table, n_articles, n_pvalues) in fig2.items():
+        rows = [[f"{field} absBandwidth"] + [f"P{c}" for c in COLUMNS] + ['total']]
+        rows += [[key] + row + [sum(row)] for key, row in zip(keys, table.tolist())]
+        rows.append(['total article', n_articles, 'total pvalue', n_pvalues])
+        sheets[FIELD_LABELS.get(field, (field,))[0]] = rows
+    _save_workbook(out_path, sheets)
+
+RENDERERS = {'plot1': plot1, 'plot2': plot2, 'plot3': plot3, 'workbook1': workbook1, 'workbook2': workbook2}
+
+def render_jobs(tables_dir, sources):
+    """
+    Every artifact that can be drawn from the tables in ``tables_dir``.
+
+    Returns:
+        list of (artifact file name, renderer name, args after (out_path, tables_dir), input table paths)
+    """
+    def table(name):
+        return os.path.join(tables_dir, name + ".txt")
+
+    jobs = []
+    available = []
+    for source in sources:
+        fig1, fig2, label = TABLES[source]
+        if os.path.exists(table(fig1)):
+            available.append(source)
+            jobs.append((f"Plot1_{label}.png", 'plot1', (source,), [table(fig1)]))
+            jobs.append((f"Fig1_{label}.xlsx", 'workbook1', (source,), [table(fig1)]))
+        if os.path.exists(table(fig2)):
+            for field in read_fig2_table(table(fig2)):
+                jobs.append((f"Plot2_{label}_{FIELD_LABELS.get(field, (field,))[0]}.png", 'plot2', (source, field),
+                             [table(fig2)]))
+            jobs.append((f"Fig2_Distribution_{label}.xlsx", 'workbook2', (source,), [table(fig2)]))
+    if available:
+        inputs = [table(TABLES[source][0]) for source in available]
+        for name, column in PLOT3_COLUMNS.items():
+            jobs.append((f"Plot3_{name}_ALL.png", 'plot3', (tuple(available), column), inputs))
+    return jobs
+
+def input_fingerprint(renderer, args, input_paths):
+    """{'hash': ...} of the renderer, its arguments and the content of its input tables."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((RENDER_VERSION, renderer, args)).encode('utf-8'))
+    for path in input_paths:
+        h.update(content_hash(path).encode('ascii'))
+    return {'hash': h.hexdigest()}
+
+def render_job(out_dir, tables_dir, name, renderer, args):
+    """Draw one artifact into ``out_dir`` (run in a worker process)."""
+    RENDERERS[renderer](os.path.join(out_dir, name), tables_dir, *args)
+    return name
+
+def stale_jobs(out_dir, jobs, force=False):
+    """
+    Jobs whose artifact is missing or whose inputs changed since it was drawn.
+
+    Returns:
+        tuple: (manifest, list of (job, fingerprint))
+    """
+    manifest = Manifest(os.path.join(out_dir, MANIFEST_NAME))
+    stale = []
+    for job in jobs:
+        name, renderer, args, input_paths = job
+        fingerprint = input_fingerprint(renderer, args, input_paths)
+        if force or not os.path.exists(os.path.join(out_dir, name)) or not manifest.is_fresh(name, fingerprint):
+            stale.append((job, fingerprint))
+    return manifest, stale
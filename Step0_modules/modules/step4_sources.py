@@ -0,0 +1,137 @@
+"""
+Input files of Step 4.
+
+Each source is a folder per field holding one text file per year, one
+article per line ("PMCID(or PMID) {text}"), as written by Step 1 (PubMed
+abstracts) and Step 3-6 (PMC abstracts and bodies). Step 3-6 may have
+written a file block-compressed instead ({file}.zst or {file}.gz, see
+block_text.py); open_text and text_exists accept the uncompressed path
+either way.
+
+With xml_to_txt.py --sections, every pmc_body file also has one file per body
+section group (section_path), line-aligned with it; iter_section_articles
+joins any of them back into the body restricted to those sections.
+"""
+
+import os
+import re
+from itertools import zip_longest
+
+from modules.block_text import compressed_path, open_blocks
+
+START_YEAR = 1990
+END_YEAR = 2025
+YEARS = range(START_YEAR, END_YEAR + 1)
+
+PMC_FIELDS = [
+    'randomized-controlled-trial', 'clinical-trial', 'meta-analysis', 'review', 'clinical-useful-journal', 'all-articles'
+]
+PUBMED_FIELDS = ['rct', 'ct', 'meta', 'review', 'cuj', 'all']
+
+SOURCES = {
+    'pubmed_abs': {
+        'root': "/Volumes/ssd4TB/pubmed/xtract",
+        'filename': "pmxtract_list_{field}_{year}.txt",
+        'fields': PUBMED_FIELDS,
+    },
+    'pmc_abs': {
+        'root': "/Volumes/ssd4TB/20251080/result",
+        'filename': "pmcxtract_list_{field}_{year}_abstract.txt",
+        'fields': PMC_FIELDS,
+    },
+    'pmc_body': {
+        'root': "/Volumes/ssd4TB/20251080/result",
+        'filename': "pmcxtract_list_{field}_{year}_body.txt",
+        'fields': PMC_FIELDS,
+    },
+}
+
+# Same as SECTION_GROUPS in Step3_6 xml_to_txt.py
+BODY_SECTIONS = ('intro', 'methods', 'results', 'discussion', 'conclusions', 'tables', 'figures', 'other')
+
+def source_path(source, field, year, root=None):
+    """
+    Path of the text file of one (source, field, year) partition.
+
+    ``root`` overrides the default folder of the source.
+    """
+    spec = SOURCES[source]
+    return os.path.join(root or spec['root'], field, spec['filename'].format(field=field, year=year))
+
+def section_path(field, year, section, root=None):
+    """Path of the file of one body section group of a pmc_body partition (xml_to_txt.py --sections)."""
+    path = source_path('pmc_body', field, year, root)
+    return path[:-len('.txt')] + f"_{section}.txt"
+
+def iter_partitions(sources=None, fields=None, years=YEARS):
+    """Yield (source, field, year) for every partition of the given sources."""
+    for source in sources or SOURCES:
+        for field in fields or SOURCES[source]['fields']:
+            for year in years:
+                yield source, field, year
+
+def text_file(path):
+    """The file holding the text of ``path``: itself, else its block-compressed file if there is one."""
+    if os.path.exists(path):
+        return path
+    return compressed_path(path) or path
+
+def text_exists(path):
+    """True if the text file exists, uncompressed or block-compressed."""
+    return os.path.exists(text_file(path))
+
+def open_text(path):
+    """
+    Open a text file for reading like open(path, 'r', encoding='utf-8'); if
+    only its block-compressed file exists, that is decompressed instead, in
+    parallel. Raises FileNotFoundError if neither exists.
+    """
+    if not os.path.exists(path):
+        data_path = compressed_path(path)
+        if data_path is not None:
+            return open_blocks(data_path)
+    return open(path, 'r', encoding='utf-8')
+
+def iter_articles(path):
+    """
+    Yield the articles of a text file, one stripped non-empty line each.
+
+    This is the same line handling as the Figure scripts, so article counts
+    and match offsets agree with them. Raises FileNotFoundError if the file
+    is missing.
+    """
+    with open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            yield line
+
+_ID_RE = re.compile(r'\S+')
+
+def article_id(line):
+    """PMCID (or PMID) of an article line: its first whitespace-separated token."""
+    return _ID_RE.match(line).group()
+
+def iter_section_articles(paths):
+    """
+    Yield one line per article of line-aligned section files: the PMCID and
+    the text of the article in each of them, joined by spaces. Articles with
+    no text in any of the sections are yielded as the PMCID alone, so the
+    article count is that of the body file.
+
+    Raises ValueError if the files do not list the same articles in the same
+    order (e.g. written by different runs).
+    """
+    for lines in zip_longest(*(iter_articles(path) for path in paths)):
+        if None in lines:
+            raise ValueError(f"section files of different lengths: {', '.join(paths)}")
+        pmcid = article_id(lines[0])
+        texts = [pmcid]
+        for line in lines:
+            if article_id(line) != pmcid:
+                raise ValueError(f"section files not aligned at {pmcid}: {', '.join(paths)}")
+            text = line[len(pmcid):].strip()
+            if text:
+                texts.append(text)
+        yield ' '.join(texts)
@@ -1,116 +1,697 @@
 import re
+import sys
+from array import array
+from functools import lru_cache
+
+import numpy as np
+
+# Version of the extraction results, part of the key of the P-value cache
+# (pval_cache.extractor_version, which also hashes P_VALUE_PATTERN and the
+# homogenization rules). Bump it for any other change that alters what is
+# extracted, e.g. in the scanner.
+EXTRACTOR_VERSION = 1
+
+# One translate table does the work of the old replace() chain:
+#   ',' '•' -> '.',  'x' '×' 'E' -> 'e',  drop '(' ')' and ALL whitespace
+#   (\s matches [ \t\n\r\f\v] and unicode whitespace such as thin space \u2009).
+# The old chain also rewrote 'exp'/'Exp' to 'e', but it ran after 'x' had
+# already become 'e', so those two rules never fired and are not needed.
+_NORMALIZE_TABLE = {ord(','): '.', ord('•'): '.', ord('x'): 'e', ord('×'): 'e',
+                    ord('E'): 'e', ord('('): None, ord(')'): None}
+_NORMALIZE_TABLE.update((c, None) for c in range(sys.maxunicode + 1) if chr(c).isspace())
+
 def replace(text):
-    text=text.replace(',', '.').replace('•', '.').replace('x', 'e').replace('×', 'e').replace(' ','').replace('(','').replace(')','')
-    text=text.replace('exp','e').replace('Exp','e').replace('E','e')
-    # Remove ALL whitespace (including thin space \u2009)
-    # \s matches [ \t\n\r\f\v] and unicode whitespace characters
-    text = re.sub(r'\s+', '', text)
-    return text
+    return text.translate(_NORMALIZE_TABLE)
+
+def to_pval_and_oper(operator_str, raw_value_str, digits, base, exponent):
+    """
+    Applies the homogenization rules to the pieces of one matched P value.
+
+    Shared by both extraction engines so that they cannot drift apart.
+
+    Args:
+        operator_str (str): Text matched by the operator group.
+        raw_value_str (str): Text matched by the whole number group.
+        digits (str): Text matched by the digits group.
+        base (str or None): Text matched by the base group.
+        exponent (str or None): Text matched by the exponent group.
+
+    Returns:
+        tuple or None: (p_value, operator), or None if the match is discarded.
+    """
+    operator_str = operator_str.strip()
+    raw_value_str = raw_value_str.strip()
+    digits = digits.strip()
+
+    digits=replace(digits)
+    raw_value_str=replace(raw_value_str)
+    operator_str = replace(operator_str)
+    if base:
+        base=base.strip()
+        base=replace(base)
+    if exponent:
+        exponent=exponent.strip()
+        exponent=replace(exponent)
+
+    # 2. HOMOGENIZATION & PARSING
+
+    # remove wrong forms
+    # Rule: Discard '.int' format (typos like 0012 without decimal points)
+
+    if raw_value_str.count('.') > 1:
+        return None
+    else:
+        digits=float(digits)
+
+    # Rule: consider % format
+    if '%' in raw_value_str:
+        p_value = digits*0.01
+    # has extra exponent term, with base and exponent
+    elif 'e' in raw_value_str:
+        if base and not float(base)==0:
+            base=float(base)
+        else:
+            base=10 #According to previous study from jama, We assume base is 10
+        if exponent:
+            exponent=float(exponent)
+        else:
+            exponent=1 # If exponent is missing, we let exponent as 1, excluding the effect of the exponent.
+        p_value=digits*(base**exponent)
+    else:
+        p_value=digits
+
+    # Rule: Discard if not in interval (0, 1]
+    if p_value <= 0 or p_value >= 1:
+        return None
+
+    # Classify operators
+    operator_str=operator_str.replace('of','').replace('≤','<').replace('≥','>').replace('lessthan','<')
+    if '=' in operator_str:
+        operator='='
+    if '>' in operator_str:
+        operator='>'
+    if '<' in operator_str:
+        operator='<'
+    if '>' in operator_str:
+        if '<' in operator_str:
+            operator='ambiguous'
+    return p_value, operator
+
+# 1. THE SEARCH STRING
+# This is the regex pattern provided in the text, adapted for Python.
+# We use named groups (?P<name>...) to easily retrieve specific parts later.
+# Group 'op': Captures the operator/sign
+# Group 'num': Captures the number part (including sci notation/percentage suffix)
+# It is compiled once at import instead of on every call.
+
+P_VALUE_PATTERN = r"""(?x)              # Verbose mode (ignore whitespace in regex)
+    (\s|\()                             # Preceding space or parenthesis
+    [Pp]{1}                             # 'P' or 'p'
+    (\s|-)* # Optional space or hyphen
+    (value|values)?                     # Optional 'value' word
+    (\s)* # Optional space
+    (?P<op>                             # START GROUP: Operator
+       ([=<>≤≥]|less\s+than|of\s+<)+    # Matches signs, 'less than', 'of <'S$
+    )                                   # END GROUP: Operator
+    (\s)* # Optional space
+    (?P<num>                            # START GROUP: Number/Value
+        (?P<digits>([0-9]|([\,\.•][0-9]))        # First digit or separator+digit
+        [0-9]* # Following digits
+        [\,\.•]?                      # Optional separator
+        [0-9]*) # Decimal digits
+        (\s)* # Space before suffix
+        (                               # Suffix group (percentage or sci notation)
+            (\%)|                       # Percentage sign
+            ([x×]?(\s)*(?P<base>[0-9]*)(\s)*((exp|Exp|E|e)?(\s)*(?P<exponent>((\((\s)*(-){1}(\s)*[0-9]+(\s)*\))|((\s)*(-){1}(\s)*[0-9]+))))?)
+        )
+    )                                   # END GROUP: Number
+"""
+P_VALUE_RE = re.compile(P_VALUE_PATTERN)
+
+# ---------- prefilter ----------
+# Most lines have no P value at all. A line can only match if it contains one
+# of the operator signs or 'than' (from 'less than'), which plain substring
+# tests find at memchr speed. Lines that survive are cut into candidate
+# windows: a 'P' preceded by a space or '(' and followed, after optional
+# spaces/hyphens, by 'value' or the start of an operator. That is exactly the
+# part of P_VALUE_PATTERN before the operator, so only windows can match and
+# the full pattern is run with .match() at each window instead of finditer()
+# over every whitespace of the line.
+
+_ANCHOR_RE = re.compile(r'[Pp](?=[\s\-]*(?:value|[=<>≤≥]|less|of))')
+_LINE_MARKERS = ('=', '<', '>', '≤', '≥', 'than')
+
+PREFILTER_STATS = {
+    'lines': 0,            # lines passed to text_to_pval_and_oper
+    'lines_rejected': 0,   # lines rejected without any pattern work (miss)
+    'windows': 0,          # candidate windows given to the engine
+    'windows_matched': 0,  # windows that produced a match (hit)
+}
+
+def reset_prefilter_stats():
+    for key in PREFILTER_STATS:
+        PREFILTER_STATS[key] = 0
+
+def prefilter_stats():
+    """
+    Returns a copy of PREFILTER_STATS with the line reject rate and the
+    window hit rate added.
+    """
+    stats = dict(PREFILTER_STATS)
+    stats['line_reject_rate'] = stats['lines_rejected'] / stats['lines'] if stats['lines'] else 0.0
+    stats['window_hit_rate'] = stats['windows_matched'] / stats['windows'] if stats['windows'] else 0.0
+    return stats
+
+def may_contain_pval(text):
+    """Cheap necessary condition for text_to_pval_and_oper(text) to find anything."""
+    for marker in _LINE_MARKERS:
+        if marker in text:
+            return True
+    return False
+
+def _regex_engine(text, emit, literal=None):
+    """
+    Runs P_VALUE_RE at every window and calls emit(parsed, start, end) for
+    every kept match, and literal(parsed, start, end, operator_str,
+    raw_value_str) for every match, including those the homogenization rules
+    throw away (parsed is None).
+    """
+    windows = 0
+    matched = 0
+
+    # Iterate over all matches in the text, window by window
+    anchor = _ANCHOR_RE.search(text, 1)
+    while anchor is not None:
+        j = anchor.start()
+        c = text[j - 1]
+        if c != '(' and not c.isspace():
+            anchor = _ANCHOR_RE.search(text, j + 1)
+            continue
+        windows += 1
+        match = P_VALUE_RE.match(text, j - 1)
+        if match is None:
+            anchor = _ANCHOR_RE.search(text, j + 1)
+            continue
+        matched += 1
+        # finditer() would resume at match.end(); the next window's 'P' is
+        # one character further because the match starts before the 'P'
+        anchor = _ANCHOR_RE.search(text, match.end() + 1)
+        operator_str, raw_value_str = match.group('op'), match.group('num')
+        parsed = parse_literal(operator_str, raw_value_str)
+        if parsed is not None:
+            emit(parsed, match.start(), match.end())
+        if literal is not None:
+            literal(parsed, match.start(), match.end(), operator_str, raw_value_str)
 
-def text_to_pval_and_oper(text):
+    PREFILTER_STATS['windows'] += windows
+    PREFILTER_STATS['windows_matched'] += matched
+
+def text_to_pval_and_oper(text, engine='regex'):
     """
-    Extracts P values and their operators from text based on specific 
+    Extracts P values and their operators from text based on specific
     regex and homogenization rules.
-    
+
     Args:
         text (str): The abstract or text to analyze.
-        
+        engine (str): 'regex' (default) runs P_VALUE_PATTERN on the windows
+            left by the prefilter, 'scan' runs the hand-written scanner in
+            scan_pval_and_oper(). Both return exactly the same list.
+
     Returns:
-        list of tuples: A list of (operator, p_value_float).
-    """
-    
-    # 1. THE SEARCH STRING
-    # This is the regex pattern provided in the text, adapted for Python.
-    # We use named groups (?P<name>...) to easily retrieve specific parts later.
-    # Group 'op': Captures the operator/sign
-    # Group 'num': Captures the number part (including sci notation/percentage suffix)
-    
-    p_value_pattern = r"""(?x)              # Verbose mode (ignore whitespace in regex)
-        (\s|\()                             # Preceding space or parenthesis
-        [Pp]{1}                             # 'P' or 'p'
-        (\s|-)* # Optional space or hyphen
-        (value|values)?                     # Optional 'value' word
-        (\s)* # Optional space
-        (?P<op>                             # START GROUP: Operator
-           ([=<>≤≥]|less\s+than|of\s+<)+    # Matches signs, 'less than', 'of <'S$
-        )                                   # END GROUP: Operator
-        (\s)* # Optional space
-        (?P<num>                            # START GROUP: Number/Value
-            (?P<digits>([0-9]|([\,\.•][0-9]))        # First digit or separator+digit
-            [0-9]* # Following digits
-            [\,\.•]?                      # Optional separator
-            [0-9]*) # Decimal digits
-            (\s)* # Space before suffix
-            (                               # Suffix group (percentage or sci notation)
-                (\%)|                       # Percentage sign
-                ([x×]?(\s)*(?P<base>[0-9]*)(\s)*((exp|Exp|E|e)?(\s)*(?P<exponent>((\((\s)*(-){1}(\s)*[0-9]+(\s)*\))|((\s)*(-){1}(\s)*[0-9]+))))?)
-            )
-        )                                   # END GROUP: Number
-    """
-    
+        list of tuples: A list of (p_value_float, operator).
+    """
+    run_engine = _engine(engine)
+    PREFILTER_STATS['lines'] += 1
+    if not may_contain_pval(text):
+        PREFILTER_STATS['lines_rejected'] += 1
+        return []
     results = []
-    
-    # Iterate over all matches in the text
-    for match in re.finditer(p_value_pattern, text):
-        operator_str = match.group('op').strip()
-        raw_value_str = match.group('num').strip()
-        digits=match.group('digits').strip()
-        base=match.group('base')
-        exponent=match.group('exponent')        
-        
-        
-        digits=replace(digits)
-        raw_value_str=replace(raw_value_str)
-        operator_str = replace(operator_str)
-        if base:
-            base=base.strip()
-            base=replace(base)
-        if exponent:
-            exponent=exponent.strip()
-            exponent=replace(exponent)
-        
-        # 2. HOMOGENIZATION & PARSING
-        
-        # remove wrong forms
-        # Rule: Discard '.int' format (typos like 0012 without decimal points)
-        
-        if raw_value_str.count('.') > 1:
+    run_engine(text, lambda parsed, start, end: results.append(parsed))
+    return results
+
+def extract_matches(text, engine='regex'):
+    """
+    Every match of P_VALUE_PATTERN in text with its span, including the
+    ones the homogenization rules discard.
+
+    Args:
+        text (str): The abstract or text to analyze.
+        engine (str): 'regex' or 'scan', as in text_to_pval_and_oper().
+
+    Returns:
+        list of tuples: (parsed, start, end, operator_str, raw_value_str)
+        where parsed is the (p_value, operator) tuple, or None for a
+        discarded match, and the strings are the texts of the operator and
+        number groups.
+    """
+    run_engine = _engine(engine)
+    PREFILTER_STATS['lines'] += 1
+    if not may_contain_pval(text):
+        PREFILTER_STATS['lines_rejected'] += 1
+        return []
+    matches = []
+    run_engine(text, lambda parsed, start, end: None,
+               lambda *match: matches.append(match))
+    return matches
+
+# ---------- batch API ----------
+# Operator codes used by the columnar arrays. The order matches the
+# '<', '=', '>', 'other' columns of the Figure 2 tables.
+OPERATORS = ('<', '=', '>', 'ambiguous')
+OPERATOR_CODES = {oper: code for code, oper in enumerate(OPERATORS)}
+
+def text_to_pval_and_oper_batch(lines, engine='regex'):
+    """
+    Columnar version of text_to_pval_and_oper() for a batch of articles.
+
+    Matches are appended straight into typed buffers instead of per-article
+    lists, so a batch of tens of thousands of lines costs a handful of
+    arrays regardless of how many P values it holds.
+
+    Args:
+        lines (sequence of str): One article per item (e.g. stripped
+            non-empty lines of a pmcxtract file).
+        engine (str): 'regex' or 'scan', as in text_to_pval_and_oper().
+
+    Returns:
+        dict of numpy arrays with one element per extracted P value, in
+        text order:
+            'article'  (int64)   index of the line in ``lines``
+            'p_value'  (float64)
+            'operator' (uint8)   code into OPERATORS
+            'start', 'end' (int64) span of the match within the line
+    """
+    run_engine = _engine(engine)
+    article = array('q')
+    p_value = array('d')
+    operator = array('B')
+    span_start = array('q')
+    span_end = array('q')
+    index = 0
+
+    def emit(parsed, start, end):
+        article.append(index)
+        p_value.append(parsed[0])
+        operator.append(OPERATOR_CODES[parsed[1]])
+        span_start.append(start)
+        span_end.append(end)
+
+    for index, text in enumerate(lines):
+        PREFILTER_STATS['lines'] += 1
+        if not may_contain_pval(text):
+            PREFILTER_STATS['lines_rejected'] += 1
             continue
+        run_engine(text, emit)
+
+    return {
+        'article': np.frombuffer(article, dtype=np.int64),
+        'p_value': np.frombuffer(p_value, dtype=np.float64),
+        'operator': np.frombuffer(operator, dtype=np.uint8),
+        'start': np.frombuffer(span_start, dtype=np.int64),
+        'end': np.frombuffer(span_end, dtype=np.int64),
+    }
+
+# ---------- streaming windows ----------
+# A PMC body is one line of up to several MB. stream_pval_and_oper_batch reads
+# a text file in blocks and hands each line to the engine as a series of
+# windows of about WINDOW_SIZE characters, so memory per article is bounded
+# whatever its length. A window always ends on a "barrier": a character that
+# no part of P_VALUE_PATTERN (nor the scanner, nor the anchor lookahead) can
+# consume. No match or match attempt can cross a barrier, so every match lies
+# in exactly one window and the engine sees the same text around it. The next
+# window starts at that barrier, which plays the part of the character before
+# its first possible 'P', and the engine resumes its anchor search at index 1
+# as it does at the start of a line. The matches, their order and their spans
+# (relative to the stripped line) are therefore identical to those of
+# text_to_pval_and_oper_batch over iter_articles lines.
+
+WINDOW_SIZE = 1 << 20  # characters
+_BARRIER_RE = re.compile(r'[^\sPpvaluesthnofxE0-9=<>≤≥,.•%×()\-]')
+
+def iter_windows(f, window_size=WINDOW_SIZE):
+    """
+    Windows of the stripped, non-empty lines of a text-mode file.
+
+    Lines are split and stripped as by step4_sources.iter_articles (universal
+    newlines, str.strip whitespace); blank lines are skipped.
+
+    Yields:
+        tuple: (article, offset, text) where article counts the non-empty
+        lines from 0 and offset is the position of text in the stripped line.
+        Consecutive windows of a line share one barrier character.
+
+    Raises:
+        ValueError: If window_size < 2 (a window would be the shared barrier alone, which never advances).
+    """
+    if window_size < 2:
+        raise ValueError(f"window_size must be at least 2, got {window_size}")
+    article = -1
+    offset = 0
+    pending = ''
+    started = False
+    while True:
+        block = f.read(window_size)
+        pieces = block.split('\n') if block else ['']
+        for k, piece in enumerate(pieces):
+            line_end = k < len(pieces) - 1 or not block
+            if not started:
+                piece = piece.lstrip()
+                if piece:
+                    started = True
+                    article += 1
+                    offset = 0
+            pending += piece
+            while len(pending) > window_size:
+                barrier = _BARRIER_RE.search(pending, window_size - 1)
+                if barrier is None:
+                    break  # no safe cut yet: keep reading this line
+                cut = barrier.start()
+                yield article, offset, pending[:cut + 1]
+                pending = pending[cut:]
+                offset += cut
+            if line_end:
+                if started:
+                    yield article, offset, pending.rstrip()
+                pending = ''
+                started = False
+        if not block:
+            return
+
+def stream_pval_and_oper_batch(f, engine='regex', window_size=WINDOW_SIZE, batch_size=1000):
+    """
+    text_to_pval_and_oper_batch over the lines of a text-mode file, in windows.
+
+    Args:
+        f (file): Text file opened with open(path, 'r', encoding='utf-8').
+        window_size (int): Characters per window (a window runs on to the
+            next barrier character, see iter_windows).
+        batch_size (int): Articles per yielded result.
+
+    Yields:
+        tuple: (n_articles, result) with result as text_to_pval_and_oper_batch
+        returns it for those articles ('article' counts from 0 in each batch).
+
+    Raises:
+        ValueError: If window_size < 2.
+    """
+    if window_size < 2:
+        raise ValueError(f"window_size must be at least 2, got {window_size}")
+    run_engine = _engine(engine)
+    columns = None
+    first = 0        # article index of the first article of the batch
+    current = -1     # article index of the window being extracted
+    offset = 0
+    has_marker = False
+
+    def new_columns():
+        return array('q'), array('d'), array('B'), array('q'), array('q')
+
+    def emit(parsed, start, end):
+        columns[0].append(current - first)
+        columns[1].append(parsed[0])
+        columns[2].append(OPERATOR_CODES[parsed[1]])
+        columns[3].append(offset + start)
+        columns[4].append(offset + end)
+
+    def result(n_articles):
+        article, p_value, operator, span_start, span_end = columns
+        return n_articles, {
+            'article': np.frombuffer(article, dtype=np.int64),
+            'p_value': np.frombuffer(p_value, dtype=np.float64),
+            'operator': np.frombuffer(operator, dtype=np.uint8),
+            'start': np.frombuffer(span_start, dtype=np.int64),
+            'end': np.frombuffer(span_end, dtype=np.int64),
+        }
+
+    def close_article():
+        PREFILTER_STATS['lines'] += 1
+        if not has_marker:
+            PREFILTER_STATS['lines_rejected'] += 1
+
+    columns = new_columns()
+    for article, offset, text in iter_windows(f, window_size):
+        if article != current:
+            if current >= 0:
+                close_article()
+            if article - first >= batch_size:
+                yield result(article - first)
+                columns = new_columns()
+                first = article
+            current = article
+            has_marker = False
+        if not may_contain_pval(text):
+            continue
+        has_marker = True
+        run_engine(text, emit)
+    if current >= 0:
+        close_article()
+        yield result(current + 1 - first)
+
+# ---------- scanner engine ----------
+# The pattern above is tried at every whitespace of the text and backtracks
+# through its nested optional groups. Every quantifier in it is greedy and
+# every choice after the operator is optional, so the first path the regex
+# engine accepts can be rebuilt by a single forward pass. The scanner below
+# does exactly that. It jumps between the same 'p'/'P' anchors as the
+# prefilter windows and parses the rest by hand.
+#
+# It is not faster than engine='regex': once the prefilter has cut the line
+# into windows, P_VALUE_RE.match only runs on a few characters each, in C,
+# where the scanner steps through them in Python. benchmark_pval_engines.py
+# measures it at 0.80-0.92x the regex engine (about 110-130 vs 140 MB/s on the
+# synthetic corpus and PMC bodies), both well ahead of the old finditer loop
+# (about 75 MB/s). 'regex' therefore stays the default; 'scan' is kept as the
+# independent second implementation the differential check compares against.
+
+_DIGITS = '0123456789'
+_SEPARATORS = ',.•'
+_OPERATOR_SIGNS = '=<>≤≥'
+_EXP_TOKENS = ('exp', 'Exp', 'E', 'e')
+
+def _skip_space(text, i, n):
+    while i < n and text[i].isspace():
+        i += 1
+    return i
+
+def _skip_digits(text, i, n):
+    while i < n and text[i] in _DIGITS:
+        i += 1
+    return i
+
+def _scan_operator(text, i, n):
+    # ([=<>≤≥]|less\s+than|of\s+<)+ ; returns the end of the group or -1
+    start = i
+    while i < n:
+        c = text[i]
+        if c in _OPERATOR_SIGNS:
+            i += 1
+        elif c == 'l' and text.startswith('less', i):
+            k = _skip_space(text, i + 4, n)
+            if k == i + 4 or not text.startswith('than', k):
+                break
+            i = k + 4
+        elif c == 'o' and text.startswith('of', i):
+            k = _skip_space(text, i + 2, n)
+            if k == i + 2 or k >= n or text[k] != '<':
+                break
+            i = k + 1
         else:
-            digits=float(digits)
-        
-        # Rule: consider % format
-        if '%' in raw_value_str:
-            p_value = digits*0.01
-        # has extra exponent term, with base and exponent
-        elif 'e' in raw_value_str:
-            if base and not float(base)==0:
-                base=float(base)
-            else:
-                base=10 #According to previous study from jama, We assume base is 10
-            if exponent:
-                exponent=float(exponent)
-            else:
-                exponent=1 # If exponent is missing, we let exponent as 1, excluding the effect of the exponent.
-            p_value=digits*(base**exponent)
-        else:
-            p_value=digits
-            
-        # Rule: Discard if not in interval (0, 1]
-        if p_value <= 0 or p_value >= 1:
+            break
+    return i if i > start else -1
+
+def _scan_exponent(text, i, n):
+    # (\(\s*-\s*[0-9]+\s*\)) | (\s*-\s*[0-9]+) ; returns the end or -1
+    if i < n and text[i] == '(':
+        k = _skip_space(text, i + 1, n)
+        if k < n and text[k] == '-':
+            k = _skip_space(text, k + 1, n)
+            e = _skip_digits(text, k, n)
+            if e > k:
+                e = _skip_space(text, e, n)
+                if e < n and text[e] == ')':
+                    return e + 1
+    k = _skip_space(text, i, n)
+    if k < n and text[k] == '-':
+        k = _skip_space(text, k + 1, n)
+        e = _skip_digits(text, k, n)
+        if e > k:
+            return e
+    return -1
+
+def _scan_number(text, i, n):
+    """
+    Parses the number group starting at text[i].
+
+    Returns:
+        tuple or None: (end, digits_end, base_start, base_end,
+        exponent_start, exponent_end) with -1 for groups that did not
+        participate, or None if no number starts here.
+    """
+    # digits: ([0-9]|[,.•][0-9]) [0-9]* [,.•]? [0-9]*
+    if i < n and text[i] in _DIGITS:
+        i += 1
+    elif i + 1 < n and text[i] in _SEPARATORS and text[i + 1] in _DIGITS:
+        i += 2
+    else:
+        return None
+    i = _skip_digits(text, i, n)
+    if i < n and text[i] in _SEPARATORS:
+        i += 1
+    digits_end = i = _skip_digits(text, i, n)
+
+    # suffix: '%' or [x×]? \s* base \s* ((exp|Exp|E|e)? \s* exponent)?
+    i = _skip_space(text, i, n)
+    if i < n and text[i] == '%':
+        return i + 1, digits_end, -1, -1, -1, -1
+    if i < n and text[i] in 'x×':
+        i += 1
+    base_start = i = _skip_space(text, i, n)
+    base_end = i = _skip_digits(text, i, n)
+    i = _skip_space(text, i, n)
+    for token in _EXP_TOKENS + ('',):
+        if not text.startswith(token, i):
             continue
-        
-        # Classify operators
-        operator_str=operator_str.replace('of','').replace('≤','<').replace('≥','>').replace('lessthan','<')
-        if '=' in operator_str:
-            operator='='
-        if '>' in operator_str:
-            operator='>'
-        if '<' in operator_str:
-            operator='<'
-        if '>' in operator_str:
-            if '<' in operator_str:
-                operator='ambiguous'
-        results.append((p_value,operator))
+        exponent_start = _skip_space(text, i + len(token), n)
+        exponent_end = _scan_exponent(text, exponent_start, n)
+        if exponent_end >= 0:
+            return exponent_end, digits_end, base_start, base_end, exponent_start, exponent_end
+    return i, digits_end, base_start, base_end, -1, -1
+
+def _scan_at(text, j, n):
+    """
+    Parses a P value whose 'P' is at text[j].
 
+    Returns:
+        tuple or None: (end, op_start, op_end, num_start), or None if
+        nothing matches here.
+    """
+    # (\s|-)*
+    i = j + 1
+    while i < n and (text[i].isspace() or text[i] == '-'):
+        i += 1
+    # (value|values)? (\s)* then the operator; 'value' is tried before 'values'
+    op_start = i
+    op_end = -1
+    if text.startswith('value', i):
+        op_start = _skip_space(text, i + 5, n)
+        op_end = _scan_operator(text, op_start, n)
+        if op_end < 0 and text.startswith('values', i):
+            op_start = _skip_space(text, i + 6, n)
+            op_end = _scan_operator(text, op_start, n)
+    else:
+        op_end = _scan_operator(text, i, n)
+    if op_end < 0:
+        return None
+
+    num_start = _skip_space(text, op_end, n)
+    number = _scan_number(text, num_start, n)
+    if number is None:
+        return None
+    return number[0], op_start, op_end, num_start
+
+# ---------- memoized literal parser ----------
+# The corpus repeats a small set of literals ("0.05", "0.001", "< 0.0001", ...)
+# millions of times, so the homogenization result is cached on the raw
+# operator and number text. The digits/base/exponent pieces are a function of
+# the number text alone (the scanner re-derives them on a miss), which keeps
+# the cache key to two strings for both engines.
+LITERAL_CACHE_SIZE = 1 << 16
+
+@lru_cache(maxsize=LITERAL_CACHE_SIZE)
+def parse_literal(operator_str, raw_value_str):
+    """
+    Cached to_pval_and_oper() keyed on the matched operator and number text.
+
+    Args:
+        operator_str (str): Text matched by the operator group.
+        raw_value_str (str): Text matched by the whole number group.
+
+    Returns:
+        tuple or None: (p_value, operator), or None if the match is discarded.
+    """
+    return to_pval_and_oper(operator_str, raw_value_str, *number_groups(raw_value_str))
+
+def number_groups(raw_value_str):
+    """
+    Splits the text matched by the number group into the digits, base and
+    exponent groups of P_VALUE_PATTERN, without running the pattern.
+
+    Returns:
+        tuple: (digits, base or None, exponent or None)
+    """
+    n = len(raw_value_str)
+    end, digits_end, base_start, base_end, exp_start, exp_end = _scan_number(raw_value_str, 0, n)
+    return (raw_value_str[:digits_end],
+            raw_value_str[base_start:base_end] if base_start >= 0 else None,
+            raw_value_str[exp_start:exp_end] if exp_start >= 0 else None)
+
+def literal_cache_stats():
+    """
+    Returns hits, misses, current size, maxsize and hit rate of the
+    parse_literal() cache, to help size LITERAL_CACHE_SIZE.
+    """
+    info = parse_literal.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hit_rate': info.hits / lookups if lookups else 0.0,
+    }
+
+def _scan_engine(text, emit, literal=None):
+    """Runs the scanner over text; emit and literal as in _regex_engine()."""
+    n = len(text)
+    windows = 0
+    matched = 0
+    # the character before 'P' belongs to the match, so a match never starts
+    # at 'P' index 0 and the next one starts at least one past the last end
+    anchor = _ANCHOR_RE.search(text, 1)
+    while anchor is not None:
+        j = anchor.start()
+        c = text[j - 1]
+        if c != '(' and not c.isspace():
+            anchor = _ANCHOR_RE.search(text, j + 1)
+            continue
+        windows += 1
+        spans = _scan_at(text, j, n)
+        if spans is None:
+            anchor = _ANCHOR_RE.search(text, j + 1)
+            continue
+        matched += 1
+        end, op_start, op_end, num_start = spans
+        anchor = _ANCHOR_RE.search(text, end + 1)
+        operator_str, raw_value_str = text[op_start:op_end], text[num_start:end]
+        parsed = parse_literal(operator_str, raw_value_str)
+        if parsed is not None:
+            emit(parsed, j - 1, end)
+        if literal is not None:
+            literal(parsed, j - 1, end, operator_str, raw_value_str)
+    PREFILTER_STATS['windows'] += windows
+    PREFILTER_STATS['windows_matched'] += matched
+
+def scan_pval_and_oper(text):
+    """
+    Single-pass scanner equivalent of text_to_pval_and_oper(text).
+
+    Jumps from one 'p'/'P' anchor to the next and parses the operator, digits,
+    separator, percent and scientific-notation suffix without backtracking.
+
+    Args:
+        text (str): The abstract or text to analyze.
+
+    Returns:
+        list of tuples: A list of (p_value_float, operator).
+    """
+    results = []
+    _scan_engine(text, lambda parsed, start, end: results.append(parsed))
     return results
+
+_ENGINES = {'regex': _regex_engine, 'scan': _scan_engine}
+
+def _engine(name):
+    try:
+        return _ENGINES[name]
+    except KeyError:
+        raise ValueError(f"unknown engine: {name}") from None
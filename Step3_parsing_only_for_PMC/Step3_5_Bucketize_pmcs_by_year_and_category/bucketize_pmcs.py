@@ -38,6 +38,11 @@ Key features and improvements over the original prototype:
   capturing duplicates and files with missing metadata. These logs provide
   transparency and aid reproducibility.
 
+* **Compact labels index.** The labels CSV (7M+ PMC IDs) is loaded column
+  by column with pandas into a ``LabelIndex``: sorted arrays of PMC
+  numbers, years and category bitmasks, searched by bisection. It loads in
+  seconds and takes 7 bytes per PMC ID.
+
 * **Cross‑check summary.** At the end of a run the script prints a
   cross‑tabulation of the number of files stored in each (category, year)
   bucket. This acts as a sanity check and can be redirected to a file if
@@ -81,10 +86,13 @@ import sqlite3
 import sys
 import tarfile
 import time
+from array import array
+from bisect import bisect_left
 from collections import OrderedDict, defaultdict
 
 # Optional: pandas speeds up CSV read. Fallback to csv module if missing.
 try:
+    import numpy as np
     import pandas as pd
     HAS_PANDAS = True
 except Exception:
@@ -104,94 +112,169 @@ BUCKET_MAP = OrderedDict([
     ("clinical_trial",           "clinical-trial"),
 ])
 
+# One bit per bucket, in BUCKET_MAP order
+BUCKET_BITS = OrderedDict((bucket, 1 << i) for i, bucket in enumerate(BUCKET_MAP.values()))
+PMC_COLUMNS = ["pmc id", "pmc_id", "pmcid"]
+YEAR_COLUMNS = ["year", "pdat_year", "pub_year"]
+TRUE_VALUES = ("1", "true", "t", "y", "yes")
+UNKNOWN_YEAR = 0  # year of the IDs whose year could not be parsed
+PMC_NUMBER_RE = re.compile(r"^PMC([0-9]{1,9})$")
+CSV_CHUNK_ROWS = 250000  # rows of the labels CSV parsed at a time with pandas
+
+class LabelIndex:
+    """
+    Year and buckets of every PMC ID of the labels CSV, as three parallel
+    arrays sorted by PMC number: PMC number (uint32), year (uint16,
+    ``UNKNOWN_YEAR`` if it could not be parsed) and bitmask of
+    ``BUCKET_BITS`` (uint8). An ID is looked up by binary search. This is
+    7 bytes per PMC ID, instead of a dict with a dict and a set per ID that
+    took minutes and gigabytes to build for the 7M+ rows of the CSV.
+    """
+    def __init__(self, pmcs, years, masks):
+        self.pmcs = pmcs
+        self.years = years
+        self.masks = masks
+        # buckets of every bitmask, in BUCKET_MAP order
+        self.bucket_sets = [tuple(b for b, bit in BUCKET_BITS.items() if mask & bit)
+                            for mask in range(1 << len(BUCKET_BITS))]
+
+    @classmethod
+    def from_rows(cls, pmcs, years, masks):
+        """
+        Build the index from unsorted rows (any sequences of the same
+        length). As with a dict, the last row of a PMC number wins.
+        """
+        # stable sort: rows of the same PMC number stay in CSV order
+        order = sorted(range(len(pmcs)), key=pmcs.__getitem__)
+        last = [i for k, i in enumerate(order) if k + 1 == len(order) or pmcs[order[k + 1]] != pmcs[i]]
+        return cls(array("I", (pmcs[i] for i in last)), array("H", (years[i] for i in last)),
+                   array("B", (masks[i] for i in last)))
+
+    def __len__(self):
+        return len(self.pmcs)
+
+    def get(self, pmc_id):
+        """
+        (year or None, buckets tuple) of an uppercase PMC ID (e.g.
+        ``PMC12345``), or None if the CSV does not list it.
+        """
+        mo = PMC_NUMBER_RE.match(pmc_id)
+        if not mo:
+            return None
+        number = int(mo.group(1))
+        i = bisect_left(self.pmcs, number)
+        if i == len(self.pmcs) or self.pmcs[i] != number:
+            return None
+        year = self.years[i]
+        return (None if year == UNKNOWN_YEAR else year), self.bucket_sets[self.masks[i]]
+
+    def __contains__(self, pmc_id):
+        return self.get(pmc_id) is not None
+
+    def __iter__(self):
+        """(PMC ID, year or None, buckets tuple) of every indexed ID, by PMC number."""
+        bucket_sets = self.bucket_sets
+        for number, year, mask in zip(self.pmcs, self.years, self.masks):
+            yield f"PMC{number}", (None if year == UNKNOWN_YEAR else year), bucket_sets[mask]
+
+    def mask(self, pmc_id):
+        """Bitmask of ``BUCKET_BITS`` of a PMC ID in any form ('12345', 'pmc12345'); 0 if the CSV does not list it."""
+        number = parse_pmc_number(pmc_id)
+        if number is None:
+            return 0
+        i = bisect_left(self.pmcs, number)
+        return self.masks[i] if i < len(self.pmcs) and self.pmcs[i] == number else 0
+
+    def year_set(self):
+        """Years parsed for the indexed IDs (without unknown ones)."""
+        return set(self.years) - {UNKNOWN_YEAR}
+
+def _find_column(cols, names, what):
+    col = next((cols[c] for c in names if c in cols), None)
+    if col is None:
+        raise SystemExit(f"❌ CSV must include a {what} column ({' / '.join(names)}).")
+    return col
+
+def parse_pmc_number(raw):
+    """'12345', 'pmc12345' -> 12345; None if it is not a PMC ID."""
+    raw = str(raw).strip().upper()
+    mo = PMC_NUMBER_RE.match(raw if raw.startswith("PMC") else f"PMC{raw}")
+    return int(mo.group(1)) if mo else None
+
+def parse_year(raw):
+    """'2020', '2020.0' -> 2020; UNKNOWN_YEAR if it does not parse or does not fit in a uint16."""
+    try:
+        yr = int(str(raw).strip().split(".")[0])
+    except Exception:
+        return UNKNOWN_YEAR
+    return yr if 0 < yr < 1 << 16 else UNKNOWN_YEAR
+
+def _label_arrays(df, pmc_col, year_col, flag_cols):
+    """(uint32 PMC numbers, uint16 years, uint8 bitmasks) of the rows of a chunk of the CSV with a PMC ID."""
+    # same rules as parse_pmc_number / parse_year, on whole columns
+    raw = df[pmc_col].str.strip().str.upper()
+    raw = raw.where(~raw.str.startswith("PMC"), raw.str[3:])
+    is_pmc = raw.str.fullmatch(r"[0-9]{1,9}").to_numpy(dtype=bool)
+    years = df[year_col].str.strip().str.split(".", n=1).str[0]
+    years = pd.to_numeric(years.where(years.str.fullmatch(r"[+-]?[0-9]+")), errors="coerce")
+    years = years.where((years > 0) & (years < 1 << 16), UNKNOWN_YEAR)
+    masks = np.zeros(len(df), dtype=np.uint8)
+    for col, bit in flag_cols:
+        masks[df[col].str.strip().str.lower().isin(TRUE_VALUES).to_numpy()] |= bit
+    return (raw[is_pmc].astype(np.int64).to_numpy().astype(np.uint32),
+            years.to_numpy()[is_pmc].astype(np.uint16), masks[is_pmc])
+
 def load_labels(csv_path):
     """
-    Load the labels CSV and return a mapping of PMC IDs to their metadata.
+    Load the labels CSV into a LabelIndex.
 
-    The returned ``meta`` dict maps uppercase PMC ID (e.g., ``PMC12345``) to
-    a dict ``{"year": year_or_None, "buckets": set[str]}``. Years are
-    integers where possible, or ``None`` if parsing fails. ``years`` is a
-    set of all years successfully parsed (excluding None).
+    PMC IDs are normalized to ``PMC<number>`` (a bare number gets the
+    prefix); rows whose ID is not of that form are dropped, since no XML file
+    name could match them. Years are the integer part of the year column, or
+    unknown if it does not parse. A flag counts as set for '1', 'true', 'yes'
+    and the like. If a PMC ID has several rows, the last one wins.
+
+    Returns:
+        tuple: (LabelIndex, set of the years parsed)
     """
-    meta = {}
-    years = set()
-    # Use pandas for efficiency if available
     if HAS_PANDAS:
-        df = pd.read_csv(csv_path, dtype=str)
-        # Normalize column names
-        cols = {c.strip().lower(): c for c in df.columns}
-        need_base = ["pmc id", "pmc_id", "pmcid"]
-        pmc_col = next((cols[c] for c in need_base if c in cols), None)
-        if pmc_col is None:
-            raise SystemExit("❌ CSV must include a PMC ID column (pmc id / pmc_id / pmcid).")
-        year_col = None
-        for k in ["year", "pdat_year", "pub_year"]:
-            if k in cols:
-                year_col = cols[k]
-                break
-        if year_col is None:
-            raise SystemExit("❌ CSV must include a publication year column (e.g., 'year').")
-        for _, row in df.iterrows():
-            raw = str(row[pmc_col]).strip()
-            if not raw:
-                continue
-            pmc_id = raw if raw.upper().startswith("PMC") else f"PMC{raw}"
-            pmc_id = pmc_id.upper()
-            # Parse year; if fails, mark as None
-            yr = None
-            try:
-                yr_tmp = str(row[year_col]).strip()
-                if yr_tmp:
-                    yr = int(yr_tmp.split(".")[0])
-                    years.add(yr)
-            except Exception:
-                yr = None
-            # Determine buckets
-            buckets = set()
-            for csv_flag, bucket_name in BUCKET_MAP.items():
-                if csv_flag in cols:
-                    val = str(row[cols[csv_flag]]).strip().lower()
-                    if val in ("1", "true", "t", "y", "yes"):
-                        buckets.add(bucket_name)
-            meta[pmc_id] = {"year": yr, "buckets": buckets}
+        header = pd.read_csv(csv_path, dtype=str, nrows=0).columns
+        cols = {c.strip().lower(): c for c in header}
+        pmc_col = _find_column(cols, PMC_COLUMNS, "PMC ID")
+        year_col = _find_column(cols, YEAR_COLUMNS, "publication year")
+        flag_cols = [(cols[flag], BUCKET_BITS[bucket]) for flag, bucket in BUCKET_MAP.items() if flag in cols]
+        # only the ID, year and flag columns are read, all as strings ('' when empty),
+        # CSV_CHUNK_ROWS rows at a time
+        chunks = pd.read_csv(csv_path, dtype=str, na_filter=False, chunksize=CSV_CHUNK_ROWS,
+                             usecols=[pmc_col, year_col] + [col for col, _ in flag_cols])
+        parts = [_label_arrays(df, pmc_col, year_col, flag_cols) for df in chunks]
+        pmcs, years, masks = (np.concatenate([part[k] for part in parts]) if parts else np.zeros(0, dtype)
+                              for k, dtype in enumerate((np.uint32, np.uint16, np.uint8)))
+        del parts
+        # stable sort, then the last row of each PMC number
+        order = np.argsort(pmcs, kind="stable")
+        pmcs = pmcs[order]
+        last = np.append(pmcs[1:] != pmcs[:-1], True)
+        index = LabelIndex(array("I", pmcs[last].tobytes()), array("H", years[order][last].tobytes()),
+                           array("B", masks[order][last].tobytes()))
     else:
         # Fallback to Python's csv.DictReader
+        pmcs, years, masks = array("I"), array("H"), array("B")
         with open(csv_path, newline="", encoding="utf-8") as f:
             rdr = csv.DictReader(f)
             cols = {c.strip().lower(): c for c in rdr.fieldnames}
-            need_base = ["pmc id", "pmc_id", "pmcid"]
-            pmc_col = next((cols[c] for c in need_base if c in cols), None)
-            if pmc_col is None:
-                raise SystemExit("❌ CSV must include a PMC ID column (pmc id / pmc_id / pmcid).")
-            year_col = None
-            for k in ["year", "pdat_year", "pub_year"]:
-                if k in cols:
-                    year_col = cols[k]
-                    break
-            if year_col is None:
-                raise SystemExit("❌ CSV must include a publication year column (e.g., 'year').")
+            pmc_col = _find_column(cols, PMC_COLUMNS, "PMC ID")
+            year_col = _find_column(cols, YEAR_COLUMNS, "publication year")
+            flag_cols = [(cols[flag], BUCKET_BITS[bucket]) for flag, bucket in BUCKET_MAP.items() if flag in cols]
             for row in rdr:
-                raw = str(row[pmc_col]).strip()
-                if not raw:
+                number = parse_pmc_number(row[pmc_col] or "")
+                if number is None:
                     continue
-                pmc_id = raw if raw.upper().startswith("PMC") else f"PMC{raw}"
-                pmc_id = pmc_id.upper()
-                yr = None
-                try:
-                    yr_tmp = str(row[year_col]).strip()
-                    if yr_tmp:
-                        yr = int(yr_tmp.split(".")[0])
-                        years.add(yr)
-                except Exception:
-                    yr = None
-                buckets = set()
-                for csv_flag, bucket_name in BUCKET_MAP.items():
-                    if csv_flag in cols:
-                        val = str(row[cols[csv_flag]]).strip().lower()
-                        if val in ("1", "true", "t", "y", "yes"):
-                            buckets.add(bucket_name)
-                meta[pmc_id] = {"year": yr, "buckets": buckets}
-    return meta, years
+                pmcs.append(number)
+                years.append(parse_year(row[year_col]))
+                masks.append(sum(bit for col, bit in flag_cols if str(row[col]).strip().lower() in TRUE_VALUES))
+        index = LabelIndex.from_rows(pmcs, years, masks)
+    return index, index.year_set()
 
 class OutputTarLRU:
     """
@@ -362,11 +445,11 @@ def build_target_path(out_root, bucket, year):
     as the string ``unknown-year``. The directory structure is
     ``<out_root>/pmc/<bucket>/<year>.tar``.
     """
-    if year is None:
-        year_str = "unknown-year"
-    else:
-        year_str = str(int(year))
-    return os.path.join(out_root, "pmc", bucket, f"{year_str}.tar")
+    return os.path.join(out_root, "pmc", bucket, f"{bucket_year_str(year)}.tar")
+
+def bucket_year_str(year):
+    """Year folder name of a bucket: '2020', or ``unknown-year`` for ``None``."""
+    return "unknown-year" if year is None else str(int(year))
 
 def ensure_parent_dirs(out_root):
     """
@@ -412,11 +495,13 @@ def main():
         skipped_path = args.skipped
 
     # Load CSV metadata
-    meta, years = load_labels(args.csv)
+    start = time.time()
+    labels, years = load_labels(args.csv)
     if years:
-        print(f"✅ Loaded labels: {len(meta):,} PMC IDs; years {min(years)}–{max(years)}")
+        print(f"✅ Loaded labels: {len(labels):,} PMC IDs; years {min(years)}–{max(years)} "
+              f"({time.time() - start:.1f} s)")
     else:
-        print(f"✅ Loaded labels: {len(meta):,} PMC IDs; no valid year values found")
+        print(f"✅ Loaded labels: {len(labels):,} PMC IDs; no valid year values found")
 
     # Ensure output directories exist
     ensure_parent_dirs(out_root)
@@ -477,14 +562,13 @@ def main():
                 # Add to seen set
                 seen_pmcs.add(pmc_id)
                 # Lookup metadata
-                if pmc_id not in meta:
+                info = labels.get(pmc_id)
+                if info is None:
                     # Unknown PMC ID
                     state.mark(tar_path, inner_path, pmc_id)
                     skipped_writer.writerow([pmc_id, tar_name, inner_path, "metadata-missing"])
                     continue
-                info = meta[pmc_id]
-                year = info.get("year")
-                buckets = info.get("buckets", set())
+                year, buckets = info
                 if not buckets:
                     # No category flags set
                     state.mark(tar_path, inner_path, pmc_id)
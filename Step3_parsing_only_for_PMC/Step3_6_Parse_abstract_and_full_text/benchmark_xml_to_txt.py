@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the abstract/body extractors of xml_to_txt.py ('dom', 'stream', 'auto').
+
+A synthetic JATS corpus (front matter, abstract, body sections with inline
+markup and tables, a long reference list) is written to a temporary file.
+Each parser runs over it in a fresh worker process that reads one article at
+a time, so that the peak RSS it reports belongs to that parser alone. All must
+return the same (abstract, body) for every article; the throughput and the
+peak RSS growth during the run are printed. --large-paragraphs adds one very long article, where the DOM has to
+hold the whole tree while the stream parser only keeps the text.
+
+    python3 benchmark_xml_to_txt.py --articles 2000 --large-paragraphs 20000
+"""
+
+import argparse
+import hashlib
+import random
+import os
+import resource
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from xml_to_txt import PARSERS
+
+WORDS = ("patients were randomized to placebo or treatment and the primary outcome was analysed "
+         "using a mixed model with adjustment for baseline values compared with previous reports").split()
+LITERALS = ["P = 0.03", "P &lt; 0.001", "p=.049", "P ≤ 0.05", "P value &gt; 0.2"]
+
+def _paragraph(rng, n_words=80):
+    words = [rng.choice(WORDS) for _ in range(n_words)]
+    words[rng.randrange(n_words)] = f"(<italic>{rng.choice(LITERALS)}</italic>)"
+    words[rng.randrange(n_words)] = f'<xref ref-type="bibr" rid="r{rng.randrange(50)}">{rng.randrange(50)}</xref>'
+    return f"<p>{' '.join(words)}</p>"
+
+def synthetic_article(rng, n_paragraphs=40, n_refs=50):
+    """One JATS article as bytes."""
+    abstract = ''.join(f"<sec><title>{t}</title>{_paragraph(rng, 40)}</sec>"
+                       for t in ('Background', 'Methods', 'Results', 'Conclusions'))
+    sections = []
+    for i in range(0, n_paragraphs, 10):
+        body = ''.join(_paragraph(rng) for _ in range(min(10, n_paragraphs - i)))
+        table = ('<table-wrap><table><tr><td>HR</td><td>1.2</td><td>P = 0.01</td></tr></table></table-wrap>'
+                 '<!-- table note -->')
+        sections.append(f'<sec sec-type="s{i}"><title>Section {i}</title>{body}{table}</sec>')
+    refs = ''.join(f'<ref id="r{i}"><mixed-citation>Author {i}. Title {i}. J Med. 2020;{i}:1-10.'
+                   f'</mixed-citation></ref>' for i in range(n_refs))
+    xml = ('<?xml version="1.0" encoding="UTF-8"?>'
+           '<!DOCTYPE article PUBLIC "-//NLM//DTD JATS (Z39.96) Journal Archiving and Interchange DTD v1.3 20210610//EN" '
+           '"JATS-archivearticle1-3.dtd">'
+           '<article article-type="research-article"><front><article-meta>'
+           '<title-group><article-title>Synthetic article</article-title></title-group>'
+           f'<abstract>{abstract}</abstract></article-meta></front>'
+           f'<body>{"".join(sections)}</body><back><ref-list>{refs}</ref-list></back></article>')
+    return xml.encode('utf-8')
+
+def write_corpus(path, n_articles, large_paragraphs=0, seed=0):
+    """Write the synthetic corpus as length-prefixed articles. Returns its size in MB."""
+    rng = random.Random(seed)
+    size = 0
+    with open(path, 'wb') as f:
+        for i in range(n_articles + bool(large_paragraphs)):
+            if i < n_articles:
+                xml = synthetic_article(rng, n_paragraphs=rng.randint(5, 80))
+            else:
+                xml = synthetic_article(rng, n_paragraphs=large_paragraphs, n_refs=2000)
+            f.write(struct.pack('<Q', len(xml)))
+            f.write(xml)
+            size += len(xml)
+    return size / 1e6
+
+def iter_corpus(path):
+    with open(path, 'rb') as f:
+        while True:
+            head = f.read(8)
+            if not head:
+                return
+            yield f.read(struct.unpack('<Q', head)[0])
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return rss / 1e6 if sys.platform == 'darwin' else rss / 1e3
+
+def run_parser(name, path):
+    """Worker: run one parser over the corpus file. Returns (seconds, RSS before, peak RSS, digest)."""
+    parse = PARSERS[name]
+    rss_before = _max_rss_mb()
+    digest = hashlib.blake2b(digest_size=16)
+    sec = 0.0
+    for xml in iter_corpus(path):
+        start = time.perf_counter()
+        abstract, body = parse(xml)
+        sec += time.perf_counter() - start
+        for text in (abstract, body):
+            digest.update(b'\0' if text is None else text.encode('utf-8') + b'\1')
+    return sec, rss_before, _max_rss_mb(), digest.hexdigest()
+
+def main(args):
+    with tempfile.NamedTemporaryFile(suffix='.jats', delete=False) as f:
+        path = f.name
+    try:
+        mb = write_corpus(path, args.articles, args.large_paragraphs, args.seed)
+        results = {}
+        for name in PARSERS:
+            # a fresh process per parser: ru_maxrss is the peak of the process
+            with ProcessPoolExecutor(max_workers=1) as exe:
+                results[name] = exe.submit(run_parser, name, path).result()
+    finally:
+        os.remove(path)
+    digests = {r[3] for r in results.values()}
+    if len(digests) != 1:
+        raise SystemExit("❌ the parsers disagree on the synthetic corpus")
+    print(f"✅ {args.articles + bool(args.large_paragraphs):,} articles, {mb:.1f} MB: parsers agree")
+    print("parser\tseconds\tMB/s\tvs dom\tpeak RSS growth (MB)")
+    for name, (sec, rss_before, rss_peak, _) in results.items():
+        print(f"{name}\t{sec:.2f}\t{mb / sec:.1f}\t{results['dom'][0] / sec:.2f}x\t{rss_peak - rss_before:.1f}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the JATS extractors of xml_to_txt.py")
+    parser.add_argument("--articles", type=int, default=2000, help="synthetic articles")
+    parser.add_argument("--large-paragraphs", type=int, default=20000,
+                        help="paragraphs of one extra very long article (0: none)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    main(args)
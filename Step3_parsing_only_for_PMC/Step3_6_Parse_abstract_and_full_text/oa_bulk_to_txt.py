@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Steps 3-5 and 3-6 in one pass: OA bulk tars -> pmcid/pmcxtract lists.
+
+bucketize_pmcs.py copies every article of the OA bulk tars (oa_comm,
+oa_noncomm, oa_other) into per-(category, year) tars, and xml_to_txt.py reads
+those copies back. This script reads the OA bulk tars once and writes the
+final {output}/{category}/pmc*_list_{category}_{year}_*.txt directly. The
+files are the same as those of bucketize_pmcs.py followed by xml_to_txt.py:
+
+* The input directories are taken in the order given (like the successive
+  runs of Bucketize_pmcs.sh), the .tar files of each in sorted order.
+* Members are kept or skipped like bucketize_pmcs.py: the first member of a
+  PMCID wins, and names that are not PMC*.xml, PMCIDs missing from the labels
+  CSV and PMCIDs without any flag are skipped.
+* Every kept article goes to each bucket of its flags, for its CSV year.
+
+The members of each OA tar are listed with their byte offsets
+(xml_to_txt.tar_member_index, cached in {tar}.idx), and the routing is planned
+from those lists before any XML is read. Each tar is then cut into member
+ranges of about --split-mb MB that are parsed in parallel into shards
+({output}/.oa_bulk/{tar}/). The shards of the tars are appended to the output
+files in input order, and {output}/.oa_bulk/{tar}.done is written, so a rerun
+skips the merged tars and reuses finished shards. The shards are reused only
+if {output}/.oa_bulk/{tar}/manifest still matches: same tar, same ranges,
+same --parser and the same planned members, years and buckets.
+
+--bucket-dir still writes the bucket tars of bucketize_pmcs.py
+({bucket-dir}/pmc/{category}/{year}.tar) from the same read, while each OA
+tar is merged. The bucket tars are cut back to the member ends recorded in
+{output}/.oa_bulk/{tar}.buckets when a crash left the copy of an OA tar
+unfinished, so no member is added twice.
+
+    python3 oa_bulk_to_txt.py --labels flaglist.csv --workers 11 \\
+        oa_bulk/oa_comm/xml oa_bulk/oa_noncomm/xml oa_bulk/oa_other/xml result
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import re
+import shutil
+import tarfile
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from pathlib import Path
+
+from xml_to_txt import (COMPRESS_SUFFIX, HAS_ZSTD, PARSERS, Checkpoint, compress_outputs, import_bucketize,
+                        output_paths, reset_shard_dir, split_ranges, tar_member_index, tar_stamp, truncate_to,
+                        write_article)
+
+PMC_RE = re.compile(r"^(PMC\d+)\.xml$", re.IGNORECASE)  # as in bucketize_pmcs.py
+STATE_DIR = ".oa_bulk"
+
+def list_tars(input_dirs):
+    """The .tar files of each input directory, directories in the given order, files sorted."""
+    tars = []
+    for input_dir in input_dirs:
+        tars += sorted(os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith(".tar"))
+    return tars
+
+def plan(tars, labels):
+    """
+    Members to copy from each OA tar, with the de-duplication and skip rules of bucketize_pmcs.py.
+
+    Returns:
+        tuple: ([(tar, [(offset, size, name, year_str, buckets)])], Counter of skip reasons)
+    """
+    bucket_year_str = import_bucketize().bucket_year_str
+    seen = set()
+    skipped = Counter()
+    planned = []
+    for tar_path in tars:
+        entries = tar_member_index(tar_path)
+        if entries is None:
+            raise SystemExit(f"❌ cannot list the members of {tar_path} by offset (sparse members?)")
+        kept = []
+        for offset, size, name in entries:
+            mo = PMC_RE.match(os.path.basename(name))
+            if not mo:
+                skipped["non-xml or unrecognized filename"] += 1
+                continue
+            pmc_id = mo.group(1).upper()
+            if pmc_id in seen:
+                skipped["duplicate-pmcid"] += 1
+                continue
+            seen.add(pmc_id)
+            info = labels.get(pmc_id)
+            if info is None:
+                skipped["metadata-missing"] += 1
+                continue
+            year, buckets = info
+            if not buckets:
+                skipped["no-category-flags"] += 1
+                continue
+            kept.append((offset, size, name, bucket_year_str(year), buckets))
+        planned.append((tar_path, kept))
+    return planned, skipped
+
+def state_paths(output_dir, tar_path):
+    """(shard folder, done flag) of one OA tar."""
+    state = Path(output_dir) / STATE_DIR
+    name = os.path.basename(tar_path)
+    return state / name, state / f"{name}.done"
+
+def oa_shard_manifest(tar_path, ranges, parser):
+    """Text of the shard manifest of one OA tar: tar stamp, parser, planned members, then the size of each range."""
+    h = hashlib.blake2b(digest_size=16)
+    for entries in ranges:
+        for offset, size, name, year, buckets in entries:
+            h.update(f"{offset}\t{size}\t{name}\t{year}\t{','.join(buckets)}\n".encode('utf-8'))
+    lines = [tar_stamp(tar_path), f"parser\t{parser}", f"members\t{h.hexdigest()}"]
+    lines += [str(len(entries)) for entries in ranges]
+    return '\n'.join(lines) + '\n'
+
+def process_oa_range(tar_path, sdir, shard, entries, parser='auto'):
+    """
+    Parse one member range of an OA tar into shard files {shard:05d}.{category}.{year}.{k}
+    (the k-th of the four output files; skipped if the shard is already done).
+    """
+    parse = PARSERS[parser]
+    sdir = Path(sdir)
+    sdir.mkdir(parents=True, exist_ok=True)
+    done_flag = sdir / f"{shard:05d}.done"
+    if done_flag.exists():
+        return
+    with open(tar_path, 'rb') as raw, ExitStack() as stack:
+        files = {}
+
+        def outputs(bucket, year):
+            if (bucket, year) not in files:
+                files[bucket, year] = [stack.enter_context(open(sdir / f"{shard:05d}.{bucket}.{year}.{k}", 'w',
+                                                                encoding='utf-8')) for k in range(4)]
+            return files[bucket, year]
+
+        for offset, size, name, year, buckets in entries:
+            raw.seek(offset)
+            data = raw.read(size)
+            first, *more = [outputs(bucket, year) for bucket in buckets]
+            write_article(name, data, parse, *first, more)
+    done_flag.write_text("done")
+
+def merge_oa_shards(tar_path, sdir, n_shards, output_dir):
+    """
+    Append the shards of one OA tar to the output files of their (category,
+    year), in range order. Returns the Checkpoint to clear once the tar is marked done.
+    """
+    sdir = Path(sdir)
+    keys = [sorted({tuple(p.name.split('.')[1:3]) for p in sdir.glob(f"{shard:05d}.*.*.0")})
+            for shard in range(n_shards)]
+    # a merge that died half-way is redone from the sizes before it
+    outputs = sorted({p for shard_keys in keys for key in shard_keys for p in output_paths(output_dir, *key)})
+    ckpt = Checkpoint(tar_path, outputs, path=str(sdir) + ".ckpt")
+    ckpt.resume(restart=True)
+    for shard in range(n_shards):
+        for bucket, year in keys[shard]:
+            outputs = output_paths(output_dir, bucket, year)
+            outputs[0].parent.mkdir(parents=True, exist_ok=True)
+            for k, out_path in enumerate(outputs):
+                with open(out_path, 'ab') as out, open(sdir / f"{shard:05d}.{bucket}.{year}.{k}", 'rb') as f:
+                    shutil.copyfileobj(f, out)
+    return ckpt
+
+class BucketTars:
+    """
+    Bucket tars of bucketize_pmcs.py ({root}/pmc/{bucket}/{year}.tar), with at
+    most ``max_open`` handles kept open (its OutputTarLRU). New tars use the
+    PAX format, members get the normalized metadata of add_member_to_output.
+    """
+    def __init__(self, root, max_open=400):
+        self.root = root
+        self.max_open = max_open
+        self.cache = OrderedDict()
+
+    def path(self, bucket, year):
+        return os.path.join(self.root, "pmc", bucket, f"{year}.tar")
+
+    def get(self, bucket, year):
+        path = self.path(bucket, year)
+        if path in self.cache:
+            self.cache.move_to_end(path)
+            return self.cache[path]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(path):
+            with tarfile.open(path, mode="w", format=tarfile.PAX_FORMAT):
+                pass
+        self.cache[path] = tarfile.open(path, mode="a")
+        while len(self.cache) > self.max_open:
+            _, tf = self.cache.popitem(last=False)
+            tf.close()
+        return self.cache[path]
+
+    def resume(self, ckpt_path):
+        """
+        Cut the bucket tars back to the member ends recorded in ``ckpt_path``
+        by an add that did not finish (the end-of-archive blocks are written
+        again on close), and remove the checkpoint.
+        """
+        ckpt_path = Path(ckpt_path)
+        if not ckpt_path.exists():
+            return
+        for line in ckpt_path.read_text(encoding='utf-8').splitlines():
+            end, path = line.split('\t', 1)
+            tf = self.cache.pop(path, None)
+            if tf is not None:
+                tf.close()
+            if int(end) == 0:
+                Path(path).unlink(missing_ok=True)
+            else:
+                truncate_to(Path(path), int(end))
+        ckpt_path.unlink()
+
+    def add(self, tar_path, entries, ckpt_path):
+        """
+        Copy the planned members of one OA tar into their bucket tars. The
+        end of the last member of every bucket tar it touches is written to
+        ``ckpt_path`` first; the caller removes it once the OA tar is done.
+        """
+        ckpt_path = Path(ckpt_path)
+        keys = sorted({(bucket, year) for _, _, _, year, buckets in entries for bucket in buckets})
+        ends = [(self.get(bucket, year).offset, self.path(bucket, year)) for bucket, year in keys]
+        tmp_path = ckpt_path.with_name(ckpt_path.name + ".tmp")
+        tmp_path.write_text(''.join(f"{end}\t{path}\n" for end, path in ends), encoding='utf-8')
+        os.replace(tmp_path, ckpt_path)
+        with open(tar_path, 'rb') as raw:
+            for offset, size, name, year, buckets in entries:
+                raw.seek(offset)
+                data = raw.read(size)
+                for bucket in buckets:
+                    ti = tarfile.TarInfo(name=os.path.basename(name))
+                    ti.size = len(data)
+                    ti.uid = ti.gid = 0
+                    ti.uname = ti.gname = ""
+                    ti.mtime = int(time.time())
+                    self.get(bucket, year).addfile(ti, fileobj=io.BytesIO(data))
+        for tf in self.cache.values():
+            tf.fileobj.flush()
+
+    def close(self):
+        for tf in self.cache.values():
+            tf.close()
+        self.cache.clear()
+
+def main(args):
+    if args.compress == 'zstd' and not HAS_ZSTD:
+        raise SystemExit("❌ --compress zstd needs the zstandard package (pip install zstandard), or use gzip")
+    labels, _ = import_bucketize().load_labels(args.labels)
+    print(f"✅ Loaded labels: {len(labels):,} PMC IDs")
+    tars = list_tars(args.input_dirs)
+    planned, skipped = plan(tars, labels)
+    del labels
+    n_kept = sum(len(kept) for _, kept in planned)
+    print(f"Found {len(tars)} OA tars: {n_kept:,} articles to parse; skipped: "
+          + (", ".join(f"{n:,} {reason}" for reason, n in skipped.items()) or "none"))
+
+    range_bytes = args.split_mb * 1000000 or float('inf')
+    pending = []  # (tar, entries, shard folder, done flag, ranges), in input order
+    for tar_path, kept in planned:
+        sdir, done_flag = state_paths(args.output_dir, tar_path)
+        if done_flag.exists():
+            # its bucket tars were complete before it was merged
+            Path(str(sdir) + ".buckets").unlink(missing_ok=True)
+            print(f"[SKIP] done: {tar_path}")
+            continue
+        ranges = [kept[a:b] for a, b in split_ranges([entry[:3] for entry in kept], range_bytes)]
+        # shards of an earlier run are reused only if they were cut and routed the same way
+        reset_shard_dir(sdir, oa_shard_manifest(tar_path, ranges, args.parser), tar_path)
+        pending.append((tar_path, kept, sdir, done_flag, ranges))
+
+    buckets = BucketTars(args.bucket_dir, args.max_open) if args.bucket_dir else None
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as exe:
+            futures = {}
+            remaining = {}
+            for i, (tar_path, _, sdir, _, ranges) in enumerate(pending):
+                remaining[i] = len(ranges)
+                for shard, entries in enumerate(ranges):
+                    fut = exe.submit(process_oa_range, tar_path, str(sdir), shard, entries, args.parser)
+                    futures[fut] = i
+            next_merge = 0
+            for fut in as_completed(futures):
+                i = futures[fut]
+                try:
+                    fut.result()
+                except Exception as e:
+                    print(f"[JOB ERROR] {pending[i][0]}: {e}")
+                    remaining[i] = None  # keep its shards, a rerun resumes them; later tars wait too
+                    continue
+                remaining[i] -= 1
+                # the OA tars are merged in input order, as far as all their shards are done
+                while next_merge < len(pending) and remaining[next_merge] == 0:
+                    tar_path, kept, sdir, done_flag, ranges = pending[next_merge]
+                    bucket_ckpt = Path(str(sdir) + ".buckets")
+                    if buckets is not None:
+                        buckets.resume(bucket_ckpt)
+                        buckets.add(tar_path, kept, bucket_ckpt)
+                    ckpt = merge_oa_shards(tar_path, sdir, len(ranges), args.output_dir)
+                    done_flag.write_text("done")
+                    ckpt.clear()
+                    bucket_ckpt.unlink(missing_ok=True)
+                    shutil.rmtree(sdir)
+                    print(f"[DONE] {tar_path} ({len(kept):,} articles, {len(ranges)} shards)")
+                    next_merge += 1
+    finally:
+        if buckets is not None:
+            buckets.close()
+
+    # an output file may still grow until the last OA tar is merged
+    if args.compress and next_merge == len(pending):
+        compress_outputs(sorted(Path(args.output_dir).glob("*/pmcxtract_list_*.txt")), args.compress, args.workers)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="OA bulk tars -> pmcid/pmcxtract lists, without bucket tars")
+    parser.add_argument("input_dirs", nargs="+", help="folders of OA bulk .tar files, in bucketize order")
+    parser.add_argument("output_dir", help="output directory (as of xml_to_txt.py)")
+    parser.add_argument("--labels", required=True, help="labels CSV (PMC_ID + year + flags) of bucketize_pmcs.py")
+    parser.add_argument("--bucket-dir", default=None,
+                        help="also write the bucket tars of bucketize_pmcs.py under this output root")
+    parser.add_argument("--max-open", type=int, default=400, help="max simultaneously open bucket tars")
+    parser.add_argument("--workers", type=int, default=2, help="max parallel member ranges")
+    parser.add_argument("--split-mb", type=int, default=512,
+                        help="member ranges of about this size per job (0: one job per OA tar)")
+    parser.add_argument("--parser", choices=list(PARSERS), default="auto",
+                        help="abstract/body extractor of xml_to_txt.py")
+    parser.add_argument("--compress", choices=list(COMPRESS_SUFFIX), default=None,
+                        help="store the pmcxtract files block-compressed once every OA tar is merged")
+    args = parser.parse_args()
+    main(args)
@@ -1,12 +1,24 @@
 #!/usr/bin/env python3
+import gzip
+import hashlib
 import os
 import tarfile
 import re
 from lxml import etree
 from concurrent.futures import ProcessPoolExecutor, as_completed
 import argparse
+import shutil
+import sys
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
 
+# Optional: --compress zstd needs the zstandard package; gzip is built in.
+try:
+    import zstandard
+    HAS_ZSTD = True
+except Exception:
+    HAS_ZSTD = False
+
 # ---------- helpers ----------
 def clean_text(s: str) -> str:
     if s is None:
@@ -26,6 +38,9 @@ def parse_xml_bytes_get_abstract_body(xml_bytes):
         root = etree.fromstring(xml_bytes)
     except Exception:
         return None, None  # parse failed
+    return abstract_body_of(root)
+
+def abstract_body_of(root):
     # abstract: try common paths
     abstract_text = None
     # search for <abstract>
@@ -53,9 +68,439 @@ def parse_xml_bytes_get_abstract_body(xml_bytes):
             body_text = '\n'.join(texts)
     return abstract_text, body_text
 
+# ---------- streaming parser ----------
+# parse_xml_bytes_get_abstract_body builds the whole DOM, then runs two
+# union XPath scans over it and joins itertext() of every hit. The parser
+# target below gets the same text in one pass without building any tree:
+# lxml calls start/end/data while parsing, and text is only kept while an
+# abstract or body element is open. itertext() skips comments and processing
+# instructions, and so does a target without comment()/pi() methods. Nested
+# hits are collected in every open element and sorted back into document
+# order, like the XPath union.
+# The DOM route runs mostly in C and is faster on typical articles; the
+# target pays a Python call per text node but never holds the tree, so peak
+# memory stays at the size of the extracted text. 'auto' streams only the
+# members of STREAM_MIN_BYTES or more, which bounds the memory of a worker
+# without slowing down the common case (see benchmark_xml_to_txt.py).
+TARGET_TAGS = {'abstract': 'abstract', 'Abstract': 'abstract', 'ABSTRACT': 'abstract',
+               'body': 'body', 'Body': 'body', 'BODY': 'body'}
+
+JOIN_CHUNKS = 4096  # text chunks of a hit joined into one piece at a time
+
+class AbstractBodyTarget:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.open = []  # (kind, document order, joined pieces, recent text chunks) of the open hits
+        self.found = {'abstract': [], 'body': []}
+        self.order = 0
+
+    def start(self, tag, attrib):
+        kind = TARGET_TAGS.get(tag)
+        if kind:
+            self.open.append((kind, self.order, [], []))
+            self.order += 1
+
+    def end(self, tag):
+        if tag in TARGET_TAGS:
+            kind, order, pieces, chunks = self.open.pop()
+            t = ''.join(pieces + chunks).strip()
+            if t:
+                self.found[kind].append((order, t))
+
+    def data(self, text):
+        for _, _, pieces, chunks in self.open:
+            chunks.append(text)
+            if len(chunks) >= JOIN_CHUNKS:
+                # one string instead of thousands of small ones
+                pieces.append(''.join(chunks))
+                chunks.clear()
+
+    def close(self):
+        texts = [[t for _, t in sorted(self.found[kind])] for kind in ('abstract', 'body')]
+        self.reset()
+        return tuple('\n'.join(t) if t else None for t in texts)
+
+_TARGET = AbstractBodyTarget()
+_STREAM_PARSER = etree.XMLParser(target=_TARGET)
+
+def stream_parse(xml_bytes, target, parser, failed):
+    """Run a target parser over one member; ``failed`` if it does not parse."""
+    target.reset()
+    try:
+        result = etree.fromstring(xml_bytes, parser)
+    except Exception:
+        target.reset()
+        return failed  # parse failed
+    # etree.fromstring fails on any error-level message (e.g. an undefined
+    # entity); a target parser only reports it in the log
+    if any(e.level >= etree.ErrorLevels.ERROR for e in parser.error_log):
+        return failed
+    return result
+
+def stream_xml_bytes_get_abstract_body(xml_bytes):
+    """Same (abstract_text, body_text) as parse_xml_bytes_get_abstract_body, in one pass without a DOM."""
+    return stream_parse(xml_bytes, _TARGET, _STREAM_PARSER, (None, None))
+
+STREAM_MIN_BYTES = 4 << 20
+
+def auto_xml_bytes_get_abstract_body(xml_bytes):
+    if len(xml_bytes) >= STREAM_MIN_BYTES:
+        return stream_xml_bytes_get_abstract_body(xml_bytes)
+    return parse_xml_bytes_get_abstract_body(xml_bytes)
+
+PARSERS = {'auto': auto_xml_bytes_get_abstract_body,
+           'stream': stream_xml_bytes_get_abstract_body,
+           'dom': parse_xml_bytes_get_abstract_body}
+
+# ---------- body sections (--sections) ----------
+# The body is written as one line of text, so Step 4 scans its methods,
+# tables and figure captions along with the results. With --sections the
+# body text is also split into SECTION_GROUPS, one more pmcxtract file per
+# group next to the body file. A <sec> goes to the group of its sec-type, or
+# else of its <title> (first rule of SECTION_RULES that matches); a
+# sub-section inherits the group of its section, so "Statistical analysis"
+# under "Methods" stays in methods. Tables (<table-wrap>) and figure captions
+# (<fig>) are groups of their own wherever they are, and text outside any
+# recognised section is 'other'. Every group file has a line for every
+# article of the body file, in the same order, with just the PMCID where the
+# article has no text in that group, so Step 4 can join any of them back into
+# one line per article.
+SECTION_GROUPS = ('intro', 'methods', 'results', 'discussion', 'conclusions', 'tables', 'figures', 'other')
+SECTION_RULES = (('other', re.compile(r'supplement|appendix|acknowledg|abbreviation|funding|conflict|competing')),
+                 ('results', re.compile(r'result|finding')),
+                 ('methods', re.compile(r'method|material|statistic|experimental|design|participant|subjects')),
+                 ('discussion', re.compile(r'discussion')),
+                 ('conclusions', re.compile(r'conclusion')),
+                 ('intro', re.compile(r'intro|background')))
+FLOAT_GROUPS = {'table-wrap': 'tables', 'fig': 'figures'}
+
+def section_group(label):
+    """Group of a sec-type or section title, or None."""
+    label = label.lower()
+    for group, rule in SECTION_RULES:
+        if rule.search(label):
+            return group
+    return None
+
+class BodySections:
+    """
+    Splits the text of body elements into SECTION_GROUPS. It is fed the
+    start/end/data events of the elements inside a body, in document order,
+    by the DOM walk (dom_sections) or by SectionTarget.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # node 0 is the body itself; one more node per <sec>, <table-wrap> and <fig>:
+        # [parent node, fixed group, sec-type, title chunks or None]
+        self.nodes = [[None, 'other', None, None]]
+        self.open = []  # (node, node started here) of every open element
+        self.title = None  # node whose title is being read
+        self.runs = []  # (node, joined pieces, recent text chunks) in document order
+
+    def node(self):
+        return self.open[-1][0] if self.open else 0
+
+    def start(self, tag, attrib):
+        parent = self.node()
+        if tag == 'sec' or tag in FLOAT_GROUPS:
+            self.nodes.append([parent, FLOAT_GROUPS.get(tag), attrib.get('sec-type'), None])
+            self.open.append((len(self.nodes) - 1, True))
+            return
+        if tag == 'title' and self.open and self.open[-1][1] and self.nodes[parent][3] is None:
+            self.nodes[parent][3] = []
+            self.title = parent
+        self.open.append((parent, False))
+
+    def end(self, tag):
+        node, _ = self.open.pop()
+        if tag == 'title' and self.title == node:
+            self.title = None
+
+    def data(self, text):
+        node = self.node()
+        if self.title is not None:
+            self.nodes[self.title][3].append(text)
+        if not self.runs or self.runs[-1][0] != node:
+            self.runs.append((node, [], []))
+        _, pieces, chunks = self.runs[-1]
+        chunks.append(text)
+        if len(chunks) >= JOIN_CHUNKS:
+            pieces.append(''.join(chunks))
+            chunks.clear()
+
+    def groups(self):
+        """Group of every node; parents come before their children."""
+        groups = []
+        for parent, fixed, sec_type, title in self.nodes:
+            if fixed:
+                groups.append(fixed)
+            elif parent is not None and groups[parent] != 'other':
+                groups.append(groups[parent])
+            else:
+                groups.append((sec_type and section_group(sec_type))
+                              or (title and section_group(''.join(title))) or 'other')
+        return groups
+
+    def close(self):
+        """{group: text} of the groups with text (the runs of a group joined by newlines)."""
+        groups = self.groups()
+        texts = {}
+        for node, pieces, chunks in self.runs:
+            texts.setdefault(groups[node], []).append(''.join(pieces + chunks))
+        self.reset()
+        texts = {group: '\n'.join(parts).strip() for group, parts in texts.items()}
+        return {group: t for group, t in texts.items() if t}
+
+def dom_sections(body_nodes):
+    """BodySections of the outermost body elements of a DOM."""
+    sections = BodySections()
+
+    def walk(el):
+        for child in el:
+            if isinstance(child.tag, str):
+                sections.start(child.tag, child.attrib)
+                if child.text:
+                    sections.data(child.text)
+                walk(child)
+                sections.end(child.tag)
+            # comments and processing instructions: only their tail is text
+            if child.tail:
+                sections.data(child.tail)
+
+    for b in body_nodes:
+        if any(TARGET_TAGS.get(a.tag) == 'body' for a in b.iterancestors()):
+            continue  # walked with its outer body
+        if b.text:
+            sections.data(b.text)
+        walk(b)
+    return sections.close()
+
+def parse_xml_bytes_get_sections(xml_bytes):
+    """(abstract_text, body_text, {group: text}) with the DOM; (None, None, None) if it does not parse."""
+    try:
+        root = etree.fromstring(xml_bytes)
+    except Exception:
+        return None, None, None
+    abstract_text, body_text = abstract_body_of(root)
+    return abstract_text, body_text, dom_sections(root.xpath('//body | //Body | //BODY'))
+
+class SectionTarget(AbstractBodyTarget):
+    """AbstractBodyTarget that also feeds the elements inside a body to BodySections."""
+    def reset(self):
+        super().reset()
+        self.sections = BodySections()
+        self.in_body = 0
+
+    def start(self, tag, attrib):
+        if self.in_body:
+            self.sections.start(tag, attrib)
+        super().start(tag, attrib)
+        if TARGET_TAGS.get(tag) == 'body':
+            self.in_body += 1
+
+    def end(self, tag):
+        super().end(tag)
+        if TARGET_TAGS.get(tag) == 'body':
+            self.in_body -= 1
+        if self.in_body:
+            self.sections.end(tag)
+
+    def data(self, text):
+        super().data(text)
+        if self.in_body:
+            self.sections.data(text)
+
+    def close(self):
+        sections = self.sections.close()
+        return super().close() + (sections,)
+
+_SECTION_TARGET = SectionTarget()
+_SECTION_PARSER = etree.XMLParser(target=_SECTION_TARGET)
+
+def stream_xml_bytes_get_sections(xml_bytes):
+    """Same as parse_xml_bytes_get_sections, in one pass without a DOM."""
+    return stream_parse(xml_bytes, _SECTION_TARGET, _SECTION_PARSER, (None, None, None))
+
+def auto_xml_bytes_get_sections(xml_bytes):
+    if len(xml_bytes) >= STREAM_MIN_BYTES:
+        return stream_xml_bytes_get_sections(xml_bytes)
+    return parse_xml_bytes_get_sections(xml_bytes)
+
+SECTION_PARSERS = {'auto': auto_xml_bytes_get_sections,
+                   'stream': stream_xml_bytes_get_sections,
+                   'dom': parse_xml_bytes_get_sections}
+
+def member_pmcid(name):
+    # PMCID from filename (strip directories)
+    return os.path.splitext(os.path.basename(name))[0]
+
+def write_article(name, data, parse, f_pmcid_abs, f_extract_abs, f_pmcid_body, f_extract_body, more=(),
+                  section_files=()):
+    """
+    Parse one member and append its lines to the four files, and to every
+    4-file list of ``more``. With a SECTION_PARSERS ``parse``, the body line
+    is also split into ``section_files`` (one per SECTION_GROUPS), and into
+    the files after the first four of each list of ``more``.
+    """
+    pmcid = member_pmcid(name)
+    outputs = [(f_pmcid_abs, f_extract_abs, f_pmcid_body, f_extract_body) + tuple(section_files)] + list(more)
+
+    abstract, body, *sections = parse(data)
+    if abstract:
+        t = clean_text(abstract)
+        if t:
+            for f_pmcid_abs, f_extract_abs, *_ in outputs:
+                f_pmcid_abs.write(pmcid + "\n")
+                f_extract_abs.write(f"{pmcid} {t}\n")
+    if body:
+        t = clean_text(body)
+        if t:
+            for _, _, f_pmcid_body, f_extract_body, *f_sections in outputs:
+                f_pmcid_body.write(pmcid + "\n")
+                f_extract_body.write(f"{pmcid} {t}\n")
+                for group, f in zip(SECTION_GROUPS, f_sections):
+                    # a line for every body line, so the group files stay aligned with it
+                    section = clean_text(sections[0].get(group))
+                    f.write(f"{pmcid} {section}\n" if section else pmcid + "\n")
+
+def output_paths(outdir, field_name, year_str, sections=False):
+    """
+    The four output files of one (field, year), in the order pmcid/pmcxtract
+    abstract, pmcid/pmcxtract body; with ``sections``, followed by the body
+    file of every SECTION_GROUPS.
+    """
+    outdir = Path(outdir) / field_name
+    paths = [outdir / f"pmcid_list_{field_name}_{year_str}_abstract.txt",
+             outdir / f"pmcxtract_list_{field_name}_{year_str}_abstract.txt",
+             outdir / f"pmcid_list_{field_name}_{year_str}_body.txt",
+             outdir / f"pmcxtract_list_{field_name}_{year_str}_body.txt"]
+    if sections:
+        paths += [outdir / f"pmcxtract_list_{field_name}_{year_str}_body_{group}.txt" for group in SECTION_GROUPS]
+    return paths
+
+# ---------- checkpoints ----------
+# A tar job appends to the output files of its (field, year), so a worker that
+# died half-way used to leave part of the tar in them, and the rerun appended
+# it again from the first member. {tar}.ckpt records, every CHECKPOINT_MEMBERS
+# members, how far the job got (members read, offset of the next member
+# header) and the size of each output file at that point, next to its size
+# before the job started. A rerun truncates the outputs back to the last
+# checkpoint and continues with the next member: an uncompressed tar is read
+# from that offset, a compressed one skips the members already read.
+CHECKPOINT_MEMBERS = 1000
+
+def size_mtime(path):
+    st = Path(path).stat()
+    return f"{st.st_size} {st.st_mtime_ns}"
+
+def tar_stamp(tar_path):
+    return f"# {size_mtime(tar_path)}"
+
+def truncate_to(path, size):
+    # never extend: a file shorter than its checkpoint is restarted instead
+    if path.exists() and path.stat().st_size > size:
+        os.truncate(path, size)
+
+class Checkpoint:
+    """
+    {tar}.ckpt of one tar job: a stamp line of the tar, then "members<TAB>next
+    offset", then "size before the job<TAB>size at the checkpoint<TAB>path"
+    per output file.
+    """
+    def __init__(self, tar_path, outputs, path=None):
+        self.path = Path(path or str(tar_path) + ".ckpt")
+        self.stamp = tar_stamp(tar_path)
+        self.outputs = [Path(p) for p in outputs]
+        self.start = None
+
+    def _sizes(self):
+        return [p.stat().st_size if p.exists() else 0 for p in self.outputs]
+
+    def _read(self):
+        with open(self.path, encoding='utf-8') as f:
+            stamp = f.readline().rstrip('\n')
+            members, next_offset = (int(v) for v in f.readline().split('\t'))
+            sizes = {}
+            for line in f:
+                start, size, path = line.rstrip('\n').split('\t', 2)
+                sizes[path] = (int(start), int(size))
+        return stamp, members, next_offset, sizes
+
+    def _write(self, members, next_offset):
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.stamp + "\n")
+            f.write(f"{members}\t{next_offset}\n")
+            for path, start, size in zip(self.outputs, self.start, self._sizes()):
+                f.write(f"{start}\t{size}\t{path}\n")
+        os.replace(tmp_path, self.path)
+
+    def resume(self, restart=False):
+        """
+        Truncate the outputs back to the last checkpoint, or to their sizes
+        before the job if ``restart`` (or if the tar, the output files or their
+        sizes do not match it), and checkpoint that point.
+
+        Returns:
+            tuple: (members already read, offset of the next member header); (0, 0) from the start.
+        """
+        members, next_offset = 0, 0
+        start = self._sizes()
+        if self.path.exists():
+            stamp, saved_members, saved_offset, sizes = self._read()
+            start = [sizes.get(str(p), (size, size))[0] for p, size in zip(self.outputs, start)]
+            if (not restart and stamp == self.stamp and set(sizes) == {str(p) for p in self.outputs}
+                    and all(p.exists() and p.stat().st_size >= sizes[str(p)][1] for p in self.outputs)):
+                members, next_offset = saved_members, saved_offset
+                for p in self.outputs:
+                    truncate_to(p, sizes[str(p)][1])
+            else:
+                for path, (start_size, _) in sizes.items():
+                    truncate_to(Path(path), start_size)
+        self.start = start
+        self._write(members, next_offset)
+        return members, next_offset
+
+    def commit(self, files, members, next_offset):
+        """Checkpoint after ``members`` members; ``files`` are the open outputs, flushed first."""
+        for f in files:
+            f.flush()
+        self._write(members, next_offset)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+@contextmanager
+def open_tar_at(tar_path, members, next_offset):
+    """
+    Yield (tarfile, members to skip) to continue after the first ``members``
+    members: an uncompressed tar is opened at the member header at
+    ``next_offset``, a compressed one from the start.
+    """
+    if members and Path(tar_path).suffix == '.tar':
+        with open(tar_path, 'rb') as raw:
+            raw.seek(next_offset)
+            with tarfile.open(fileobj=raw, mode='r:') as tf:
+                yield tf, 0
+    else:
+        with tarfile.open(tar_path, 'r:*') as tf:
+            yield tf, members
+
 # ---------- core: process single tar ----------# ---------- core: process single tar ----------
-def process_tar(tar_path, field_name, year_str, outdir):
+def process_tar(tar_path, field_name, year_str, outdir, parser='auto', categories=None, routes=None,
+                sections=False):
     tar_path = Path(tar_path)
+    parse = (SECTION_PARSERS if sections else PARSERS)[parser]
+    # --labels: also write the outputs of these category tars (see fanout_jobs)
+    categories = categories or {}
+    routes = routes or {}
+    category_outputs = {field: output_paths(outdir, field, year_str, sections) for field in categories}
+    # --sections: the body file of every section group
+    section_paths = output_paths(outdir, field_name, year_str, sections)[4:]
     
     # 'outdir'를 {field_name} 하위 폴더로 재정의합니다.
     outdir = Path(outdir) / field_name 
@@ -78,14 +523,35 @@ def process_tar(tar_path, field_name, year_str, outdir):
     # create processing file (simple semaphore)
     processing_flag.write_text("processing")
 
+    outputs = [base, base2, base3, base4] + section_paths + [p for paths in category_outputs.values() for p in paths]
+    ckpt = Checkpoint(tar_path, outputs)
+    members, next_offset = ckpt.resume()
+    if members:
+        print(f"[RESUME] {tar_path} after {members:,} members")
+
     try:
-        with tarfile.open(tar_path, 'r:*') as tf, \
+        with open_tar_at(tar_path, members, next_offset) as (tf, skip), \
              open(base, 'a', encoding='utf-8') as f_pmcid_abs, \
              open(base2, 'a', encoding='utf-8') as f_extract_abs, \
              open(base3, 'a', encoding='utf-8') as f_pmcid_body, \
-             open(base4, 'a', encoding='utf-8') as f_extract_body:
+             open(base4, 'a', encoding='utf-8') as f_extract_body, \
+             ExitStack() as stack:
+            more = {}
+            for field, paths in category_outputs.items():
+                paths[0].parent.mkdir(parents=True, exist_ok=True)
+                more[field] = [stack.enter_context(open(p, 'a', encoding='utf-8')) for p in paths]
+            section_files = [stack.enter_context(open(p, 'a', encoding='utf-8')) for p in section_paths]
+            files = ([f_pmcid_abs, f_extract_abs, f_pmcid_body, f_extract_body] + section_files
+                     + [f for fs in more.values() for f in fs])
 
             for member in tf:
+                if skip:
+                    skip -= 1
+                    continue
+                # everything before this member is written
+                if members and members % CHECKPOINT_MEMBERS == 0:
+                    ckpt.commit(files, members, member.offset)
+                members += 1
                 if not member.isfile():
                     continue
                 # skip non-xml names
@@ -102,24 +568,17 @@ def process_tar(tar_path, field_name, year_str, outdir):
                     print(f"[WARN] failed read {member.name}: {e}")
                     continue
 
-                # PMCID from filename (strip directories)
-                pmcid = os.path.splitext(os.path.basename(member.name))[0]
-
-                abstract, body = parse_xml_bytes_get_abstract_body(data)
-                if abstract:
-                    t = clean_text(abstract)
-                    if t:
-                        f_pmcid_abs.write(pmcid + "\n")
-                        f_extract_abs.write(f"{pmcid} {t}\n")
-                if body:
-                    t = clean_text(body)
-                    if t:
-                        f_pmcid_body.write(pmcid + "\n")
-                        f_extract_body.write(f"{pmcid} {t}\n")
+                write_article(member.name, data, parse,
+                              f_pmcid_abs, f_extract_abs, f_pmcid_body, f_extract_body,
+                              [more[field] for field in routes.get(member_pmcid(member.name).upper(), ())],
+                              section_files)
 
         # finished
+        for category_tar in categories.values():
+            Path(category_tar + ".done").write_text("done")
         done_flag.write_text("done")
-        print(f"[DONE] {tar_path}")
+        ckpt.clear()
+        print(f"[DONE] {tar_path}" + (f" (+ {', '.join(categories)})" if categories else ""))
     except Exception as e:
         print(f"[ERROR] {tar_path}: {e}")
         raise
@@ -127,6 +586,335 @@ def process_tar(tar_path, field_name, year_str, outdir):
         if processing_flag.exists():
             processing_flag.unlink(missing_ok=True)
 
+# ---------- intra-archive parallelism ----------
+# The all-articles/{year}.tar buckets are many times larger than the category
+# ones, so one worker used to grind on them long after the others finished.
+# An uncompressed tar can be read at any member: tar_member_index lists the
+# data offset and size of every XML member (cached in {tar}.idx). The members
+# are cut into contiguous ranges of about --split-mb MB; each range is parsed
+# by its own job into a shard of the four output files. When every shard of a
+# tar is done, merge_shards appends them in range order to the output files,
+# so the result is identical to process_tar reading the tar sequentially.
+# Shards left by a crashed run are resumed only if they were cut the same way:
+# {shard_dir}/manifest records the tar stamp, the ranges and the options that
+# shape the shard files (--sections, --labels categories and routes), and
+# prepare_shards removes the shards when any of them differs.
+SHARD_DIR = ".shards"
+SHARD_MANIFEST = "manifest"
+
+def tar_index_path(tar_path):
+    return Path(str(tar_path) + ".idx")
+
+def tar_member_index(tar_path):
+    """
+    [(data offset, size, name)] of the XML members of an uncompressed tar, in
+    archive order, with the member filter of process_tar. Returns None if the
+    tar cannot be read by offset (compressed, or sparse members).
+    """
+    tar_path = Path(tar_path)
+    if tar_path.suffix != '.tar':
+        return None
+    stamp = tar_stamp(tar_path)
+    idx_path = tar_index_path(tar_path)
+    if idx_path.exists():
+        with open(idx_path, encoding='utf-8') as f:
+            if f.readline().rstrip('\n') == stamp:
+                entries = []
+                for line in f:
+                    offset, size, name = line.rstrip('\n').split('\t', 2)
+                    entries.append((int(offset), int(size), name))
+                return entries
+    entries = []
+    with tarfile.open(tar_path, 'r:') as tf:
+        for member in tf:
+            if not member.isfile() or not member.name.lower().endswith('.xml'):
+                continue
+            if member.issparse():
+                return None
+            entries.append((member.offset_data, member.size, member.name))
+    tmp_path = idx_path.with_name(idx_path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(stamp + "\n")
+        for offset, size, name in entries:
+            f.write(f"{offset}\t{size}\t{name}\n")
+    os.replace(tmp_path, idx_path)
+    return entries
+
+def split_ranges(entries, range_bytes):
+    """Contiguous [start, stop) member ranges of about range_bytes each."""
+    ranges = []
+    start = 0
+    total = 0
+    for i, (_, size, _) in enumerate(entries):
+        total += size
+        if total >= range_bytes:
+            ranges.append((start, i + 1))
+            start = i + 1
+            total = 0
+    if start < len(entries) or not ranges:
+        ranges.append((start, len(entries)))
+    return ranges
+
+def shard_dir(outdir, field_name, year_str):
+    return Path(outdir) / field_name / SHARD_DIR / year_str
+
+def shard_prefix(shard, category=None):
+    """Shard file prefix: {shard:05d} for the tar's own outputs, {shard:05d}.{category} for --labels categories."""
+    return f"{shard:05d}" if category is None else f"{shard:05d}.{category}"
+
+def shard_manifest(tar_path, ranges, categories=None, routes=None, sections=False):
+    """Text of the shard manifest of a split tar: tar stamp, options, then one member range per line."""
+    h = hashlib.blake2b(digest_size=16)
+    for pmcid in sorted(routes or {}):
+        h.update(f"{pmcid}\t{','.join(routes[pmcid])}\n".encode('utf-8'))
+    lines = [tar_stamp(tar_path), f"sections\t{int(bool(sections))}",
+             f"categories\t{','.join(sorted(categories or {}))}", f"routes\t{h.hexdigest()}"]
+    lines += [f"{entries[0][0]}\t{entries[-1][0]}\t{len(entries)}" for entries in ranges]
+    return '\n'.join(lines) + '\n'
+
+def prepare_shards(tar_path, field_name, year_str, outdir, ranges, categories=None, routes=None, sections=False):
+    """
+    Make the shard folder of a split tar ready for its range jobs: shards of
+    an earlier run are kept only if its manifest matches this one.
+    """
+    reset_shard_dir(shard_dir(outdir, field_name, year_str),
+                    shard_manifest(tar_path, ranges, categories, routes, sections), tar_path)
+
+def reset_shard_dir(sdir, manifest, tar_path):
+    """Remove the shards in ``sdir`` unless they were written under ``manifest``, then record it."""
+    sdir = Path(sdir)
+    manifest_path = sdir / SHARD_MANIFEST
+    if sdir.exists():
+        if manifest_path.exists() and manifest_path.read_text(encoding='utf-8') == manifest:
+            return
+        print(f"[RESET] shards of {tar_path}: split or options changed since they were written")
+        shutil.rmtree(sdir)
+    sdir.mkdir(parents=True)
+    tmp_path = manifest_path.with_name(SHARD_MANIFEST + ".tmp")
+    tmp_path.write_text(manifest, encoding='utf-8')
+    os.replace(tmp_path, manifest_path)
+
+def process_tar_range(tar_path, field_name, year_str, outdir, shard, entries, parser='auto',
+                      categories=None, routes=None, sections=False):
+    """Parse one member range of an uncompressed tar into shard ``shard`` (skipped if already done)."""
+    parse = (SECTION_PARSERS if sections else PARSERS)[parser]
+    n_files = 4 + len(SECTION_GROUPS) * sections
+    routes = routes or {}
+    sdir = shard_dir(outdir, field_name, year_str)
+    sdir.mkdir(parents=True, exist_ok=True)
+    done_flag = sdir / f"{shard:05d}.done"
+    if done_flag.exists():
+        return
+    paths = [sdir / f"{shard:05d}.{k}" for k in range(4)]
+    with open(tar_path, 'rb') as raw, \
+         open(paths[0], 'w', encoding='utf-8') as f_pmcid_abs, \
+         open(paths[1], 'w', encoding='utf-8') as f_extract_abs, \
+         open(paths[2], 'w', encoding='utf-8') as f_pmcid_body, \
+         open(paths[3], 'w', encoding='utf-8') as f_extract_body, \
+         ExitStack() as stack:
+        section_files = [stack.enter_context(open(sdir / f"{shard:05d}.{k}", 'w', encoding='utf-8'))
+                         for k in range(4, n_files)]
+        more = {field: [stack.enter_context(open(sdir / f"{shard_prefix(shard, field)}.{k}", 'w',
+                                                 encoding='utf-8')) for k in range(n_files)]
+                for field in categories or ()}
+        for offset, size, name in entries:
+            raw.seek(offset)
+            data = raw.read(size)
+            write_article(name, data, parse, f_pmcid_abs, f_extract_abs, f_pmcid_body, f_extract_body,
+                          [more[field] for field in routes.get(member_pmcid(name).upper(), ())], section_files)
+    done_flag.write_text("done")
+
+def merge_shards(tar_path, field_name, year_str, outdir, n_shards, categories=None, sections=False):
+    """Append the shards of a split tar to its output files in range order, then mark the tar done."""
+    tar_path = Path(tar_path)
+    categories = categories or {}
+    sdir = shard_dir(outdir, field_name, year_str)
+    # a merge that died half-way is redone from the sizes before it
+    ckpt = Checkpoint(tar_path, [p for category in [None] + list(categories)
+                                 for p in output_paths(outdir, category or field_name, year_str, sections)])
+    ckpt.resume(restart=True)
+    for category in [None] + list(categories):
+        outputs = output_paths(outdir, category or field_name, year_str, sections)
+        outputs[0].parent.mkdir(parents=True, exist_ok=True)
+        for k, out_path in enumerate(outputs):
+            with open(out_path, 'ab') as out:
+                for shard in range(n_shards):
+                    with open(sdir / f"{shard_prefix(shard, category)}.{k}", 'rb') as f:
+                        shutil.copyfileobj(f, out)
+    for category_tar in categories.values():
+        Path(category_tar + ".done").write_text("done")
+    tar_path.with_suffix(tar_path.suffix + ".done").write_text("done")
+    ckpt.clear()
+    shutil.rmtree(sdir)
+    try:
+        sdir.parent.rmdir()  # only once no other year has shards left
+    except OSError:
+        pass
+
+# ---------- parse once, emit to every category (--labels) ----------
+# bucketize_pmcs.py copies each article into all-articles/{year}.tar and into
+# {category}/{year}.tar for every flag set in the labels CSV, so the
+# per-category run parses most articles two or three times. With --labels only
+# the all-articles tars are parsed: each article is appended to the
+# all-articles outputs and to the outputs of every category the CSV flags it
+# with, for the year of the CSV. A category tar holds the members of the
+# all-articles tar of its year that carry its flag, in the same order, so the
+# category outputs are the same bytes as parsing the category tar itself.
+# This needs the CSV bucketize_pmcs.py was run with.
+SUPERSET = "all-articles"
+# The labels CSV is parsed by bucketize_pmcs.load_labels only: the script is
+# imported from next to this one (Bucketize_pmcs.sh and ShellCommand.sh run
+# both from one folder) or from the Step 3-5 folder of the repository. It is
+# imported when --labels is given, so the workers do not load pandas.
+BUCKETIZE_DIR = Path(__file__).resolve().parent.parent / "Step3_5_Bucketize_pmcs_by_year_and_category"
+
+def import_bucketize():
+    """The bucketize_pmcs module."""
+    if str(BUCKETIZE_DIR) not in sys.path:
+        sys.path.append(str(BUCKETIZE_DIR))
+    import bucketize_pmcs
+    return bucketize_pmcs
+
+def load_label_routes(csv_path):
+    """
+    Category routes of the labelled articles, read by bucketize_pmcs.load_labels
+    (the last row of a PMCID wins).
+
+    Returns:
+        tuple: ({year_str: {PMCID: (category, ...)}} of the articles with a
+        category flag besides all-articles, number of those without the
+        all_article flag, which are missing from the all-articles tars).
+    """
+    bucketize = import_bucketize()
+    labels, _ = bucketize.load_labels(csv_path)
+    routes = {}
+    shared = {}  # one tuple per flag combination
+    missing = 0
+    for pmc_id, year, buckets in labels:
+        categories = tuple(bucket for bucket in buckets if bucket != SUPERSET)
+        if not categories:
+            continue
+        if SUPERSET not in buckets:
+            missing += 1
+        routes.setdefault(bucketize.bucket_year_str(year), {})[pmc_id] = shared.setdefault(categories, categories)
+    return routes, missing
+
+def fanout_jobs(jobs, csv_path):
+    """
+    Route the category tars of every year through its all-articles tar.
+
+    Returns:
+        tuple: (jobs left to run, {all-articles tar: ({category: category tar},
+        {PMCID: (category, ...)})}). A category tar is only routed if it is not
+        done yet, has no {tar}.ckpt of a standalone run to resume, and the
+        all-articles tar of its year is not done either; otherwise it stays a
+        job of its own.
+    """
+    routes, missing = load_label_routes(csv_path)
+    if missing:
+        print(f"[WARN] {missing:,} labelled articles have a category flag but no all_article flag; "
+              f"they are not in the all-articles tars")
+    superset = {year: tar_path for tar_path, field, year in jobs
+                if field == SUPERSET and not Path(tar_path + ".done").exists()}
+    fanout = {tar_path: ({}, {}) for tar_path in superset.values()}
+    left = []
+    for tar_path, field, year in jobs:
+        # a {tar}.ckpt holds the start sizes of its outputs, which only its own job can resume from
+        if (field != SUPERSET and year in superset and not Path(tar_path + ".done").exists()
+                and not Path(tar_path + ".ckpt").exists()):
+            fanout[superset[year]][0][field] = tar_path
+        else:
+            left.append((tar_path, field, year))
+    for year, tar_path in superset.items():
+        categories, year_routes = fanout[tar_path]
+        for pmc_id, fields in routes.get(year, {}).items():
+            fields = tuple(field for field in fields if field in categories)
+            if fields:
+                year_routes[pmc_id] = fields
+    return left, fanout
+
+# ---------- block-compressed output (--compress) ----------
+# Step 4 reads the pmcxtract files again and again. With --compress every
+# finished one is stored as {file}.zst or {file}.gz, in blocks of about
+# COMPRESS_BLOCK bytes of text cut after a newline. Each block is an
+# independent zstd frame or gzip member, and {file}.zst.bidx lists the
+# offset, sizes and article count of every block (format in
+# Step0_modules/modules/block_text.py), so Step 4 can decompress the blocks in
+# parallel and seek to any of them. Blocks are appended: if a rerun writes the
+# text file again, its lines are added after the blocks already there. The
+# text file is removed once its blocks are indexed.
+COMPRESS_BLOCK = 4 << 20
+COMPRESS_SUFFIX = {'zstd': '.zst', 'gzip': '.gz'}
+
+def compress_block(codec, data):
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+def count_articles(data):
+    # lines that step4_sources.iter_articles yields (text mode, stripped, non-empty)
+    text = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    return sum(1 for line in text.split('\n') if line.strip())
+
+def compress_text(path, codec, block_size=COMPRESS_BLOCK):
+    """Append the lines of text file ``path`` as blocks to its compressed file, then remove it."""
+    path = Path(path)
+    data_path = Path(str(path) + COMPRESS_SUFFIX[codec])
+    idx_path = Path(str(data_path) + ".bidx")
+    source = size_mtime(path)
+    blocks = []
+    if idx_path.exists():
+        with open(idx_path, encoding='utf-8') as f:
+            header = f.readline().split()
+            blocks = [tuple(int(v) for v in line.split('\t')) for line in f if line.strip()]
+        if ' '.join(header[4:6]) == source:
+            path.unlink()  # already appended; removing the text file was interrupted
+            return
+    end = sum(size for _, size, _, _ in blocks)
+    with open(data_path, 'r+b' if data_path.exists() else 'wb') as out, open(path, 'rb') as f:
+        out.truncate(end)  # drop the blocks of an append that was not indexed
+        out.seek(end)
+        pending = []
+        n_bytes = 0
+        for line in f:
+            pending.append(line)
+            n_bytes += len(line)
+            if n_bytes >= block_size:
+                data = b''.join(pending)
+                block = compress_block(codec, data)
+                out.write(block)
+                blocks.append((end, len(block), len(data), count_articles(data)))
+                end += len(block)
+                pending = []
+                n_bytes = 0
+        if pending:
+            data = b''.join(pending)
+            block = compress_block(codec, data)
+            out.write(block)
+            blocks.append((end, len(block), len(data), count_articles(data)))
+    tmp_path = idx_path.with_name(idx_path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(f"# {codec} {size_mtime(data_path)} {source}\n")
+        for block in blocks:
+            f.write('\t'.join(str(v) for v in block) + "\n")
+    os.replace(tmp_path, idx_path)
+    path.unlink()
+    return data_path
+
+def compress_outputs(paths, codec, workers):
+    """Compress the existing pmcxtract files among ``paths`` in parallel."""
+    paths = [p for p in paths if Path(p).name.startswith("pmcxtract_list_") and Path(p).exists()]
+    with ProcessPoolExecutor(max_workers=workers) as exe:
+        futures = {exe.submit(compress_text, p, codec): p for p in paths}
+        for fut in as_completed(futures):
+            try:
+                data_path = fut.result()
+            except Exception as e:
+                print(f"[JOB ERROR] compress {futures[fut]}: {e}")
+                continue
+            if data_path is not None:
+                print(f"[COMPRESSED] {data_path}")
+
 # ---------- driver: traverse folders & run ----------
 def find_jobs(root_dir):
     jobs = []
@@ -143,18 +931,57 @@ def find_jobs(root_dir):
     return jobs
 
 def main(args):
+    if args.compress == 'zstd' and not HAS_ZSTD:
+        raise SystemExit("❌ --compress zstd needs the zstandard package (pip install zstandard), or use gzip")
     jobs = find_jobs(args.input_root)
+    all_jobs = list(jobs)
     print(f"Found {len(jobs)} jobs")
     if args.dry_run:
         for j in jobs[:10]:
             print("DRY:", j)
         return
 
+    fanout = {}
+    if args.labels:
+        jobs, fanout = fanout_jobs(jobs, args.labels)
+        n_routed = sum(len(categories) for categories, _ in fanout.values())
+        print(f"{n_routed} category tars routed through {len(fanout)} all-articles tars, {len(jobs)} jobs")
+
+    # tars bigger than --split-mb are split into member ranges
+    range_bytes = args.split_mb * 1000000
+    split = {}
+    for tar_path, field, year in jobs:
+        tar = Path(tar_path)
+        if not range_bytes or tar.with_suffix(tar.suffix + ".done").exists() or tar.stat().st_size <= range_bytes:
+            continue
+        entries = tar_member_index(tar_path)
+        if entries is not None:
+            split[tar_path] = (field, year, [entries[a:b] for a, b in split_ranges(entries, range_bytes)])
+
+    def shard_routes(routes, entries):
+        # only the routes of the shard's members are sent to its worker
+        pmcids = (member_pmcid(name).upper() for _, _, name in entries)
+        return {pmcid: routes[pmcid] for pmcid in pmcids if pmcid in routes}
+
     # adjust workers as needed
     with ProcessPoolExecutor(max_workers=args.workers) as exe:
         futures = {}
+        remaining = {}
         for tar_path, field, year in jobs:
-            fut = exe.submit(process_tar, tar_path, field, year, args.output_dir)
+            categories, routes = fanout.get(tar_path, (None, None))
+            if tar_path in split:
+                _, _, ranges = split[tar_path]
+                prepare_shards(tar_path, field, year, args.output_dir, ranges, categories, routes, args.sections)
+                Path(tar_path + ".processing").write_text("processing")
+                remaining[tar_path] = len(ranges)
+                for shard, entries in enumerate(ranges):
+                    fut = exe.submit(process_tar_range, tar_path, field, year, args.output_dir, shard,
+                                     entries, args.parser, categories, routes and shard_routes(routes, entries),
+                                     args.sections)
+                    futures[fut] = tar_path
+                continue
+            fut = exe.submit(process_tar, tar_path, field, year, args.output_dir, args.parser, categories, routes,
+                             args.sections)
             futures[fut] = tar_path
         for fut in as_completed(futures):
             tarpath = futures[fut]
@@ -162,6 +989,25 @@ def main(args):
                 fut.result()
             except Exception as e:
                 print(f"[JOB ERROR] {tarpath}: {e}")
+                remaining.pop(tarpath, None)  # keep its shards, a rerun resumes them
+                continue
+            if tarpath in remaining:
+                remaining[tarpath] -= 1
+                if remaining[tarpath] == 0:
+                    field, year, ranges = split[tarpath]
+                    try:
+                        merge_shards(tarpath, field, year, args.output_dir, len(ranges),
+                                     fanout.get(tarpath, ({},))[0], args.sections)
+                    except Exception as e:
+                        print(f"[JOB ERROR] {tarpath} (merge): {e}")
+                        continue
+                    Path(tarpath + ".processing").unlink(missing_ok=True)
+                    print(f"[DONE] {tarpath} ({len(ranges)} shards)")
+
+    if args.compress:
+        finished = [p for tar_path, field, year in all_jobs if Path(tar_path + ".done").exists()
+                    for p in output_paths(args.output_dir, field, year, args.sections)]
+        compress_outputs(finished, args.compress, args.workers)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Process PMC tar -> produce pmcid/pmcxtract lists")
@@ -169,5 +1015,19 @@ if __name__ == '__main__':
     parser.add_argument("output_dir", help="output directory")
     parser.add_argument("--workers", type=int, default=2, help="max parallel tar files")
     parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--split-mb", type=int, default=512,
+                        help="split uncompressed tars bigger than this into member ranges of this size "
+                             "parsed in parallel (0: one job per tar)")
+    parser.add_argument("--parser", choices=list(PARSERS), default="auto",
+                        help="'dom': lxml tree + XPath, 'stream': one-pass parser target without a tree, "
+                             "'auto' (default): stream members of 4 MB or more")
+    parser.add_argument("--compress", choices=list(COMPRESS_SUFFIX), default=None,
+                        help="store finished pmcxtract files block-compressed ({file}.zst/.gz + .bidx block index)")
+    parser.add_argument("--sections", action="store_true",
+                        help="also split the body text into section groups (intro, methods, results, discussion, "
+                             "conclusions, tables, figures, other), one pmcxtract file each")
+    parser.add_argument("--labels", default=None,
+                        help="labels CSV of bucketize_pmcs.py: parse only the all-articles tars and also write "
+                             "the outputs of each category flagged in the CSV")
     args = parser.parse_args()
     main(args)
@@ -2,8 +2,9 @@
 import sys, os
 
 # --- 모듈 임포트 ---
-# (참고: text_to_pval_and_oper 외에는 이 스크립트에서 실제로 사용되지 않음)
-from modules.text_to_pval_and_oper import text_to_pval_and_oper
+# (참고: PValueCube 외에는 이 스크립트에서 실제로 사용되지 않음)
+from modules.pval_cube import PValueCube
+from modules.fig2_bins import table_lines
 # from modules.get_all_pmcids import get_all_pmcids
 # from modules.get_all_pmids import get_all_pmids
 # from modules.get_all_pmids import get_count_pmids
@@ -26,86 +27,30 @@ start_year=2015
 end_year=2025   
 proportions = [] # (이 스크립트에서는 사용되지 않지만 유지)
 
-# Loop through each year
+# P values are read from the cube written by Step4_text_analysis/build_pval_cube.py
+CUBE_DIR = "/Volumes/ssd4TB/20251080/pval_cube"
+SOURCE = 'pubmed_abs'
 fields=[
         'rct','ct','meta','review','cuj','all'
         ]
 
 
+cube = PValueCube(CUBE_DIR)
 
 for field in fields: 
-    abs_bin_stats = defaultdict(lambda: {'total': 0, '>': 0, '=': 0, '<': 0, 'other':0})
-        
-    # 각 빈(bin)에 대한 통계를 저장할 딕셔너리
-
     bin_width = 0.001
-    num_bins = 51
-    max_val = bin_width * (num_bins-1) # 0.05
-    total_article_abs=0
-    total_pval_abs=0
-    for year in range(start_year, end_year+1,1):
-        abs_results = []
-        # print(f"Processing year: {year}...")
-        
-        filename2 = f"pmxtract_list_{field}_{year}.txt"
-        
-        data_dir = f"/Volumes/ssd4TB/pubmed/xtract/{field}" 
-
-        filepath2 = os.path.join(data_dir, filename2) 
-        
-        # 대신, 파일에서 직접 아티클을 순회하며 처리
-        article_count = 0
-        try:
-            with open(filepath2, 'r', encoding='utf-8') as f2:
-                for abs_text in f2: # 파일을 순회하며 한 줄씩 읽습니다.
-                    abs_text = abs_text.strip()
-                    if not abs_text:
-                        continue
-        
-                    article_count += 1
-                    pval_and_oper_list = text_to_pval_and_oper(abs_text)
-                    if pval_and_oper_list:
-                        abs_results.extend(pval_and_oper_list) 
-        except FileNotFoundError as e:
-            print(f"File not found, skipping field year {field} {year}: {e}")
-            continue
-        total_article_abs+=article_count
-        total_pval_abs+=len(abs_results)
-        
-    # --- 수동 비닝(Binning) 및 통계 계산 ---
-        
+    num_bins = 51 # 50 bins up to 0.05 plus the >0.05 overflow bin
+    # Sum over the years; missing years have no articles
+    year_range = range(start_year, end_year+1,1)
+    for year in cube.missing_years(SOURCE, field, year_range):
+        print(f"File not found, skipping field year {field} {year}: no {SOURCE} partition in {CUBE_DIR}")
+    total_article_abs = cube.n_articles(SOURCE, field, year_range)
     
-        for p, oper in abs_results:     
-            # --- 연산자 정규화 ---
-            if oper == '<' or oper == '≤' or oper == 'less than' or oper == 'of <':
-                oper = '<'
-            elif oper == '>' or oper == '≥':
-                oper = '>'
-            elif oper == '=' or oper == 'of':
-                oper = '='
-            else:
-                oper = 'other' 
-            # --- 정규화 끝 ---
-    
-            bin_key = f"{year}"
-            # --- 정규화 끝 ---
-            if 0 <= p <= max_val:
-                bin_index = math.ceil(p / bin_width)
-                if bin_index == 0:
-                    # p value = 0 can occur in plain texts, or due to limit of p value detection algorithm, etc
-                    bin_index = 1
-                elif bin_index >= (num_bins-1):
-                    bin_index = num_bins - 1
-            elif p > max_val:
-                bin_index= num_bins
-            bin_key = f"{(bin_index * bin_width):.3f}"
-            abs_bin_stats[bin_key]['total'] += 1
-            abs_bin_stats[bin_key][oper] += 1
+    # --- 비닝(Binning) 및 통계 계산: re-aggregated from the fine bins of the cube ---
+    # p = 0 goes to the first bin, p > 0.05 to the overflow bin
+    abs_bin_stats = cube.fig2_table(SOURCE, field, year_range, bin_width, num_bins)
+    total_pval_abs = int(abs_bin_stats.sum())
 
-    print(f"{field} absBandwidth\t<\t=\t>\tother\ttotal")
-    sorted_keys = sorted(abs_bin_stats.keys())
-    
-    for bin_key in sorted_keys:
-        stats = abs_bin_stats[bin_key]
-        print(f"{bin_key}\t{stats['<']}\t{stats['=']}\t{stats['>']}\t{stats['other']}\t{stats['total']}")
+    for line in table_lines(field, abs_bin_stats, bin_width):
+        print(line)
     print(f"total article {total_article_abs} total pvalue {total_pval_abs}")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Figure 1, 2 and 3 tables of one or more sources in a single pass.
+
+Every text file is read and extracted once (see modules/step4_figures.py)
+instead of once per Figure script. The tables are written next to each other
+in --out, one file per script, with the same content the script prints:
+
+    Figure1PMCbody.txt  Fig2_pmc_body_to_pval.txt  Figure3PMCbody.txt
+
+    python3 aggregate_figures.py --out tables --sources pmc_body --workers 8
+
+With --sample-fraction and/or --sample-size, only a random sample of the
+articles of every (field, year) is read and extracted (see
+modules/step4_preview.py). The tables then hold proportions and shares with
+95% confidence intervals, and go to {script}.preview.txt:
+
+    python3 aggregate_figures.py --out tables --sample-fraction 0.01 --sample-size 200 --seed 0
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.step4_figures import FigureAggregator, aggregate_file
+from modules.step4_preview import fig1_preview_lines, fig2_preview_lines, preview_file
+from modules.step4_sources import SOURCES, source_path, text_exists
+
+# Figure scripts whose output each table replaces
+FIGURE_SCRIPTS = {
+    'pubmed_abs': ('Figure1pubmedAbs', 'Fig2_pubmed_abs_to_pval', 'Figure3pubmedAbs'),
+    'pmc_abs': ('Figure1pmcAbs', 'Fig2_pmc_abs_to_pval', 'Figure3pmcAbs'),
+    'pmc_body': ('Figure1PMCbody', 'Fig2_pmc_body_to_pval', 'Figure3PMCbody'),
+}
+
+def write_lines(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + '\n')
+
+def _file_seed(seed, source, field, year):
+    """Seed of one file's sample, so that a preview is reproducible with --seed."""
+    if seed is None:
+        return None
+    return [seed, list(SOURCES).index(source), SOURCES[source]['fields'].index(field), year]
+
+def preview(args, roots):
+    aggregators = {source: FigureAggregator(source) for source in args.sources}
+    previews = {source: {} for source in args.sources}
+    with ProcessPoolExecutor(max_workers=args.workers) as exe:
+        futures = {}
+        for source, agg in aggregators.items():
+            for field, year in agg.jobs():
+                path = source_path(source, field, year, roots[source])
+                if year in agg.fig2_years and not text_exists(path):
+                    # as the Figure 2 scripts did; the year counts as empty
+                    print(f"File not found, skipping field year {field} {year}: {path}")
+                fut = exe.submit(preview_file, path, args.sample_fraction, args.sample_size,
+                                 _file_seed(args.seed, source, field, year), args.engine,
+                                 year in agg.fig2_years)
+                futures[fut] = (source, field, year)
+        for fut, (source, field, year) in futures.items():
+            previews[source][(field, year)] = fut.result()
+
+    for source, agg in aggregators.items():
+        fig1, fig2, fig3 = FIGURE_SCRIPTS[source]
+        fig1_lines = fig1_preview_lines(agg.fields, agg.years, previews[source])
+        fig2_lines = []
+        for field in agg.fields:
+            years = sorted(agg.fig2_years)
+            fig2_lines += fig2_preview_lines(field, [previews[source][(field, year)] for year in years],
+                                             seed=_file_seed(args.seed, source, field, 0))
+        write_lines(os.path.join(args.out, f"{fig1}.preview.txt"), fig1_lines)
+        write_lines(os.path.join(args.out, f"{fig2}.preview.txt"), fig2_lines)
+        write_lines(os.path.join(args.out, f"{fig3}.preview.txt"), fig1_lines)
+        n_sample = sum(p.n_sample for p in previews[source].values())
+        n_articles = sum(p.n_articles for p in previews[source].values())
+        print(f"[DONE] {source} preview: {n_sample} of {n_articles} articles")
+
+def main(args):
+    os.makedirs(args.out, exist_ok=True)
+    roots = {'pubmed_abs': args.pubmed_root, 'pmc_abs': args.pmc_root, 'pmc_body': args.pmc_root}
+    if args.sample_fraction or args.sample_size:
+        preview(args, roots)
+        return
+    aggregators = {source: FigureAggregator(source) for source in args.sources}
+
+    with ProcessPoolExecutor(max_workers=args.workers) as exe:
+        futures = {}
+        for source, agg in aggregators.items():
+            for field, year in agg.jobs():
+                path = source_path(source, field, year, roots[source])
+                if year in agg.fig2_years and not text_exists(path):
+                    # as the Figure 2 scripts did; the year counts as empty
+                    print(f"File not found, skipping field year {field} {year}: {path}")
+                fut = exe.submit(aggregate_file, path, args.engine, year in agg.fig2_years,
+                                 window_size=args.window_size)
+                futures[fut] = (source, field, year)
+        for fut, (source, field, year) in futures.items():
+            aggregators[source].add(field, year, fut.result())
+
+    for source, agg in aggregators.items():
+        fig1, fig2, fig3 = FIGURE_SCRIPTS[source]
+        fig1_lines = agg.fig1_lines()
+        write_lines(os.path.join(args.out, f"{fig1}.txt"), fig1_lines)
+        write_lines(os.path.join(args.out, f"{fig2}.txt"), agg.fig2_lines())
+        # Figure 3 plots the same table as Figure 1
+        write_lines(os.path.join(args.out, f"{fig3}.txt"), fig1_lines)
+        print(f"[DONE] {source}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write the Figure 1/2/3 tables reading every text file once")
+    parser.add_argument("--out", required=True, help="output folder of the tables")
+    parser.add_argument("--sources", nargs="+", choices=list(SOURCES), default=list(SOURCES))
+    parser.add_argument("--pmc-root", default=None, help="folder holding the PMC {field}/pmcxtract_list_* files")
+    parser.add_argument("--pubmed-root", default=None, help="folder holding the PubMed {field}/pmxtract_list_* files")
+    parser.add_argument("--engine", choices=["regex", "scan"], default="regex")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="max parallel files")
+    parser.add_argument("--window-size", type=int, default=None,
+                        help="stream long lines to the extractor in windows of about this many characters")
+    parser.add_argument("--sample-fraction", type=float, default=None,
+                        help="preview: sample this fraction of the articles of every (field, year)")
+    parser.add_argument("--sample-size", type=int, default=None,
+                        help="preview: sample at least this many articles of every (field, year)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed of the preview samples")
+    args = parser.parse_args()
+    if args.sample_fraction is not None and not 0 < args.sample_fraction <= 1:
+        parser.error("--sample-fraction must be in (0, 1]")
+    if args.sample_size is not None and args.sample_size < 1:
+        parser.error("--sample-size must be at least 1")
+    if args.window_size is not None and args.window_size < 2:
+        parser.error("--window-size must be at least 2")
+    main(args)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Aggregate the P-value store into the histogram cube read by the Figure 2 and
+Figure 3 scripts (see modules/pval_cube.py).
+
+Run it after extract_pvalues.py; it only reads the store, and only the
+partitions that changed since the cube was last built:
+
+    python3 build_pval_cube.py --store /Volumes/ssd4TB/20251080/pval_store \
+        --cube /Volumes/ssd4TB/20251080/pval_cube
+"""
+
+import argparse
+import time
+
+from modules.pval_cube import build_cube
+from modules.step4_sources import SOURCES
+
+def main(args):
+    start = time.time()
+    axes, n_updated = build_cube(args.store, args.cube, sources=args.sources, rebuild=args.rebuild)
+    print(f"[DONE] {args.cube}: {len(axes['sources'])} sources x {len(axes['years'])} years "
+          f"x {axes['n_fine_bins']} bins of {axes['fine_bin_width']}, "
+          f"{n_updated} of {len(axes['partitions'])} partitions updated in {time.time() - start:.1f}s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the Figure 2/3 P-value histogram cube from the P-value store")
+    parser.add_argument("--store", required=True, help="folder of the P-value store")
+    parser.add_argument("--cube", required=True, help="output folder of the cube")
+    parser.add_argument("--sources", nargs="+", choices=list(SOURCES), default=list(SOURCES))
+    parser.add_argument("--rebuild", action="store_true", help="aggregate every partition, not only changed ones")
+    args = parser.parse_args()
+    main(args)
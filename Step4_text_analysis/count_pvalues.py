@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Figure 1/3 counts straight from the text files, using all cores.
+
+Each text file is split into newline-aligned byte chunks that worker processes
+map and extract on their own (see modules/parallel_extract.py). The printed
+rows are the same as those of the Figure 1/3 scripts:
+
+    year  articles  with-P  P<=.05  P<=.01  P<=.005  P<=.001
+
+Use it for a quick look without building the P-value store:
+
+    python3 count_pvalues.py --source pmc_body --workers 8
+
+With --sections, only these body sections are scanned (the files of
+xml_to_txt.py --sections); the article counts stay those of the whole body:
+
+    python3 count_pvalues.py --source pmc_body --sections results tables --workers 8
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.parallel_extract import CHUNK_SIZE, ChunkAggregate, aggregate_sections, collect_aggregate, submit_aggregate
+from modules.step4_sources import BODY_SECTIONS, SOURCES, YEARS, section_path, source_path, text_exists
+
+def partition_paths(args, field, year):
+    """Text files of one (field, year): the source file, or the files of --sections."""
+    if args.sections:
+        return [section_path(field, year, section, args.root) for section in args.sections]
+    return [source_path(args.source, field, year, args.root)]
+
+def main(args):
+    fields = args.fields or SOURCES[args.source]['fields']
+    with ProcessPoolExecutor(max_workers=args.workers) as exe:
+        for field in fields:
+            print(f'field: {field}')
+            paths = {year: partition_paths(args, field, year) for year in YEARS}
+            paths = {year: p for year, p in paths.items() if all(text_exists(path) for path in p)}
+            # several sections are joined line by line: one task per year. Every
+            # year is queued before any is awaited, so small files run side by side
+            queued = {year: exe.submit(aggregate_sections, p, args.engine) if len(p) > 1
+                      else submit_aggregate(exe, p[0], args.engine, chunk_size=args.chunk_mb << 20)
+                      for year, p in paths.items()}
+            for year in YEARS:
+                if year not in queued:
+                    total = ChunkAggregate()
+                elif len(paths[year]) > 1:
+                    total = queued[year].result()
+                else:
+                    total = collect_aggregate(queued[year])
+                print('\t'.join(str(v) for v in [year] + total.row()))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Count articles with P values per year, in parallel")
+    parser.add_argument("--source", choices=list(SOURCES), required=True)
+    parser.add_argument("--fields", nargs="+", default=None)
+    parser.add_argument("--root", default=None, help="overrides the default text folder of the source")
+    parser.add_argument("--engine", choices=["regex", "scan"], default="regex")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_SIZE >> 20, help="approximate MB per worker task")
+    parser.add_argument("--sections", nargs="+", choices=BODY_SECTIONS, default=None,
+                        help="pmc_body only: scan only these body sections (xml_to_txt.py --sections)")
+    args = parser.parse_args()
+    if args.sections and args.source != 'pmc_body':
+        parser.error("--sections needs --source pmc_body")
+    main(args)
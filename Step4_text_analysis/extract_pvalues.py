@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Step 4 extraction stage: run text_to_pval_and_oper once per article and
+write the per-article P-value store (see modules/pval_store.py).
+
+The Figure 1/2/3 scripts only aggregate the store, so re-plotting after a
+tweak does not touch the text files again. Re-run this script (with
+--overwrite) after changing the extraction rules.
+
+Re-runs are incremental: {store}/manifest.json keeps the size, mtime and
+content hash of the text file behind every partition (see
+modules/step4_manifest.py), and only partitions whose file changed, such as
+a re-downloaded current year, are extracted again.
+
+    python3 extract_pvalues.py --store /Volumes/ssd4TB/20251080/pval_store --workers 8
+
+With --cache, results are also kept per (extractor version, pmcid, text hash)
+in a SQLite cache (see modules/pval_cache.py). After a change to one of the
+homogenization rules, only the articles touching that rule are rescanned:
+
+    python3 extract_pvalues.py --store ... --cache state/pval_cache.sqlite \
+        --overwrite --diff-rules percent exponent
+
+With --labels, only the all-articles files of the PMC sources are extracted.
+The other PMC categories are then derived by joining those results with the
+category flags of the Step 3 labels CSV (pval_store.derive_partition), so no
+RCT/CT/review/... article is scanned a second time:
+
+    python3 extract_pvalues.py --store ... --labels step4Refined.csv
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from modules.pval_cache import RULES, ExtractionCache
+from modules.pmc_labels import SUPERSET, load_category_flags
+from modules.pval_store import derive_partition, extract_partition, has_partition
+from modules.step4_manifest import Manifest, partition_key
+from modules.step4_sources import SOURCES, YEARS, iter_partitions, source_path, text_file
+
+MANIFEST_NAME = "manifest.json"
+LABELS_KEY = "labels"
+
+def run_partition(store_dir, source, field, year, text_root, engine, overwrite, cache_path, diff_rules):
+    cache = ExtractionCache(cache_path) if cache_path else None
+    try:
+        n_articles = extract_partition(store_dir, source, field, year, text_root=text_root,
+                                       engine=engine, overwrite=overwrite,
+                                       cache=cache, diff_rules=diff_rules)
+    finally:
+        if cache is not None:
+            cache.close()
+    return source, field, year, n_articles, cache.stats if cache is not None else None
+
+def is_derived(source, field, labels):
+    """With a labels CSV, PMC categories other than all-articles are joined, not extracted."""
+    return bool(labels) and source in ('pmc_abs', 'pmc_body') and field != SUPERSET
+
+def main(args):
+    jobs = list(iter_partitions(args.sources, years=YEARS))
+    print(f"Found {len(jobs)} partitions")
+    derived = [job for job in jobs if is_derived(*job[:2], args.labels)]
+    jobs = [job for job in jobs if not is_derived(*job[:2], args.labels)]
+    roots = {'pubmed_abs': args.pubmed_root, 'pmc_abs': args.pmc_root, 'pmc_body': args.pmc_root}
+    manifest = Manifest(os.path.join(args.store, MANIFEST_NAME))
+
+    # Only partitions whose text file changed since the manifest was written are extracted
+    stale = []
+    n_fresh = n_adopted = n_missing = 0
+    for source, field, year in jobs:
+        key = partition_key(source, field, year)
+        fingerprint = manifest.fingerprint(text_file(source_path(source, field, year, roots[source])),
+                                          manifest.get(key))
+        if fingerprint is None:
+            n_missing += 1
+        elif args.overwrite or not has_partition(args.store, source, field, year):
+            stale.append((source, field, year, fingerprint))
+        elif manifest.is_fresh(key, fingerprint):
+            manifest.record(key, fingerprint)  # re-stamp a touched but unchanged file
+            n_fresh += 1
+        elif manifest.get(key) is None:
+            # extracted before the manifest existed: trust it once
+            manifest.record(key, fingerprint)
+            n_adopted += 1
+        else:
+            stale.append((source, field, year, fingerprint))
+    manifest.save()
+    print(f"{len(stale)} stale, {n_fresh} fresh, {n_adopted} adopted, {n_missing} without text file")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as exe:
+        futures = {}
+        for source, field, year, fingerprint in stale:
+            fut = exe.submit(run_partition, args.store, source, field, year,
+                             roots[source], args.engine, True, args.cache, args.diff_rules)
+            futures[fut] = (source, field, year, fingerprint)
+        for fut in as_completed(futures):
+            source, field, year, fingerprint = futures[fut]
+            try:
+                _, _, _, n_articles, cache_stats = fut.result()
+            except Exception as e:
+                print(f"[JOB ERROR] {source}/{field}/{year}: {e}")
+                continue
+            if n_articles is None:
+                print(f"[MISSING] {source}/{field}/{year}")
+                continue
+            manifest.record(partition_key(source, field, year), fingerprint)
+            manifest.save()
+            if cache_stats is None:
+                print(f"[DONE] {source}/{field}/{year}\t{n_articles}")
+            else:
+                print(f"[DONE] {source}/{field}/{year}\t{n_articles}\t"
+                      f"cached {cache_stats['hits']} reused {cache_stats['reused']} extracted {cache_stats['extracted']}")
+
+    if not derived:
+        return
+    labels = manifest.fingerprint(args.labels, manifest.get(LABELS_KEY))
+    flags = None
+    n_fresh = n_missing = 0
+    for source, field, year in derived:
+        key = partition_key(source, field, year)
+        superset = manifest.get(partition_key(source, SUPERSET, year))
+        if superset is None:
+            n_missing += 1
+            continue
+        # a derived partition is stale when its superset partition or the labels changed
+        fingerprint = {'superset': superset['hash'], 'labels': labels['hash']}
+        if not args.overwrite and has_partition(args.store, source, field, year) \
+                and manifest.is_fresh(key, fingerprint):
+            n_fresh += 1
+            continue
+        if flags is None:
+            flags = load_category_flags(args.labels)
+            print(f"Loaded category flags of {len(flags)} PMC IDs")
+        try:
+            n_articles = derive_partition(args.store, source, field, year, flags, overwrite=True)
+        except Exception as e:
+            print(f"[JOB ERROR] {source}/{field}/{year}: {e}")
+            continue
+        if n_articles is None:
+            print(f"[MISSING] {source}/{field}/{year} (no {SUPERSET} partition)")
+        else:
+            manifest.record(key, fingerprint)
+            print(f"[JOINED] {source}/{field}/{year}\t{n_articles}")
+    manifest.record(LABELS_KEY, labels)
+    manifest.save()
+    print(f"{n_fresh} joined partitions fresh, {n_missing} without {SUPERSET} partition")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Extract P values of all Step 4 text files into a Parquet store")
+    parser.add_argument("--store", required=True, help="output folder of the P-value store")
+    parser.add_argument("--sources", nargs="+", choices=list(SOURCES), default=list(SOURCES))
+    parser.add_argument("--pmc-root", default=None, help="folder holding the PMC {field}/pmcxtract_list_* files")
+    parser.add_argument("--pubmed-root", default=None, help="folder holding the PubMed {field}/pmxtract_list_* files")
+    parser.add_argument("--engine", choices=["regex", "scan"], default="regex")
+    parser.add_argument("--workers", type=int, default=2, help="max parallel partitions")
+    parser.add_argument("--overwrite", action="store_true", help="re-extract all partitions, even fresh ones")
+    parser.add_argument("--cache", default=None, help="SQLite extraction-result cache shared by all workers")
+    parser.add_argument("--diff-rules", nargs="+", choices=list(RULES), default=None,
+                        help="with --cache: only rescan articles whose previous results touch these rules")
+    parser.add_argument("--labels", default=None,
+                        help="labels CSV (step4Refined.csv): extract PMC all-articles only and join the other categories")
+    args = parser.parse_args()
+    if args.labels and not os.path.isfile(args.labels):
+        parser.error(f"--labels: no such file: {args.labels}")
+    main(args)
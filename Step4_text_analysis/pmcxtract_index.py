@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Line index sidecars for the Step 4 text files, and spot checks built on them
+(see modules/line_index.py).
+
+    # index every text file of a source (only missing or stale sidecars are rebuilt)
+    python3 pmcxtract_index.py build --source pmc_body
+
+    # one article and the P values extracted from it
+    python3 pmcxtract_index.py show pmcxtract_list_review_2020_body.txt PMC7000001
+
+show and sample also read a file that only exists block-compressed
+(xml_to_txt.py --compress) through its block index; build skips it.
+
+    # 20 random articles with their P values
+    python3 pmcxtract_index.py sample pmcxtract_list_review_2020_body.txt 20 --seed 1
+"""
+
+import argparse
+import os
+
+from modules.line_index import build_index, is_index_fresh, open_reader
+from modules.step4_sources import SOURCES, YEARS, source_path, text_file
+from modules.text_to_pval_and_oper import text_to_pval_and_oper
+
+def print_article(pmcid, text, width):
+    print(f"== {pmcid} ({len(text)} chars)")
+    print(text[:width] + (" ..." if len(text) > width else ""))
+    print(f"P values: {text_to_pval_and_oper(text)}")
+
+def cmd_build(args):
+    for field in SOURCES[args.source]['fields']:
+        for year in YEARS:
+            path = source_path(args.source, field, year, args.root)
+            if not os.path.exists(path):
+                if text_file(path) != path:
+                    print(f"[SKIP] {path}: block-compressed, read through {text_file(path)}.bidx")
+                continue
+            if not args.force and is_index_fresh(path):
+                print(f"[SKIP] {path}")
+                continue
+            print(f"[DONE] {path}\t{build_index(path)}")
+
+def cmd_show(args):
+    with open_reader(args.path) as reader:
+        text = reader.find(args.pmcid)
+        if text is None:
+            raise SystemExit(f"❌ {args.pmcid} not in {args.path}")
+        print_article(args.pmcid, text, args.width)
+
+def cmd_sample(args):
+    with open_reader(args.path) as reader:
+        for pmcid, text in reader.sample(args.k, seed=args.seed):
+            print_article(pmcid, text, args.width)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build and query line indexes of pmcxtract/pmxtract files")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="write missing or stale .idx.npz sidecars of a source")
+    p.add_argument("--source", choices=list(SOURCES), required=True)
+    p.add_argument("--root", default=None, help="overrides the default text folder of the source")
+    p.add_argument("--force", action="store_true", help="rebuild fresh sidecars too")
+    p.set_defaults(func=cmd_build)
+
+    p = sub.add_parser("show", help="print one article by PMCID")
+    p.add_argument("path")
+    p.add_argument("pmcid")
+    p.add_argument("--width", type=int, default=2000, help="max characters of text to print")
+    p.set_defaults(func=cmd_show)
+
+    p = sub.add_parser("sample", help="print k uniformly sampled articles")
+    p.add_argument("path")
+    p.add_argument("k", type=int)
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--width", type=int, default=300, help="max characters of text to print")
+    p.set_defaults(func=cmd_sample)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Draw the Step 4 PNGs and workbooks from the tables of aggregate_figures.py.
+
+Every artifact (Plot1/2/3 PNG, Fig1/Fig2 workbook) is drawn in its own worker
+process, headless (see modules/step4_render.py). Artifacts whose input tables
+did not change since the last run are skipped; --force redraws them all.
+
+    python3 aggregate_figures.py --out tables --workers 8
+    python3 render_figures.py --tables tables --out figures --workers 8
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.step4_render import TABLES, render_job, render_jobs, stale_jobs
+
+def main(args):
+    os.makedirs(args.out, exist_ok=True)
+    jobs = render_jobs(args.tables, args.sources)
+    if not jobs:
+        raise SystemExit(f"❌ no aggregate_figures.py tables in {args.tables}")
+    manifest, stale = stale_jobs(args.out, jobs, force=args.force)
+    print(f"{len(stale)} to draw, {len(jobs) - len(stale)} unchanged")
+
+    with ProcessPoolExecutor(max_workers=args.workers) as exe:
+        futures = {exe.submit(render_job, args.out, args.tables, name, renderer, job_args): (name, fingerprint)
+                   for (name, renderer, job_args, _), fingerprint in stale}
+        for fut, (name, fingerprint) in futures.items():
+            try:
+                fut.result()
+            except Exception as e:
+                print(f"[JOB ERROR] {name}: {e}")
+                continue
+            manifest.record(name, fingerprint)
+            print(f"[DONE] {name}")
+    manifest.save()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Draw the Figure 1/2/3 PNGs and workbooks from aggregated tables")
+    parser.add_argument("--tables", required=True, help="output folder of aggregate_figures.py")
+    parser.add_argument("--out", required=True, help="output folder of the PNGs and workbooks")
+    parser.add_argument("--sources", nargs="+", choices=list(TABLES), default=list(TABLES))
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="max parallel artifacts")
+    parser.add_argument("--force", action="store_true", help="redraw artifacts whose tables did not change")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+P values per body section: how much of the text, of the scan time and of the
+P values each section group of the PMC bodies holds.
+
+Needs the section files of xml_to_txt.py --sections next to the pmc_body
+files. Every section file is scanned like the body file itself (see
+modules/parallel_extract.py), and one table per field is printed:
+
+    section  text MB  %text  scan s  %time  P values  %P  articles with P  %with P
+
+The percentages are of the whole body. The sections cover the body text, so
+they add up to about 100%: a P value can be cut in two where text meets a
+section boundary. The time column is the wall time of the scans.
+
+    python3 section_pvalues.py --workers 8
+    python3 count_pvalues.py --source pmc_body --sections results tables --workers 8
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from modules.block_text import BlockReader
+from modules.parallel_extract import CHUNK_SIZE, ChunkAggregate, parallel_aggregate
+from modules.step4_sources import BODY_SECTIONS, YEARS, section_path, source_path, text_exists, text_file
+
+def text_bytes(path):
+    """Bytes of text of a file, uncompressed or block-compressed."""
+    data_path = text_file(path)
+    if data_path == path:
+        return os.path.getsize(path)
+    with BlockReader(data_path) as reader:
+        return int(reader.text_size.sum())
+
+def scan_section(paths, args, exe):
+    """(text bytes, scan seconds, ChunkAggregate) of the files of one section over all years."""
+    n_bytes, seconds, total = 0, 0.0, ChunkAggregate()
+    for path in paths:
+        if not text_exists(path):
+            continue
+        n_bytes += text_bytes(path)
+        start = time.perf_counter()
+        total.merge(parallel_aggregate(path, engine=args.engine, chunk_size=args.chunk_mb << 20, executor=exe))
+        seconds += time.perf_counter() - start
+    return n_bytes, seconds, total
+
+def percent(part, whole):
+    return f"{100 * part / whole:.1f}" if whole else "-"
+
+def main(args):
+    with ProcessPoolExecutor(max_workers=args.workers) as exe:
+        for field in args.fields:
+            print(f'field: {field}')
+            print('\t'.join(['section', 'text MB', '%text', 'scan s', '%time', 'P values', '%P',
+                             'articles with P', '%with P']))
+            rows = {'body': scan_section([source_path('pmc_body', field, year, args.root) for year in YEARS],
+                                         args, exe)}
+            for section in BODY_SECTIONS:
+                rows[section] = scan_section([section_path(field, year, section, args.root) for year in YEARS],
+                                             args, exe)
+            body_bytes, body_seconds, body = rows['body']
+            body_pvalues = int(body.operator_counts.sum())
+            sums = [0, 0.0, 0]
+            for section, (n_bytes, seconds, total) in rows.items():
+                n_pvalues = int(total.operator_counts.sum())
+                if section != 'body':
+                    sums = [sums[0] + n_bytes, sums[1] + seconds, sums[2] + n_pvalues]
+                print('\t'.join([section, f"{n_bytes / 1e6:.1f}", percent(n_bytes, body_bytes),
+                                 f"{seconds:.1f}", percent(seconds, body_seconds),
+                                 str(n_pvalues), percent(n_pvalues, body_pvalues),
+                                 str(total.n_with_pvalue), percent(total.n_with_pvalue, body.n_with_pvalue)]))
+            print('\t'.join(['sections', f"{sums[0] / 1e6:.1f}", percent(sums[0], body_bytes),
+                             f"{sums[1]:.1f}", percent(sums[1], body_seconds),
+                             str(sums[2]), percent(sums[2], body_pvalues), '', '']))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Text, scan time and P values per PMC body section")
+    parser.add_argument("--fields", nargs="+", default=['all-articles'],
+                        help="pmc_body fields (default: all-articles, which holds every category)")
+    parser.add_argument("--root", default=None, help="overrides the default text folder of pmc_body")
+    parser.add_argument("--engine", choices=["regex", "scan"], default="regex")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_SIZE >> 20, help="approximate MB per worker task")
+    args = parser.parse_args()
+    main(args)
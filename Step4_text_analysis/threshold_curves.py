@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Threshold curves for Figures 1 and 3: proportion of articles with any P <= t
+for a whole vector of thresholds, per field and year.
+
+Reads the per-article smallest P values of the P-value store ('min_p' table,
+see modules/min_pvalues.py); no text is scanned and every extra threshold is
+one more binary search.
+
+    python3 threshold_curves.py --store /Volumes/ssd4TB/20251080/pval_store \
+        --source pmc_body --points 50 --out curves_pmc_body.csv
+"""
+
+import argparse
+import csv
+
+import numpy as np
+
+from modules.min_pvalues import proportion_curve
+from modules.pval_store import partition_min_pvalues
+from modules.step4_sources import SOURCES, YEARS
+
+def main(args):
+    if args.thresholds:
+        thresholds = np.array(sorted(args.thresholds))
+    else:
+        thresholds = np.geomspace(args.min_threshold, args.max_threshold, args.points)
+    fields = args.fields or SOURCES[args.source]['fields']
+    with open(args.out, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['field', 'year', 'n_articles', 'n_with_pvalue'] + [f"{t:.6g}" for t in thresholds])
+        for field in fields:
+            for year in YEARS:
+                n_articles, min_p = partition_min_pvalues(args.store, args.source, field, year)
+                curve = proportion_curve(min_p, n_articles, thresholds)
+                writer.writerow([field, year, n_articles, len(min_p)] + [f"{v:.6f}" for v in curve])
+    print(f"[DONE] {args.out}: {len(fields)} fields x {len(YEARS)} years x {len(thresholds)} thresholds")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write proportion-of-articles threshold curves from the P-value store")
+    parser.add_argument("--store", required=True, help="folder of the P-value store")
+    parser.add_argument("--source", choices=list(SOURCES), required=True)
+    parser.add_argument("--fields", nargs="+", default=None)
+    parser.add_argument("--out", required=True, help="output CSV")
+    parser.add_argument("--thresholds", nargs="+", type=float, default=None,
+                        help="explicit thresholds (default: --points thresholds spaced evenly on a log scale)")
+    parser.add_argument("--points", type=int, default=50)
+    parser.add_argument("--min-threshold", type=float, default=1e-6)
+    parser.add_argument("--max-threshold", type=float, default=0.05)
+    args = parser.parse_args()
+    main(args)